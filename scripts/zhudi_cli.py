@@ -2,12 +2,18 @@
 # coding: utf-8
 
 from zhudi import processing
+from zhudi.data import split_senses
 from zhudi import prepare_data, get_argument_parser
 
 
 def get_arguments():
     parser = get_argument_parser()
     parser.add_argument('--expand', action='store_true')
+    parser.add_argument('--mode', choices=['plain', 'wildcard', 'regex'],
+                        default='plain')
+    parser.add_argument('--language',
+                        help="search the translations in this language"
+                        " (split with -m), or in all of them with 'all'")
     parser.add_argument('query', nargs='+')
     return parser.parse_args()
 
@@ -24,15 +30,47 @@ def main():
     st = processing.SegmentationTools()
     pp = processing.PreProcessing()
     st.load(data)
+    dt.load(data)
     romanisation = data.romanisation
     hanzi = data.hanzi
+    language = args.language
+
+    if language is None or language == 'all':
+        translation = data.translation
+    elif language in data.languages():
+        translation = data.translation_column(language)
+    else:
+        print("Unknown language: {} (available: {})".format(
+            language, ', '.join(data.languages()) or 'none'))
+        if not data.languages():
+            print("Other languages are read from the translation.LANGUAGE"
+                  " files split with -m, next to the split files, the"
+                  " compiled file or the database.")
+        return
+    if language == 'all':
+        shown = [data.translation_column(other)
+                 for other in [None] + data.languages()]
+    else:
+        shown = [translation]
 
     search_order = (
-        data.translation,
+        translation,
         getattr(data, romanisation),
         getattr(data, hanzi),
     )
 
+    if args.mode != 'plain':
+        for word in query:
+            results = set()
+            for dic in search_order:
+                for result in _search(dt, data, dic, word, language,
+                                      mode=args.mode):
+                    if result not in results:
+                        results.add(result)
+                        _print_result(result, data, dt, hanzi, romanisation,
+                                      shown)
+        return
+
     potential_sentence = st.sentence_segmentation(' '.join(query))
     if len(potential_sentence) > 1:
         query = potential_sentence
@@ -41,33 +79,50 @@ def main():
     for word in query:
         results = set()
         for dic in search_order:
-            # TODO searchUnique seems to work only on chinese
-            # implementation for pinyin/zhuyin and english/french/etc is needed
+            # TODO search_all only looks for headwords, so it only works on
+            # chinese: implementation for pinyin/zhuyin and english/french/etc
+            # is needed
             if not expand:
-                result = st.searchUnique(word, data)
-                if result and result not in results:
-                    results.add(result)
-                    _print_result(result, data, dt, hanzi, romanisation)
+                for result in st.search_all(word, data):
+                    if result not in results:
+                        results.add(result)
+                        _print_result(result, data, dt, hanzi, romanisation,
+                                      shown)
 
             if expand or not results:
-                dt.search(dic, word)
-                for result in dt.index:
+                for result in _search(dt, data, dic, word, language,
+                                      fuzzy=False):
                     results.add(result)
-                    _print_result(result, data, dt, hanzi, romanisation)
+                    _print_result(result, data, dt, hanzi, romanisation,
+                                  shown)
+
+        if not results:
+            # Maybe some misspelled words
+            for result in _search(dt, data, translation, word, language):
+                _print_result(result, data, dt, hanzi, romanisation,
+                              shown)
+
+
+def _search(dt, data, dic, word, language, **options):
+    if language == 'all' and dic is data.translation:
+        return dt.query_languages(word, **options).ids
+    dt.search(dic, word, **options)
+    return dt.index
 
 
-def _print_result(result, data, dt, hanzi, romanisation):
+def _print_result(result, data, dt, hanzi, romanisation, shown):
     chinese = getattr(data, hanzi)[result].strip()
     pronunciation = _unicode_pronunciation(result, romanisation, data, dt)
-    translation_variations = data.translation[result].strip().split('/')
+    translation_variations = [
+        variation for column in shown
+        for variation in split_senses(column[result].strip()) if variation]
     translations = '\n _ _ ⇾ '.join(translation_variations)
     print('{} _ {} _ {} '.format(chinese, pronunciation, translations))
 
 
 def _unicode_pronunciation(text, romanisation, data, dt):
-    if romanisation == 'Pinyin':
-        return ' '.join([dt.unicode_pinyin(p.lower()) for p in
-                         getattr(data, romanisation)[text].strip().split()])
+    if romanisation == 'pinyin':
+        return dt.unicode_pinyin_all([data.pinyin[text].lower()])[0]
     return ' '.join([p for p in getattr(data, romanisation)[text].strip().split()])
 
 if __name__ == '__main__':
@@ -24,6 +24,11 @@
 # You can run all the tests by simply launching "python test.py"
 #
 # TODO (assertEqual(a,b), assertTrue(a), assertRaises(error_name))
+import os
+import re
+import shutil
+import tempfile
+import threading
 import unittest
 
 # Add here the part you want to test if it is a new one
@@ -56,6 +61,26 @@ def setup():
 global DATA_OBJ
 DATA_OBJ = setup()
 
+def dictionary_columns(data_obj=DATA_OBJ):
+    """ The columns of data_obj, by name, as given to compiled and database
+    files.
+    """
+    return {"pinyin": data_obj.pinyin,
+            "zhuyin": data_obj.zhuyin,
+            "traditional": data_obj.traditional,
+            "simplified": data_obj.simplified,
+            "translation": data_obj.translation}
+
+def temporary_file(test_case, content=b""):
+    """ Returns the name of a new file holding content, removed once
+    test_case is over.
+    """
+    handle, file_name = tempfile.mkstemp()
+    os.write(handle, content)
+    os.close(handle)
+    test_case.addCleanup(os.remove, file_name)
+    return file_name
+
 class TestZhudiProcessing(unittest.TestCase):
     """ Test functions in processing.py. """
 
@@ -65,6 +90,144 @@ class TestZhudiProcessing(unittest.TestCase):
         self.seg_tools = zhudi.processing.SegmentationTools()
         self.seg_tools.load(DATA_OBJ)
 
+    def test_parse_line(self):
+        """ Test parse_line, which splits one line of a *.u8 dictionary.
+        Comments give None, and sticking pinyin are separated.
+
+        """
+        parse_line = zhudi.processing.PreProcessing.parse_line
+        self.assertEqual(parse_line("再見 再见 [zai4jian4] /Au revoir!/Adieu!/\n"),
+                         ("再見", "再见", "zai4 jian4", "Au revoir!/Adieu!"))
+        self.assertEqual(parse_line("# This is a comment\n"), None)
+        self.assertEqual(parse_line("\n"), None)
+
+    def test_split_chunk(self):
+        """ Test split_chunk, the job of each process of parallel_split.
+        It must give the same columns as the serial split and conversion.
+
+        """
+        with open("dict_test.u8", mode="r") as dic:
+            lines = dic.readlines()
+        columns = zhudi.processing.split_chunk(lines)
+        expected = (DATA_OBJ.simplified, DATA_OBJ.traditional,
+                    DATA_OBJ.translation, DATA_OBJ.pinyin, DATA_OBJ.zhuyin)
+        for column, expected_column in zip(columns, expected):
+            self.assertEqual([line + "\n" for line in column], expected_column)
+
+    def test_incremental_split(self):
+        """ Test incremental_split, which updates previously split files with
+        a new release of the dictionary, and returns what changed.
+
+        """
+        new_release = ("我 我 [wo3] /I/me/\n"
+                       "你 你 [ni3] /tu/toi/\n"
+                       "好 好 [hao3] /bon/\n")
+        previous_directory = os.getcwd()
+        directory = tempfile.mkdtemp()
+        try:
+            for name in ["simplified", "traditional", "translation",
+                         "pinyin", "zhuyin"]:
+                shutil.copy(name, directory)
+            os.chdir(directory)
+            with open("new.u8", mode="w") as dic:
+                dic.write(new_release)
+            file_names = ["pinyin", "zhuyin", "traditional", "simplified",
+                          "translation"]
+            preproc = zhudi.processing.PreProcessing
+            preproc.compile_files("compiled", file_names)
+            os.utime("compiled", (0, 0))
+            for name in file_names:
+                os.utime(name, (0, 0))
+            self.assertFalse(preproc.outdated("compiled", file_names))
+            columns, diff = preproc.incremental_split("new.u8")
+            with open("zhuyin", mode="r") as zhuyin_file:
+                zhuyin = zhuyin_file.readlines()
+            # The compiled file now has to be compiled again
+            self.assertTrue(preproc.outdated("compiled", file_names))
+        finally:
+            os.chdir(previous_directory)
+            shutil.rmtree(directory)
+        self.assertEqual(columns[2], ["I/me", "tu/toi", "bon"])
+        self.assertEqual(zhuyin, ["ㄨㄛˇ\n", "ㄋㄧˇ\n", "ㄏㄠˇ\n"])
+        self.assertEqual(diff.added, [2])
+        self.assertEqual(diff.changed, [0])
+        self.assertEqual(diff.removed, [1, 3, 4, 5, 6])
+
+    def test_merge_split(self):
+        """ Test merge_split, which splits dictionaries in several languages
+        into shared columns, and read_translations, which loads them back.
+
+        """
+        previous_directory = os.getcwd()
+        directory = tempfile.mkdtemp()
+        try:
+            os.chdir(directory)
+            with open("fr.u8", mode="w") as dic:
+                dic.write("我 我 [wo3] /je/moi/\n"
+                          "你 你 [ni3] /tu/toi/\n")
+            with open("en.u8", mode="w") as dic:
+                dic.write("# comment\n"
+                          "好 好 [hao3] /good/\n"
+                          "我 我 [wo3] /I/me/\n")
+            columns, translations = (
+                zhudi.processing.PreProcessing.merge_split(
+                    [("fr", "fr.u8"), ("en", "en.u8")]))
+            loaded = zhudi.processing.PreProcessing.read_translations(
+                "translation", 3)
+            # Merging again moves translation.en away, as translation.en_saved,
+            # which is not a language
+            zhudi.processing.PreProcessing.merge_split(
+                [("fr", "fr.u8"), ("en", "en.u8")])
+            reloaded = zhudi.processing.PreProcessing.read_translations(
+                "translation", 3)
+            os.remove("languages")
+            globbed = zhudi.processing.PreProcessing.read_translations(
+                "translation", 3)
+            self.assertRaises(ValueError,
+                              zhudi.processing.PreProcessing.merge_split,
+                              [("fr", "fr.u8"), ("en_gb", "en.u8")])
+        finally:
+            os.chdir(previous_directory)
+            shutil.rmtree(directory)
+        self.assertEqual(columns[1], ["我", "你", "好"])
+        self.assertEqual(columns[2], ["je/moi", "tu/toi", ""])
+        self.assertEqual(columns[4], ["ㄨㄛˇ", "ㄋㄧˇ", "ㄏㄠˇ"])
+        self.assertEqual(translations, {"en": ["I/me", "", "good"]})
+        self.assertEqual(loaded, {"en": ["I/me\n", "\n", "good\n"]})
+        self.assertEqual(reloaded, loaded)
+        self.assertEqual(globbed, loaded)
+        data_obj = zhudi.data.Data(columns[0], columns[1], columns[2],
+                                   {}, {}, {}, {}, {}, {}, columns[3],
+                                   columns[4], reloaded)
+        self.assertEqual(data_obj.languages(), ["en"])
+
+    def test_query_languages(self):
+        """ Test query_languages, which searches several translation columns
+        sharing the same hanzi and pronunciation at once.
+
+        """
+        english = ["I/me\n", "to think/to believe\n", "you\n", "\n",
+                   "goodbye\n", "Good Bye, Lenin!\n", "\n"]
+        german = ["ich\n", "denken/glauben\n", "du\n", "\n",
+                  "auf Wiedersehen\n", "\n", "\n"]
+        data_obj = zhudi.data.Data(DATA_OBJ.simplified, DATA_OBJ.traditional,
+                                   DATA_OBJ.translation, {}, {}, {}, {}, {},
+                                   {}, DATA_OBJ.pinyin, DATA_OBJ.zhuyin,
+                                   {"en": english, "de": german})
+        self.assertEqual(data_obj.languages(), ["de", "en"])
+        self.assertIs(data_obj.translation_column("en"), english)
+        self.assertRaises(ValueError, data_obj.translation_column, "it")
+        dic_tools = zhudi.processing.DictionaryTools()
+        dic_tools.load(data_obj)
+        self.assertEqual(dic_tools.query(english, "think").ids, (1,))
+        self.assertEqual(dic_tools.query(german, "denken").ids, (1,))
+        self.assertEqual(dic_tools.query(data_obj.translation,
+                                         "think").ids, ())
+        self.assertEqual(dic_tools.query_languages("lenin").ids, (5,))
+        self.assertEqual(dic_tools.query_languages("du").ids, (2,))
+        self.assertEqual(dic_tools.query_languages(
+            "du", languages=[None, "en"]).ids, ())
+
     def test_pinyin_to_zhuyin(self):
         """ Test pinyin_to_zhuyin conversion function. """
         pinyin = [
@@ -86,6 +249,16 @@ class TestZhudiProcessing(unittest.TestCase):
         zhuyin_test = self.dic_tools.pinyin_to_zhuyin(pinyin, DATA_OBJ)
         self.assertEqual(zhuyin_ref, zhuyin_test)
 
+    def test_zhuyin_converter(self):
+        """ Test the ZhuyinConverter, used for single strings at query time.
+        Capitals, u: and the lonely r are handled.
+
+        """
+        converter = zhudi.processing.ZHUYIN_CONVERTER
+        self.assertEqual(converter.convert("Zhong1 guo2"), "ㄓㄨㄥ ㄍㄨㄛˊ")
+        self.assertEqual(converter.convert("lu:4 r"), "ㄌㄩˋ ㄦ")
+        self.assertEqual(converter.convert_all(["ni3", "hao3"]), ["ㄋㄧˇ", "ㄏㄠˇ"])
+
     def test_search(self):
         """ Test search function. This function returns the list of index
         where the text is found in the list. This function is not case
@@ -113,6 +286,254 @@ class TestZhudiProcessing(unittest.TestCase):
         self.dic_tools.search(given_list, text)
         self.assertEqual(self.dic_tools.index, [1])
 
+    def test_search_ranking(self):
+        """ Test the ranking of search results: exact matches (of a line or of
+        one of its senses) first, then matches of whole words, then the
+        others, each group shortest first. Only page_size results are kept in
+        index, next_page giving the following ones.
+
+        """
+
+        given_list = ["to go", "ago", "going to go there", "go/walk"]
+        self.dic_tools.search(given_list, "go")
+        self.assertEqual(self.dic_tools.index, [3, 0, 2, 1])
+
+        dic_tools = zhudi.processing.DictionaryTools(page_size=3)
+        dic_tools.search(given_list, "go")
+        self.assertEqual(dic_tools.index, [3, 0, 2])
+        self.assertEqual(dic_tools.next_page(), [1])
+        self.assertEqual(dic_tools.index, [3, 0, 2, 1])
+        self.assertEqual(dic_tools.next_page(), [])
+
+    def test_query(self):
+        """ Test query, which returns a page of results as a SearchResult
+        instead of keeping them in the DictionaryTools object, so that one
+        object can be used by several threads at the same time.
+
+        """
+        dic_tools = zhudi.processing.DictionaryTools(page_size=1)
+        dic_tools.load(DATA_OBJ)
+        results = dic_tools.query(DATA_OBJ.traditional, "再見")
+        self.assertEqual(results.ids, (4,))
+        self.assertEqual(results.total, 2)
+        self.assertEqual(results.scores, ((0, 3, 4),))
+        self.assertEqual(dic_tools.query(DATA_OBJ.traditional, "再見",
+                                         page=1).ids, (5,))
+        self.assertEqual(dic_tools.index, [])
+
+        requests = [(DATA_OBJ.translation, "penser", (1,)),
+                    (DATA_OBJ.traditional, "你", (2,)),
+                    (DATA_OBJ.pinyin, "wo3", (0,))] * 20
+        failures = []
+
+        def run(given_list, text, expected):
+            """ Query from a thread. """
+            if dic_tools.query(given_list, text).ids != expected:
+                failures.append(text)
+        threads = [threading.Thread(target=run, args=request)
+                   for request in requests]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(failures, [])
+
+    def test_query_batch(self):
+        """ Test query_batch, which searches for many strings at once, and
+        gives their results in the same order.
+
+        """
+        self.dic_tools.load(DATA_OBJ)
+        batch = self.dic_tools.query_batch(DATA_OBJ.translation,
+                                           ["toi", "penser", "toi", "rien"])
+        self.assertEqual([result.ids for result in batch.results],
+                         [(2,), (1,), (2,), ()])
+        self.assertEqual((batch.count, batch.unique), (4, 3))
+        self.assertTrue(batch.per_second > 0)
+
+    def test_search_fuzzy(self):
+        """ Test search with misspelled words: when no translation contains
+        them, the ones containing close words are found, fewest typos first.
+
+        """
+        self.dic_tools.load(DATA_OBJ)
+        self.dic_tools.search(DATA_OBJ.translation, "pensre")
+        self.assertEqual(self.dic_tools.index, [1])
+        self.dic_tools.search(DATA_OBJ.translation, "pensre", fuzzy=False)
+        self.assertEqual(self.dic_tools.index, [])
+        self.dic_tools.search(DATA_OBJ.translation, "au revoire")
+        self.assertEqual(self.dic_tools.index, [4])
+        self.dic_tools.search(DATA_OBJ.translation, "tu")
+        self.assertEqual(self.dic_tools.index, [2])
+        self.assertEqual(zhudi.indexes.osa_distance("recieve", "receive"), 1)
+        self.assertEqual(zhudi.indexes.osa_distance("chevau", "chevaux"), 1)
+
+        # Word ids wider than WORD_ID_BITS are not cut
+        translations = zhudi.indexes.TranslationIndex(DATA_OBJ.translation)
+        expected = zhudi.indexes.FuzzyIndex(translations)
+        self.addCleanup(setattr, zhudi.indexes, "WORD_ID_BITS",
+                        zhudi.indexes.WORD_ID_BITS)
+        zhudi.indexes.WORD_ID_BITS = 1
+        narrow = zhudi.indexes.FuzzyIndex(translations)
+        self.assertGreater(len(translations.vocabulary), 2)
+        for word in translations.vocabulary + ["pensre", "revoire"]:
+            self.assertEqual(narrow.lookup(word), expected.lookup(word))
+
+    def test_search_patterns(self):
+        """ Test the wildcard and regex modes of search: wildcard requests
+        match whole words or senses, ? being any character and * any
+        characters. Regular expressions are searched for (case insensitive),
+        and invalid ones find nothing.
+
+        """
+        self.dic_tools.load(DATA_OBJ)
+        self.dic_tools.search(DATA_OBJ.traditional, "再?", mode="wildcard")
+        self.assertEqual(self.dic_tools.index, [4])
+        self.dic_tools.search(DATA_OBJ.traditional, "再*", mode="wildcard")
+        self.assertEqual(self.dic_tools.index, [4, 5])
+        self.dic_tools.search(DATA_OBJ.translation, "t?", mode="wildcard")
+        self.assertEqual(self.dic_tools.index, [2])
+        self.dic_tools.search(DATA_OBJ.translation, "^au rev", mode="regex")
+        self.assertEqual(self.dic_tools.index, [4])
+        self.dic_tools.search(DATA_OBJ.translation, "adieu|lenin", mode="regex")
+        self.assertEqual(self.dic_tools.index, [5, 4])
+        self.dic_tools.search(DATA_OBJ.translation, "(", mode="regex")
+        self.assertEqual(self.dic_tools.index, [])
+
+        fragments = zhudi.indexes.literal_fragments
+        self.assertEqual(fragments(re.compile(r"ab?c\.d+")), ["a", "c.d"])
+        self.assertEqual(fragments(re.compile(r"(a|b)cd[ef]")), ["cd"])
+        self.assertEqual(fragments(re.compile(r"ab|cd")), [])
+        self.assertEqual(fragments(re.compile(r"\u518d")), [])
+        self.assertEqual(fragments(re.compile(r"\x41b")), ["b"])
+
+    def test_search_escaped_patterns(self):
+        """ Test regular expressions with escapes (\\u, \\x, \\N, octal…):
+        the indexes must find the same entries as trying the expression on
+        every line.
+
+        """
+        self.dic_tools.load(DATA_OBJ)
+        patterns = [r"\u518d", r"\u518d\u898b", r"再見\u5217",
+                    r"\N{CJK UNIFIED IDEOGRAPH-518D}", r"\u518d\w\u5217",
+                    r"\x41dieu", r"\101u rev", r"\x41\x64ieu", r"\d"]
+        for column in (DATA_OBJ.traditional, DATA_OBJ.simplified,
+                       DATA_OBJ.translation, DATA_OBJ.pinyin):
+            for pattern in patterns:
+                regex = re.compile(pattern, re.IGNORECASE)
+                expected = [line for line, value in enumerate(column)
+                            if regex.search(value)]
+                self.dic_tools.search(column, pattern, mode="regex")
+                self.assertEqual(sorted(self.dic_tools.index), expected,
+                                 pattern)
+
+    def test_live_search(self):
+        """ Test live_search, used while the request is being typed: the last
+        word of the request can be the beginning of a word of the
+        translation, and the results of the previous request are narrowed
+        when the new one extends it.
+
+        """
+        self.dic_tools.load(DATA_OBJ)
+        self.dic_tools.live_search(DATA_OBJ.translation, "pen")
+        self.assertEqual(self.dic_tools.index, [1])
+        self.dic_tools.live_search(DATA_OBJ.translation, "a")
+        self.assertEqual(self.dic_tools.index, [4, 6])
+        self.dic_tools.live_search(DATA_OBJ.translation, "ad")
+        self.assertEqual(self.dic_tools.index, [4, 6])
+        self.assertEqual(self.dic_tools.live[2], "ad")
+        self.dic_tools.live_search(DATA_OBJ.translation, "adi")
+        self.assertEqual(self.dic_tools.index, [4])
+        self.dic_tools.live_search(DATA_OBJ.translation, "adieu au")
+        self.assertEqual(self.dic_tools.index, [4])
+        self.dic_tools.search(DATA_OBJ.translation, "adi")
+        self.assertEqual(self.dic_tools.index, [])
+
+    def test_query_cache(self):
+        """ Test the cache of search results: the same request (whatever its
+        case and spaces) is only computed once, the least recently used
+        results are dropped first, and replacing a column of the data
+        invalidates its results.
+
+        """
+        cache = zhudi.processing.QueryCache(size=2)
+        dic_tools = zhudi.processing.DictionaryTools(cache=cache)
+        data_obj = zhudi.data.Data([], [], ["bonjour\n", "bonsoir\n"],
+                                   {}, {}, {}, {}, {}, {}, [], [])
+        dic_tools.load(data_obj)
+        dic_tools.search(data_obj.translation, "Bonjour")
+        dic_tools.search(data_obj.translation, " bonjour ")
+        self.assertEqual(dic_tools.index, [0])
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1,
+                                         "evictions": 0, "entries": 1})
+        dic_tools.search(data_obj.translation, "bonsoir")
+        dic_tools.search(data_obj.translation, "soir")
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+        data_obj.translation = ["bonsoir\n", "bonjour\n"]
+        dic_tools.search(data_obj.translation, "bonjour")
+        self.assertEqual(dic_tools.index, [1])
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_search_translation_index(self):
+        """ Test search on the translation column of a loaded data object,
+        which goes through its inverted index: every word of the request must
+        be a word of the translation (case insensitive).
+
+        """
+        self.dic_tools.load(DATA_OBJ)
+        self.dic_tools.search(DATA_OBJ.translation, "Penser")
+        self.assertEqual(self.dic_tools.index, [1])
+        self.dic_tools.search(DATA_OBJ.translation, "revoir au")
+        self.assertEqual(self.dic_tools.index, [4])
+        self.dic_tools.search(DATA_OBJ.translation, "pens")
+        self.assertEqual(self.dic_tools.index, [])
+
+    def test_search_hanzi_index(self):
+        """ Test search on the hanzi columns of a loaded data object, which
+        goes through their n-gram indexes, and finds every entry containing
+        the request.
+
+        """
+        self.dic_tools.load(DATA_OBJ)
+        self.dic_tools.search(DATA_OBJ.traditional, "再見")
+        self.assertEqual(self.dic_tools.index, [4, 5])
+        self.dic_tools.search(DATA_OBJ.traditional, "見列寧")
+        self.assertEqual(self.dic_tools.index, [5])
+        self.dic_tools.search(DATA_OBJ.simplified, "见列宁 再")
+        self.assertEqual(self.dic_tools.index, [5])
+        self.dic_tools.search(DATA_OBJ.simplified, "見")
+        self.assertEqual(self.dic_tools.index, [])
+
+    def test_search_romanisation_index(self):
+        """ Test search on the pinyin and zhuyin columns of a loaded data
+        object. The request can be pinyin with or without tones, with
+        diacritics, or zhuyin, and the syllables must follow each other.
+
+        """
+        self.dic_tools.load(DATA_OBJ)
+        for text in ["zai4 jian4", "zai jian", "zài jiàn", "ㄗㄞˋ ㄐㄧㄢˋ"]:
+            self.dic_tools.search(DATA_OBJ.pinyin, text)
+            self.assertEqual(self.dic_tools.index, [4, 5])
+        self.dic_tools.search(DATA_OBJ.zhuyin, "jian4 lie4")
+        self.assertEqual(self.dic_tools.index, [5])
+        self.dic_tools.search(DATA_OBJ.pinyin, "zai3")
+        self.assertEqual(self.dic_tools.index, [])
+        self.dic_tools.search(DATA_OBJ.pinyin, "jian zai")
+        self.assertEqual(self.dic_tools.index, [])
+
+        # Whatever is typed, the syllables remembered are bounded
+        index = zhudi.indexes.RomanisationIndex(
+            DATA_OBJ.pinyin, zhudi.processing.ZhuyinConverter(
+                zhudi.data.PINYIN_TO_ZHUYIN))
+        size = zhudi.indexes.SYLLABLE_CACHE_SIZE
+        for number in range(size + 10):
+            index.normalize("x" + str(number) + "a")
+        self.assertEqual(index.normalize.cache_info().currsize, size)
+        self.assertEqual(
+            index.converter.convert_syllable.cache_info().currsize, size)
+        self.assertEqual(index.normalize("ni3"), ("ㄋㄧ", 3))
+
     def test_unicode_pinyin(self):
         """
         Test unicode_pinyin function.
@@ -129,6 +550,19 @@ class TestZhudiProcessing(unittest.TestCase):
             resulting_list.append(self.dic_tools.unicode_pinyin(k))
         self.assertEqual(resulting_list, expected_list)
 
+    def test_unicode_pinyin_all(self):
+        """ Test unicode_pinyin_all, which converts whole pinyin strings, and
+        gives the same syllables as the table-less conversion.
+
+        """
+        self.assertEqual(self.dic_tools.unicode_pinyin_all(
+            ["zai4 jian4\n", "Zhong1 guo2", "lu:4 nu:3 r5"]),
+            ["zài jiàn", "Zhōng guó", "lǜ nǚ r5"])
+        converter = zhudi.processing.TONE_MARK_CONVERTER
+        for syllable in ["xiong2", "Lüe4", "er2", "jiu3", "ma5"]:
+            self.assertEqual(converter.convert_syllable(syllable),
+                             zhudi.processing.tone_marks(syllable))
+
     def test_sentence_segmentation(self):
         """
         Test sentence_segmentation function (in ChineseProcessing class).
@@ -144,6 +578,20 @@ class TestZhudiProcessing(unittest.TestCase):
         actual_result = self.seg_tools.sentence_segmentation(given_sentence)
         self.assertEqual(actual_result, expected_result)
 
+    def test_sentence_segmentation_long_words(self):
+        """
+        Words are found whatever their length (there used to be a limit of
+        20 characters), and runs of non-Chinese characters are kept together.
+
+        """
+        long_word = "再見" * 12
+        data_obj = zhudi.data.Data([long_word + "\n"], [long_word + "\n"], [],
+                                   {}, {}, {}, {}, {}, {}, [])
+        seg_tools = zhudi.processing.SegmentationTools()
+        seg_tools.load(data_obj)
+        actual_result = seg_tools.sentence_segmentation("我" + long_word + "OK了")
+        self.assertEqual(actual_result, ["我", long_word, "OK", "了"])
+
     def test_search_unique(self):
         """ Test search_unique function.
         This function returns and index (exact matches) or None if nothing found.
@@ -168,6 +616,31 @@ class TestZhudiProcessing(unittest.TestCase):
         actual_bad_result = self.seg_tools.search_unique(given_bad_word, fake_data_obj)
         self.assertEqual(actual_bad_result, expected_bad_result)
 
+    def test_search_all(self):
+        """ Test search_all function.
+        This function returns the indices of all the entries of a headword,
+        traditional or simplified, homographs included.
+        """
+
+        data_obj = zhudi.data.Data(["了\n", "长\n", "长\n", "再见\n"],
+                                   ["了\n", "長\n", "長\n", "再見\n"], [],
+                                   {}, {}, {}, {}, {}, {}, [])
+        self.assertEqual(self.seg_tools.search_all("長", data_obj), [1, 2])
+        self.assertEqual(self.seg_tools.search_all("再见", data_obj), [3])
+        self.assertEqual(self.seg_tools.search_all("以為", data_obj), [])
+        self.assertIs(data_obj.get_index("headwords", None),
+                      data_obj.get_index("headwords", None))
+
+    def test_search_unique_batch(self):
+        """ Test search_unique_batch, which looks many words up at once, and
+        gives their indices (or None) in the same order.
+
+        """
+        batch = self.seg_tools.search_unique_batch(
+            ["再见", "hello", "你", "再见", "以为"], DATA_OBJ)
+        self.assertEqual(batch.results, [4, None, 2, 4, 1])
+        self.assertEqual((batch.count, batch.unique), (5, 4))
+
     def test_is_not_chinese(self):
         """ Test is_not_chinese, which purpose is to test
         if the given string is Chinese or not.
@@ -184,6 +657,177 @@ class TestZhudiProcessing(unittest.TestCase):
         actual_result = self.seg_tools.is_not_chinese(given_string)
         self.assertEqual(actual_result, expected_result)
 
+class TestZhudiData(unittest.TestCase):
+    """ Test functions in data.py. """
+
+    def test_pack(self):
+        """ Packed columns give back the lines they were made of, with their
+        newlines, and searching them gives the same results.
+        """
+        data_obj = zhudi.data.Data(list(DATA_OBJ.simplified),
+                                   list(DATA_OBJ.traditional),
+                                   list(DATA_OBJ.translation),
+                                   {}, {}, {}, {}, {}, {},
+                                   list(DATA_OBJ.pinyin),
+                                   list(DATA_OBJ.zhuyin),
+                                   {"en": ["I\n"] * len(DATA_OBJ.pinyin)})
+        data_obj.pack()
+        for name in zhudi.data.COLUMNS:
+            column = getattr(data_obj, name)
+            self.assertIsInstance(column, zhudi.data.PackedColumn)
+            self.assertEqual(list(column), getattr(DATA_OBJ, name))
+        self.assertIs(data_obj.traditional.buffer,
+                      data_obj.simplified.buffer)
+        self.assertEqual(data_obj.traditional[-1], DATA_OBJ.traditional[-1])
+        self.assertEqual(data_obj.zhuyin[1:3], DATA_OBJ.zhuyin[1:3])
+        self.assertEqual(data_obj.translation_column("en")[2], "I\n")
+        dic_tools = zhudi.processing.DictionaryTools(cache=None)
+        dic_tools.load(data_obj)
+        self.assertEqual(dic_tools.query(data_obj.traditional, "再見").ids,
+                         (4, 5))
+        self.assertEqual(dic_tools.query(data_obj.pinyin, "ni3").ids, (2,))
+
+        # Mostly ASCII lines are smaller in UTF-8
+        column, = zhudi.data.pack_columns([["Goodbye, Lenin!\n" * 4,
+                                            "see 再見\n"]])
+        self.assertIsInstance(column.buffer, bytes)
+        self.assertEqual(column[1], "see 再見\n")
+        # Latin-1 lines are smaller as a string
+        column, = zhudi.data.pack_columns([["à l'improviste\n"]])
+        self.assertIsInstance(column.buffer, str)
+        self.assertEqual(zhudi.data.character_size("再見"), 2)
+        self.assertEqual(zhudi.data.character_size(chr(0x2A6D6)), 4)
+        self.assertRaises(TypeError, column.__getitem__, 0.5)
+
+    def test_senses(self):
+        """ The senses of an entry are split on "/". """
+        self.assertEqual(DATA_OBJ.senses(4), ("Au revoir!", "Adieu!"))
+        self.assertEqual(DATA_OBJ.senses(0), ("je", "moi"))
+        self.assertEqual(zhudi.data.split_senses("\n"), ("",))
+
+    def test_han_runs(self):
+        """ Chinese characters are told apart from the others with the
+        ranges of HAN_RANGES, a character or a run at a time.
+        """
+        self.assertTrue(zhudi.data.is_han("國"))
+        self.assertTrue(zhudi.data.is_han(chr(0x2A6D6)))
+        self.assertFalse(zhudi.data.is_han("ㄋ"))
+        self.assertEqual(zhudi.data.han_runs("再見Lenin! 了"),
+                         [(True, "再見"), (False, "Lenin! "), (True, "了")])
+        self.assertEqual(zhudi.data.han_runs(""), [])
+
+class TestZhudiCompiled(unittest.TestCase):
+    """ Test functions in compiled.py. """
+
+    def test_write_and_load(self):
+        """ A compiled dictionary gives back the columns it was made of,
+        with their newlines, as list-like objects. Truncated files are
+        refused.
+        """
+        columns = dictionary_columns()
+        file_name = temporary_file(self)
+        zhudi.compiled.CompiledDictionary.write(file_name, columns)
+        compiled_dic = zhudi.compiled.CompiledDictionary(file_name)
+        loaded = compiled_dic.load()
+        for name, column in zip(zhudi.compiled.COLUMNS, loaded):
+            self.assertEqual(len(column), len(columns[name]))
+            self.assertEqual(list(column), columns[name])
+        self.assertEqual(loaded[2][-1], DATA_OBJ.traditional[-1])
+        # Compiling again does not change the mapped file
+        zhudi.compiled.CompiledDictionary.write(
+            file_name, dict(columns, translation=["-\n"] * 7))
+        self.assertEqual(list(loaded[4]), DATA_OBJ.translation)
+        compiled_dic.close()
+        with open(file_name, mode="rb") as compiled_file:
+            content = compiled_file.read()
+
+        # A truncated file is refused when it is loaded
+        for size in (16, 100, len(content) // 2, len(content) - 1):
+            compiled_dic = zhudi.compiled.CompiledDictionary(
+                temporary_file(self, content[:size]))
+            self.assertRaises(zhudi.compiled.CompiledFormatError,
+                              compiled_dic.load)
+
+    def test_bad_file(self):
+        """ Loading something else than a compiled dictionary fails. """
+        compiled_dic = zhudi.compiled.CompiledDictionary("dict_test.u8")
+        self.assertRaises(zhudi.compiled.CompiledFormatError, compiled_dic.load)
+
+class TestZhudiDatabase(unittest.TestCase):
+    """ Test functions in database.py. """
+
+    def test_search(self):
+        """ Searching a database gives the same results as searching the
+        columns in memory, words being case folded and kept whole with their
+        underscores in both.
+        """
+        translations = list(DATA_OBJ.translation)
+        translations[3] = "Straße/Weg/foo_bar\n"
+        translations[6] = "strasse/İstanbul/foo\n"
+        memory_obj = zhudi.data.Data(DATA_OBJ.simplified, DATA_OBJ.traditional,
+                                     translations, {}, {}, {}, {}, {}, {},
+                                     DATA_OBJ.pinyin, DATA_OBJ.zhuyin)
+        file_name = temporary_file(self)
+        zhudi.processing.PreProcessing.write_database(
+            file_name, dictionary_columns(memory_obj))
+        loaded, backend = zhudi.processing.PreProcessing.read_database(
+            file_name)
+        self.addCleanup(backend.close)
+        self.assertEqual(list(loaded[4]), translations)
+        (pinyin, zhuyin, traditional, simplified, translation) = loaded
+        data_obj = zhudi.data.Data(simplified, traditional, translation,
+                                   {}, {}, {}, {}, {}, {}, pinyin, zhuyin)
+        data_obj.backend = backend
+        in_memory = zhudi.processing.DictionaryTools(cache=None)
+        in_memory.load(memory_obj)
+        in_database = zhudi.processing.DictionaryTools(cache=None)
+        in_database.load(data_obj)
+        for name, text in [("translation", "penser"),
+                           ("translation", "au revoir"),
+                           ("translation", "Straße"),
+                           ("translation", "STRASSE"), ("translation", "foo"),
+                           ("translation", "foo_bar"),
+                           ("translation", "İstanbul"),
+                           ("traditional", "再見"), ("traditional", "見"),
+                           ("simplified", "你"), ("pinyin", "zai4"),
+                           ("pinyin", "zai jian"), ("zhuyin", "ㄋㄧˇ")]:
+            self.assertEqual(
+                in_database.query(getattr(data_obj, name), text),
+                in_memory.query(getattr(memory_obj, name), text))
+        for text in ("pen", "stra", "foo_", "İst"):
+            self.assertEqual(in_database.live_search(translation, text).ids,
+                             in_memory.live_search(translations, text).ids)
+        seg_tools = zhudi.processing.SegmentationTools()
+        self.assertEqual(seg_tools.search_all("再見", data_obj),
+                         seg_tools.search_all("再見", DATA_OBJ))
+        words = ["再見", "你", "見", "再見", "OK"]
+        self.assertEqual(
+            seg_tools.search_unique_batch(words, data_obj).results,
+            seg_tools.search_unique_batch(words, DATA_OBJ).results)
+        # Headwords are looked for in the database, not read in memory
+        self.assertNotIn("headwords", data_obj.indexes)
+
+    def test_changed_sources(self):
+        """ A database knows which of its source files have been modified
+        since it was built.
+        """
+        file_name = temporary_file(self)
+        source = temporary_file(self)
+        os.utime(source, (0, 0))
+        zhudi.processing.PreProcessing.write_database(
+            file_name, dictionary_columns(), [source])
+        backend = zhudi.database.Database(file_name)
+        backend.load()
+        self.addCleanup(backend.close)
+        self.assertEqual(backend.changed_sources(), [])
+        os.utime(source, (1000, 1000))
+        self.assertEqual(backend.changed_sources(), [os.path.abspath(source)])
+
+    def test_bad_file(self):
+        """ Loading something else than a database fails. """
+        backend = zhudi.database.Database("dict_test.u8")
+        self.assertRaises(zhudi.database.DatabaseFormatError, backend.load)
+
 # class TestZhudiChineseTable(unittest.TestCase):
 #     def test_proceed(self):
 #         pass
@@ -21,7 +21,7 @@
 import os
 import argparse
 
-from zhudi import data, processing, chinese_table
+from zhudi import data, processing, chinese_table, compiled, database, indexes
 
 
 class WrongInputException(Exception):
@@ -54,6 +54,14 @@ def prepare_data(options):
     simplified_file_name = options.simplified_file_name
     translation_file_name = options.translation_file_name
     traditional_file_name = options.traditional_file_name
+    compile_file_name = options.compile_file_name
+    binary_file_name = options.binary_file_name
+    build_sqlite_file_name = options.build_sqlite_file_name
+    sqlite_file_name = options.sqlite_file_name
+    merged_files = options.merged_files
+    backend = None
+    translations = {}
+    split_files = False
 
     preproc_o = processing.PreProcessing()
     files = [pinyin_file_name,
@@ -66,9 +74,41 @@ def prepare_data(options):
                      os.environ["HOME"] + "/.zhudi/traditional",
                      os.environ["HOME"] + "/.zhudi/simplified",
                      os.environ["HOME"] + "/.zhudi/translation"]
+    default_binary_file = os.environ["HOME"] + "/.zhudi/compiled"
     # Splitting the given input
     passed = False
-    if (filename is not None) and all(x is None for x in files):
+    if merged_files:
+        for language, dictname in merged_files:
+            if not processing.LANGUAGE_PATTERN.match(language):
+                print("### " + language + " is not a valid language name:"
+                      " use letters, digits and - only. ###")
+                quit()
+        print("Splitting dictionaries in progress…")
+        preproc_o.merge_split(merged_files)
+        print("done.")
+        quit()
+
+    elif ((filename is not None) and all(x is None for x in files) and
+            options.update):
+        print("Updating the split dictionary in progress…")
+        diff = preproc_o.incremental_split(filename)[1]
+        # The compiled dictionary is made from the split files of ~/.zhudi/
+        if (any(diff) and os.path.isfile(default_binary_file) and
+                preproc_o.outdated(default_binary_file, default_files)):
+            print("Compiling " + default_binary_file + " again…")
+            preproc_o.compile_files(default_binary_file, default_files)
+        print("done.")
+        quit()
+
+    elif ((filename is not None) and all(x is None for x in files) and
+          options.jobs > 1):
+        print("Splitting dictionary in progress (" + str(options.jobs) +
+              " processes)…")
+        preproc_o.parallel_split(filename, options.jobs)
+        print("done.")
+        quit()
+
+    elif (filename is not None) and all(x is None for x in files):
         print("Splitting dictionary in progress…")
         files = preproc_o.split(filename)
         simplified_list = files[0]
@@ -98,6 +138,64 @@ def prepare_data(options):
         print("done.")
         quit()
 
+    # Compiling the text files (given, or the default ones) into one file,
+    # or into a database
+    elif compile_file_name is not None or build_sqlite_file_name is not None:
+        if all(x is None for x in files):
+            files = default_files
+        elif None in files:
+            print("You must pass all generated files, or none of them, to"
+                  " compile them.")
+            quit()
+        if compile_file_name is not None:
+            print("Compiling dictionary in progress…")
+            preproc_o.compile_files(compile_file_name, files)
+        else:
+            print("Building the dictionary database in progress…")
+            columns = dict(zip(compiled.COLUMNS, preproc_o.read_files(*files)))
+            preproc_o.write_database(build_sqlite_file_name, columns, files)
+        print("done.")
+        quit()
+
+    # Opening a database
+    elif sqlite_file_name is not None:
+        try:
+            ((pinyin, zhuyin, traditional, simplified, translation),
+             backend) = preproc_o.read_database(sqlite_file_name)
+        except database.DatabaseFormatError as error:
+            print("### The dictionary database couldn't be read: " +
+                  str(error) + " ###")
+            quit()
+        for source in backend.changed_sources():
+            print("Warning: " + source + " has been modified since the"
+                  " database was built. Build it again with --build-sqlite.")
+        translations = preproc_o.read_translations(
+            os.path.join(os.path.dirname(sqlite_file_name), "translation"),
+            len(translation))
+        passed = True
+
+    # Loading a compiled file, given or found in the default directory
+    elif (binary_file_name is not None or
+          (all(x is None for x in files) and
+           os.path.isfile(default_binary_file))):
+        if binary_file_name is None:
+            binary_file_name = default_binary_file
+            if preproc_o.outdated(binary_file_name, default_files):
+                print("The split files are more recent than " +
+                      binary_file_name + ", compiling it again…")
+                preproc_o.compile_files(binary_file_name, default_files)
+        try:
+            (pinyin, zhuyin, traditional,
+             simplified, translation) = preproc_o.read_compiled(binary_file_name)
+        except (IOError, compiled.CompiledFormatError) as error:
+            print("### The compiled dictionary couldn't be read: " +
+                  str(error) + " ###")
+            quit()
+        translations = preproc_o.read_translations(
+            os.path.join(os.path.dirname(binary_file_name), "translation"),
+            len(translation))
+        passed = True
+
     # First case scenario: no arguments given but defaults files are found
     elif all(x is None for x in files):
         temp_value = 0
@@ -112,6 +210,9 @@ def prepare_data(options):
                  default_files[2],
                  default_files[3],
                  default_files[4])
+            translations = preproc_o.read_translations(default_files[4],
+                                                       len(translation))
+            split_files = True
             passed = True
         else:
             print("### No input files have been given to me. Please, consider" +
@@ -126,6 +227,9 @@ def prepare_data(options):
              files[2],
              files[3],
              files[4])
+        translations = preproc_o.read_translations(files[4],
+                                                   len(translation))
+        split_files = True
         passed = True
     # Third scenario: some input files are missing
     elif None in files:
@@ -155,7 +259,14 @@ def prepare_data(options):
                             array_dic, array_short_dic,
                             cangjie_dic, cangjie_short_dic,
                             pinyin,
-                            zhuyin)
+                            zhuyin,
+                            translations)
+    data_object.backend = backend
+    if options.compact and split_files:
+        data_object.pack()
+    elif options.compact:
+        print("Warning: --compact only applies to split files. Compiled"
+              " files and databases are not kept in memory anyway.")
     data_object.load_config()
     return data_object
 
@@ -170,6 +281,13 @@ def get_argument_parser():
     parser.add_argument("-s", "--split", dest="filename", help="The *.u8"
                         " dictionary file to be split. This operation will be"
                         " done in the current directory.")
+    parser.add_argument("-m", "--merge", dest="merged_files", nargs=2,
+                        action="append", metavar=("LANGUAGE", "FILE"),
+                        help="A *.u8 dictionary file, in the given language, to"
+                        " be split along with the other ones given with -m in"
+                        " the current directory. Their entries share the same"
+                        " hanzi and pinyin, and their translations are split"
+                        " into translation and translation.LANGUAGE files.")
     parser.add_argument("-p", "--pinyin-file", dest="pinyin_file_name",
                         help="The file that contains the pinyin. This file comes"
                         "from the split of the *.u8 dictionary file.")
@@ -187,4 +305,32 @@ def get_argument_parser():
                         help="The file that contains the simplified form of the"
                         " Chinese. This file comes from the split of the *.u8"
                         " dictionary file.")
+    parser.add_argument("-u", "--update", dest="update", action="store_true",
+                        help="With -s, only update the files split in the"
+                        " current directory with the changes of the new *.u8"
+                        " dictionary file.")
+    parser.add_argument("-j", "--jobs", dest="jobs", type=int, default=1,
+                        help="Number of processes used to split the *.u8"
+                        " dictionary file and to convert its pinyin (1 by"
+                        " default).")
+    parser.add_argument("-c", "--compile", dest="compile_file_name",
+                        help="Compile the split files (given with -p, -z, -tr,"
+                        " -td and -sd, or found in ~/.zhudi/) into one binary"
+                        " file, faster to load.")
+    parser.add_argument("-b", "--binary-file", dest="binary_file_name",
+                        help="The compiled dictionary file to use instead of"
+                        " the split files. ~/.zhudi/compiled is used by"
+                        " default if it exists.")
+    parser.add_argument("--compact", dest="compact", action="store_true",
+                        help="Keep the split files in memory in a compact"
+                        " form: slower to load, but taking several times less"
+                        " memory.")
+    parser.add_argument("--build-sqlite", dest="build_sqlite_file_name",
+                        help="Store the split files (given with -p, -z, -tr,"
+                        " -td and -sd, or found in ~/.zhudi/) into an SQLite"
+                        " database, with full text indexes.")
+    parser.add_argument("--sqlite", dest="sqlite_file_name",
+                        help="The SQLite database to use instead of the split"
+                        " files. Entries are then read from it, and searched"
+                        " in it, when needed.")
     return parser
@@ -0,0 +1,213 @@
+# coding: utf-8
+''' Zhudi provides a Chinese - language dictionnary based on the
+    C[E|F]DICT project Copyright - 2011 - Ma Jiehong
+
+    Zhudi is free software: you can redistribute it and/or modify it
+    under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Zhudi is distributed in the hope that it will be useful, but WITHOUT
+    ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+    or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+    License for more details.
+
+    You should have received a copy of the GNU General Public License
+    If not, see <http://www.gnu.org/licenses/>.
+
+'''
+
+import mmap
+import os
+import struct
+import tempfile
+
+# Layout of a compiled dictionary (all integers are little-endian):
+#
+#   header        : magic, format version, number of columns, number of entries
+#   column table  : for each column, its name, and the position of its
+#                   offset table and of its string heap
+#   offset tables : (entries + 1) uint32 per column, relative to the heap
+#   string heaps  : the UTF-8 encoded lines of the column, one after the other
+MAGIC = b"ZHUDI\x00\x00\x00"
+VERSION = 1
+COLUMNS = ("pinyin", "zhuyin", "traditional", "simplified", "translation")
+
+HEADER = struct.Struct("<8sIII")
+COLUMN_ENTRY = struct.Struct("<16sQQ")
+OFFSET = struct.Struct("<I")
+OFFSET_PAIR = struct.Struct("<II")
+
+
+class CompiledFormatError(Exception):
+    """
+    Raised when a file is not a compiled dictionary Zhudi can read.
+
+    """
+    pass
+
+
+class MappedColumn(object):
+    """ A read-only, list-like column served from a memory-mapped file.
+    Lines are only decoded when they are accessed, and keep their trailing
+    newline, just like the lists returned by PreProcessing.read_files.
+    """
+
+    def __init__(self, mapping, offsets_position, heap_position, length):
+        self.mapping = mapping
+        self.offsets_position = offsets_position
+        self.heap_position = heap_position
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("column index out of range")
+        start, end = OFFSET_PAIR.unpack_from(
+            self.mapping, self.offsets_position + OFFSET.size * index)
+        return self.mapping[self.heap_position + start:
+                            self.heap_position + end].decode("utf-8")
+
+    def __iter__(self):
+        for index in range(self.length):
+            yield self[index]
+
+
+class CompiledDictionary(object):
+    """ A dictionary compiled into one binary file, and memory-mapped.
+    Columns are MappedColumn objects, so only the pages actually read are
+    loaded in memory.
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.columns = {}
+        self.file = None
+        self.mapping = None
+
+    @staticmethod
+    def write(file_name, columns):
+        """ Compile the given columns into file_name.
+
+        The file is written next to file_name, then renamed over it, so that
+        processes which have the previous file mapped keep reading it.
+
+        Arguments:
+        file_name: the output file
+        columns: a dictionary of column name -> list of lines, with a list
+                 for each name of COLUMNS
+
+        """
+        heaps = []
+        offset_tables = []
+        for name in COLUMNS:
+            lines = [line.encode("utf-8") for line in columns[name]]
+            offsets = [0]
+            for line in lines:
+                offsets.append(offsets[-1] + len(line))
+            heaps.append(b"".join(lines))
+            offset_tables.append(struct.pack("<%dI" % len(offsets), *offsets))
+        entries = len(columns[COLUMNS[0]])
+        for name in COLUMNS:
+            if len(columns[name]) != entries:
+                raise CompiledFormatError("Column " + name + " does not have "
+                                          "the same length as the others.")
+
+        position = HEADER.size + COLUMN_ENTRY.size * len(COLUMNS)
+        table = []
+        for offsets, heap in zip(offset_tables, heaps):
+            table.append((position, position + len(offsets)))
+            position += len(offsets) + len(heap)
+
+        descriptor, temporary_name = tempfile.mkstemp(
+            prefix=os.path.basename(file_name) + ".",
+            dir=os.path.dirname(os.path.abspath(file_name)))
+        try:
+            with os.fdopen(descriptor, mode="wb") as output:
+                output.write(HEADER.pack(MAGIC, VERSION, len(COLUMNS),
+                                         entries))
+                for name, (offsets_position,
+                           heap_position) in zip(COLUMNS, table):
+                    output.write(COLUMN_ENTRY.pack(name.encode("utf-8"),
+                                                   offsets_position,
+                                                   heap_position))
+                for offsets, heap in zip(offset_tables, heaps):
+                    output.write(offsets)
+                    output.write(heap)
+            os.replace(temporary_name, file_name)
+        except BaseException:
+            os.remove(temporary_name)
+            raise
+
+    def load(self):
+        """ Map the compiled file, and return its columns as a tuple:
+        (pinyin, zhuyin, traditional, simplified, translation)
+        """
+
+        self.file = open(self.file_name, mode="rb")
+        try:
+            self.map_columns()
+        except CompiledFormatError:
+            self.close()
+            raise
+        return tuple(self.columns[name] for name in COLUMNS)
+
+    def map_columns(self):
+        """ Map the opened file, check its header and build its columns.
+        Every table and heap has to be within the file.
+        """
+        try:
+            self.mapping = mmap.mmap(self.file.fileno(), 0,
+                                     access=mmap.ACCESS_READ)
+        except ValueError:
+            raise CompiledFormatError(self.file_name + " is empty.")
+        if len(self.mapping) < HEADER.size:
+            raise CompiledFormatError(self.file_name + " is truncated.")
+        magic, version, columns_count, entries = HEADER.unpack_from(self.mapping)
+        if magic != MAGIC:
+            raise CompiledFormatError(self.file_name + " is not a compiled"
+                                      " Zhudi dictionary.")
+        if version != VERSION:
+            raise CompiledFormatError(self.file_name + " has been compiled"
+                                      " with an unsupported format version"
+                                      " (" + str(version) + ").")
+        size = len(self.mapping)
+        if HEADER.size + COLUMN_ENTRY.size * columns_count > size:
+            raise CompiledFormatError(self.file_name + " is truncated.")
+        for number in range(columns_count):
+            name, offsets_position, heap_position = COLUMN_ENTRY.unpack_from(
+                self.mapping, HEADER.size + COLUMN_ENTRY.size * number)
+            try:
+                name = name.rstrip(b"\x00").decode("utf-8")
+            except UnicodeDecodeError:
+                raise CompiledFormatError(self.file_name + " has a column"
+                                          " with an invalid name.")
+            if offsets_position + OFFSET.size * (entries + 1) > size:
+                raise CompiledFormatError(self.file_name + " is truncated"
+                                          " (" + name + " offsets).")
+            heap_size, = OFFSET.unpack_from(
+                self.mapping, offsets_position + OFFSET.size * entries)
+            if heap_position + heap_size > size:
+                raise CompiledFormatError(self.file_name + " is truncated"
+                                          " (" + name + " strings).")
+            self.columns[name] = MappedColumn(self.mapping, offsets_position,
+                                              heap_position, entries)
+        for name in COLUMNS:
+            if name not in self.columns:
+                raise CompiledFormatError(self.file_name + " has no " + name +
+                                          " column.")
+
+    def close(self):
+        """ Release the mapping, and the underlying file. """
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
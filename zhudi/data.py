@@ -18,6 +18,605 @@
 '''
 
 import os
+import re
+import itertools
+import threading
+from array import array
+
+# Pinyin syllables (longest first) and tones, with their zhuyin equivalent
+PINYIN_TO_ZHUYIN = [('zhuang', 'ㄓㄨㄤ'),
+                    ('shuang', 'ㄕㄨㄤ'),
+                    ('chuang', 'ㄔㄨㄤ'),
+                    ('zhuan', 'ㄓㄨㄢ'),
+                    ('zhuai', 'ㄓㄨㄞ'),
+                    ('zhong', 'ㄓㄨㄥ'),
+                    ('zheng', 'ㄓㄥ'),
+                    ('zhang', 'ㄓㄤ'),
+                    ('xiong', 'ㄒㄩㄥ'),
+                    ('xiang', 'ㄒㄧㄤ'),
+                    ('shuan', 'ㄕㄨㄢ'),
+                    ('shuai', 'ㄕㄨㄞ'),
+                    ('sheng', 'ㄕㄥ'),
+                    ('shang', 'ㄕㄤ'),
+                    ('qiong', 'ㄑㄩㄥ'),
+                    ('qiang', 'ㄑㄧㄤ'),
+                    ('niang', 'ㄋㄧㄤ'),
+                    ('liang', 'ㄌㄧㄤ'),
+                    ('kuang', 'ㄎㄨㄤ'),
+                    ('jiong', 'ㄐㄩㄥ'),
+                    ('jiang', 'ㄐㄧㄤ'),
+                    ('huang', 'ㄏㄨㄤ'),
+                    ('guang', 'ㄍㄨㄤ'),
+                    ('chuan', 'ㄔㄨㄢ'),
+                    ('chuai', 'ㄔㄨㄞ'),
+                    ('chong', 'ㄔㄨㄥ'),
+                    ('cheng', 'ㄔㄥ'),
+                    ('chang', 'ㄔㄤ'),
+                    ('zuan', 'ㄗㄨㄢ'),
+                    ('zong', 'ㄗㄨㄥ'),
+                    ('zhuo', 'ㄓㄨㄛ'),
+                    ('zhun', 'ㄓㄨㄣ'),
+                    ('zhui', 'ㄓㄨㄟ'),
+                    ('zhua', 'ㄓㄨㄚ'),
+                    ('zhou', 'ㄓㄡ'),
+                    ('zhen', 'ㄓㄣ'),
+                    ('zhei', 'ㄓㄟ'),
+                    ('zhao', 'ㄓㄠ'),
+                    ('zhan', 'ㄓㄢ'),
+                    ('zhai', 'ㄓㄞ'),
+                    ('zeng', 'ㄗㄥ'),
+                    ('zang', 'ㄗㄤ'),
+                    ('yuan', 'ㄩㄢ'),
+                    ('yong', 'ㄩㄥ'),
+                    ('ying', 'ㄧㄥ'),
+                    ('yang', 'ㄧㄤ'),
+                    ('xuan', 'ㄒㄩㄢ'),
+                    ('xing', 'ㄒㄧㄥ'),
+                    ('xien', 'ㄒㄧㄢ'),
+                    ('xiao', 'ㄒㄧㄠ'),
+                    ('xian', 'ㄒㄧㄢ'),
+                    ('wong', 'ㄨㄥ'),
+                    ('weng', 'ㄨㄥ'),
+                    ('wang', 'ㄨㄤ'),
+                    ('tuan', 'ㄊㄨㄢ'),
+                    ('tong', 'ㄊㄨㄥ'),
+                    ('ting', 'ㄊㄧㄥ'),
+                    ('tien', 'ㄊㄧㄢ'),
+                    ('tiao', 'ㄊㄧㄠ'),
+                    ('tian', 'ㄊㄧㄢ'),
+                    ('teng', 'ㄊㄥ'),
+                    ('tang', 'ㄊㄤ'),
+                    ('suan', 'ㄙㄨㄢ'),
+                    ('song', 'ㄙㄨㄥ'),
+                    ('shuo', 'ㄕㄨㄛ'),
+                    ('shun', 'ㄕㄨㄣ'),
+                    ('shui', 'ㄕㄨㄟ'),
+                    ('shua', 'ㄕㄨㄚ'),
+                    ('shou', 'ㄕㄡ'),
+                    ('shen', 'ㄕㄣ'),
+                    ('shei', 'ㄕㄟ'),
+                    ('shao', 'ㄕㄠ'),
+                    ('shan', 'ㄕㄢ'),
+                    ('shai', 'ㄕㄞ'),
+                    ('seng', 'ㄙㄥ'),
+                    ('sang', 'ㄙㄤ'),
+                    ('ruan', 'ㄖㄨㄢ'),
+                    ('rong', 'ㄖㄨㄥ'),
+                    ('reng', 'ㄖㄥ'),
+                    ('rang', 'ㄖㄤ'),
+                    ('quan', 'ㄑㄩㄢ'),
+                    ('qing', 'ㄑㄧㄥ'),
+                    ('qien', 'ㄑㄧㄢ'),
+                    ('qiao', 'ㄑㄧㄠ'),
+                    ('qian', 'ㄑㄧㄢ'),
+                    ('ping', 'ㄆㄧㄥ'),
+                    ('pien', 'ㄆㄧㄢ'),
+                    ('piao', 'ㄆㄧㄠ'),
+                    ('pian', 'ㄆㄧㄢ'),
+                    ('peng', 'ㄆㄥ'),
+                    ('pang', 'ㄆㄤ'),
+                    ('nuan', 'ㄋㄨㄢ'),
+                    ('nong', 'ㄋㄨㄥ'),
+                    ('ning', 'ㄋㄧㄥ'),
+                    ('nien', 'ㄋㄧㄢ'),
+                    ('niao', 'ㄋㄧㄠ'),
+                    ('nian', 'ㄋㄧㄢ'),
+                    ('neng', 'ㄋㄥ'),
+                    ('nang', 'ㄋㄤ'),
+                    ('ming', 'ㄇㄧㄥ'),
+                    ('mien', 'ㄇㄧㄢ'),
+                    ('miao', 'ㄇㄧㄠ'),
+                    ('mian', 'ㄇㄧㄢ'),
+                    ('meng', 'ㄇㄥ'),
+                    ('mang', 'ㄇㄤ'),
+                    ('luen', 'ㄌㄩㄢ'),
+                    ('luan', 'ㄌㄨㄢ'),
+                    ('long', 'ㄌㄨㄥ'),
+                    ('ling', 'ㄌㄧㄥ'),
+                    ('lien', 'ㄌㄧㄢ'),
+                    ('liao', 'ㄌㄧㄠ'),
+                    ('lian', 'ㄌㄧㄢ'),
+                    ('leng', 'ㄌㄥ'),
+                    ('lang', 'ㄌㄤ'),
+                    ('kuan', 'ㄎㄨㄢ'),
+                    ('kuai', 'ㄎㄨㄞ'),
+                    ('kong', 'ㄎㄨㄥ'),
+                    ('keng', 'ㄎㄥ'),
+                    ('kang', 'ㄎㄤ'),
+                    ('juan', 'ㄐㄩㄢ'),
+                    ('jing', 'ㄐㄧㄥ'),
+                    ('jien', 'ㄐㄧㄢ'),
+                    ('jiao', 'ㄐㄧㄠ'),
+                    ('jian', 'ㄐㄧㄢ'),
+                    ('huan', 'ㄏㄨㄢ'),
+                    ('huai', 'ㄏㄨㄞ'),
+                    ('hong', 'ㄏㄨㄥ'),
+                    ('heng', 'ㄏㄥ'),
+                    ('hang', 'ㄏㄤ'),
+                    ('guan', 'ㄍㄨㄢ'),
+                    ('guai', 'ㄍㄨㄞ'),
+                    ('gong', 'ㄍㄨㄥ'),
+                    ('geng', 'ㄍㄥ'),
+                    ('gang', 'ㄍㄤ'),
+                    ('fong', 'ㄈㄨㄥ'),
+                    ('fiao', 'ㄈㄧㄠ'),
+                    ('feng', 'ㄈㄥ'),
+                    ('fang', 'ㄈㄤ'),
+                    ('duan', 'ㄉㄨㄢ'),
+                    ('dong', 'ㄉㄨㄥ'),
+                    ('ding', 'ㄉㄧㄥ'),
+                    ('dien', 'ㄉㄧㄢ'),
+                    ('diao', 'ㄉㄧㄠ'),
+                    ('dian', 'ㄉㄧㄢ'),
+                    ('deng', 'ㄉㄥ'),
+                    ('dang', 'ㄉㄤ'),
+                    ('cuan', 'ㄘㄨㄢ'),
+                    ('cong', 'ㄘㄨㄥ'),
+                    ('chuo', 'ㄔㄨㄛ'),
+                    ('chun', 'ㄔㄨㄣ'),
+                    ('chui', 'ㄔㄨㄟ'),
+                    ('chua', 'ㄔㄨㄚ'),
+                    ('chou', 'ㄔㄡ'),
+                    ('chen', 'ㄔㄣ'),
+                    ('chao', 'ㄔㄠ'),
+                    ('chan', 'ㄔㄢ'),
+                    ('chai', 'ㄔㄞ'),
+                    ('ceng', 'ㄘㄥ'),
+                    ('cang', 'ㄘㄤ'),
+                    ('bing', 'ㄅㄧㄥ'),
+                    ('bien', 'ㄅㄧㄢ'),
+                    ('biao', 'ㄅㄧㄠ'),
+                    ('bian', 'ㄅㄧㄢ'),
+                    ('beng', 'ㄅㄥ'),
+                    ('bang', 'ㄅㄤ'),
+                    ('zuo', 'ㄗㄨㄛ'),
+                    ('zun', 'ㄗㄨㄣ'),
+                    ('zui', 'ㄗㄨㄟ'),
+                    ('zou', 'ㄗㄡ'),
+                    ('zhu', 'ㄓㄨ'),
+                    ('zhi', 'ㄓ'),
+                    ('zhe', 'ㄓㄜ'),
+                    ('zha', 'ㄓㄚ'),
+                    ('zen', 'ㄗㄣ'),
+                    ('zei', 'ㄗㄟ'),
+                    ('zao', 'ㄗㄠ'),
+                    ('zan', 'ㄗㄢ'),
+                    ('zai', 'ㄗㄞ'),
+                    ('yun', 'ㄩㄣ'),
+                    ('yue', 'ㄩㄝ'),
+                    ('you', 'ㄧㄡ'),
+                    ('yin', 'ㄧㄣ'),
+                    ('yao', 'ㄧㄠ'),
+                    ('yan', 'ㄧㄢ'),
+                    ('yai', 'ㄧㄞ'),
+                    ('xun', 'ㄒㄩㄣ'),
+                    ('xue', 'ㄒㄩㄝ'),
+                    ('xiu', 'ㄒㄧㄡ'),
+                    ('xin', 'ㄒㄧㄣ'),
+                    ('xie', 'ㄒㄧㄝ'),
+                    ('xia', 'ㄒㄧㄚ'),
+                    ('wen', 'ㄨㄣ'),
+                    ('wei', 'ㄨㄟ'),
+                    ('wan', 'ㄨㄢ'),
+                    ('wai', 'ㄨㄞ'),
+                    ('tuo', 'ㄊㄨㄛ'),
+                    ('tun', 'ㄊㄨㄣ'),
+                    ('tui', 'ㄊㄨㄟ'),
+                    ('tou', 'ㄊㄡ'),
+                    ('tie', 'ㄊㄧㄝ'),
+                    ('tao', 'ㄊㄠ'),
+                    ('tan', 'ㄊㄢ'),
+                    ('tai', 'ㄊㄞ'),
+                    ('suo', 'ㄙㄨㄛ'),
+                    ('sun', 'ㄙㄨㄣ'),
+                    ('sui', 'ㄙㄨㄟ'),
+                    ('sou', 'ㄙㄡ'),
+                    ('shu', 'ㄕㄨ'),
+                    ('shi', 'ㄕ'),
+                    ('she', 'ㄕㄜ'),
+                    ('sha', 'ㄕㄚ'),
+                    ('sen', 'ㄙㄣ'),
+                    ('sei', 'ㄙㄟ'),
+                    ('sao', 'ㄙㄠ'),
+                    ('san', 'ㄙㄢ'),
+                    ('sai', 'ㄙㄞ'),
+                    ('ruo', 'ㄖㄨㄛ'),
+                    ('run', 'ㄖㄨㄣ'),
+                    ('rui', 'ㄖㄨㄟ'),
+                    ('rou', 'ㄖㄡ'),
+                    ('ren', 'ㄖㄣ'),
+                    ('rao', 'ㄖㄠ'),
+                    ('ran', 'ㄖㄢ'),
+                    ('qun', 'ㄑㄩㄣ'),
+                    ('que', 'ㄑㄩㄝ'),
+                    ('qiu', 'ㄑㄧㄡ'),
+                    ('qin', 'ㄑㄧㄣ'),
+                    ('qie', 'ㄑㄧㄝ'),
+                    ('qia', 'ㄑㄧㄚ'),
+                    ('pou', 'ㄆㄡ'),
+                    ('pin', 'ㄆㄧㄣ'),
+                    ('pie', 'ㄆㄧㄝ'),
+                    ('pen', 'ㄆㄣ'),
+                    ('pei', 'ㄆㄟ'),
+                    ('pao', 'ㄆㄠ'),
+                    ('pan', 'ㄆㄢ'),
+                    ('pai', 'ㄆㄞ'),
+                    ('nuo', 'ㄋㄨㄛ'),
+                    ('nüe', 'ㄋㄩㄝ'),
+                    ('nou', 'ㄋㄡ'),
+                    ('niu', 'ㄋㄧㄡ'),
+                    ('nin', 'ㄋㄧㄣ'),
+                    ('nie', 'ㄋㄧㄝ'),
+                    ('nen', 'ㄋㄣ'),
+                    ('nei', 'ㄋㄟ'),
+                    ('nao', 'ㄋㄠ'),
+                    ('nan', 'ㄋㄢ'),
+                    ('nai', 'ㄋㄞ'),
+                    ('mou', 'ㄇㄡ'),
+                    ('miu', 'ㄇㄧㄡ'),
+                    ('min', 'ㄇㄧㄣ'),
+                    ('mie', 'ㄇㄧㄝ'),
+                    ('men', 'ㄇㄣ'),
+                    ('mei', 'ㄇㄟ'),
+                    ('mao', 'ㄇㄠ'),
+                    ('man', 'ㄇㄢ'),
+                    ('mai', 'ㄇㄞ'),
+                    ('luo', 'ㄌㄨㄛ'),
+                    ('lun', 'ㄌㄨㄣ'),
+                    ('lüe', 'ㄌㄩㄝ'),
+                    ('lou', 'ㄌㄡ'),
+                    ('liu', 'ㄌㄧㄡ'),
+                    ('lin', 'ㄌㄧㄣ'),
+                    ('lie', 'ㄌㄧㄝ'),
+                    ('lia', 'ㄌㄧㄚ'),
+                    ('lei', 'ㄌㄟ'),
+                    ('lao', 'ㄌㄠ'),
+                    ('lan', 'ㄌㄢ'),
+                    ('lai', 'ㄌㄞ'),
+                    ('kuo', 'ㄎㄨㄛ'),
+                    ('kun', 'ㄎㄨㄣ'),
+                    ('kui', 'ㄎㄨㄟ'),
+                    ('kua', 'ㄎㄨㄚ'),
+                    ('kou', 'ㄎㄡ'),
+                    ('ken', 'ㄎㄣ'),
+                    ('kao', 'ㄎㄠ'),
+                    ('kan', 'ㄎㄢ'),
+                    ('kai', 'ㄎㄞ'),
+                    ('jun', 'ㄐㄩㄣ'),
+                    ('jue', 'ㄐㄩㄝ'),
+                    ('jiu', 'ㄐㄧㄡ'),
+                    ('jin', 'ㄐㄧㄣ'),
+                    ('jie', 'ㄐㄧㄝ'),
+                    ('jia', 'ㄐㄧㄚ'),
+                    ('huo', 'ㄏㄨㄛ'),
+                    ('hun', 'ㄏㄨㄣ'),
+                    ('hui', 'ㄏㄨㄟ'),
+                    ('hua', 'ㄏㄨㄚ'),
+                    ('hou', 'ㄏㄡ'),
+                    ('hen', 'ㄏㄣ'),
+                    ('hei', 'ㄏㄟ'),
+                    ('hao', 'ㄏㄠ'),
+                    ('han', 'ㄏㄢ'),
+                    ('hai', 'ㄏㄞ'),
+                    ('guo', 'ㄍㄨㄛ'),
+                    ('gun', 'ㄍㄨㄣ'),
+                    ('gui', 'ㄍㄨㄟ'),
+                    ('gua', 'ㄍㄨㄚ'),
+                    ('gou', 'ㄍㄡ'),
+                    ('gen', 'ㄍㄣ'),
+                    ('gei', 'ㄍㄟ'),
+                    ('gao', 'ㄍㄠ'),
+                    ('gan', 'ㄍㄢ'),
+                    ('gai', 'ㄍㄞ'),
+                    ('fou', 'ㄈㄡ'),
+                    ('fen', 'ㄈㄣ'),
+                    ('fei', 'ㄈㄟ'),
+                    ('fan', 'ㄈㄢ'),
+                    ('eng', 'ㄥ'),
+                    ('duo', 'ㄉㄨㄛ'),
+                    ('dun', 'ㄉㄨㄣ'),
+                    ('dui', 'ㄉㄨㄟ'),
+                    ('dou', 'ㄉㄡ'),
+                    ('diu', 'ㄉㄧㄡ'),
+                    ('die', 'ㄉㄧㄝ'),
+                    ('dei', 'ㄉㄟ'),
+                    ('dao', 'ㄉㄠ'),
+                    ('dan', 'ㄉㄢ'),
+                    ('dai', 'ㄉㄞ'),
+                    ('cuo', 'ㄘㄨㄛ'),
+                    ('cun', 'ㄘㄨㄣ'),
+                    ('cui', 'ㄘㄨㄟ'),
+                    ('cou', 'ㄘㄡ'),
+                    ('chu', 'ㄔㄨ'),
+                    ('chi', 'ㄔ'),
+                    ('che', 'ㄔㄜ'),
+                    ('cha', 'ㄔㄚ'),
+                    ('cen', 'ㄘㄣ'),
+                    ('cao', 'ㄘㄠ'),
+                    ('can', 'ㄘㄢ'),
+                    ('cai', 'ㄘㄞ'),
+                    ('bin', 'ㄅㄧㄣ'),
+                    ('bie', 'ㄅㄧㄝ'),
+                    ('ben', 'ㄅㄣ'),
+                    ('bei', 'ㄅㄟ'),
+                    ('bao', 'ㄅㄠ'),
+                    ('ban', 'ㄅㄢ'),
+                    ('bai', 'ㄅㄞ'),
+                    ('ang', 'ㄤ'),
+                    ('zu', 'ㄗㄨ'),
+                    ('zi', 'ㄗ'),
+                    ('ze', 'ㄗㄜ'),
+                    ('za', 'ㄗㄚ'),
+                    ('yu', 'ㄩ'),
+                    ('yo', 'ㄧㄛ'),
+                    ('yi', 'ㄧ'),
+                    ('ye', 'ㄧㄝ'),
+                    ('ya', 'ㄧㄚ'),
+                    ('xu', 'ㄒㄩ'),
+                    ('xi', 'ㄒㄧ'),
+                    ('wu', 'ㄨ'),
+                    ('wo', 'ㄨㄛ'),
+                    ('wa', 'ㄨㄚ'),
+                    ('tu', 'ㄊㄨ'),
+                    ('ti', 'ㄊㄧ'),
+                    ('te', 'ㄊㄜ'),
+                    ('ta', 'ㄊㄚ'),
+                    ('su', 'ㄙㄨ'),
+                    ('si', 'ㄙ'),
+                    ('se', 'ㄙㄜ'),
+                    ('sa', 'ㄙㄚ'),
+                    ('ru', 'ㄖㄨ'),
+                    ('ri', 'ㄖ'),
+                    ('re', 'ㄖㄜ'),
+                    ('qu', 'ㄑㄩ'),
+                    ('qi', 'ㄑㄧ'),
+                    ('pu', 'ㄆㄨ'),
+                    ('po', 'ㄆㄛ'),
+                    ('pi', 'ㄆㄧ'),
+                    ('pa', 'ㄆㄚ'),
+                    ('ou', 'ㄡ'),
+                    ('nü', 'ㄋㄩ'),
+                    ('nu', 'ㄋㄨ'),
+                    ('ni', 'ㄋㄧ'),
+                    ('ne', 'ㄋㄜ'),
+                    ('na', 'ㄋㄚ'),
+                    ('mu', 'ㄇㄨ'),
+                    ('mo', 'ㄇㄛ'),
+                    ('mi', 'ㄇㄧ'),
+                    ('me', 'ㄇㄜ'),
+                    ('ma', 'ㄇㄚ'),
+                    ('lü', 'ㄌㄩ'),
+                    ('lu', 'ㄌㄨ'),
+                    ('li', 'ㄌㄧ'),
+                    ('le', 'ㄌㄜ'),
+                    ('la', 'ㄌㄚ'),
+                    ('ku', 'ㄎㄨ'),
+                    ('ke', 'ㄎㄜ'),
+                    ('ka', 'ㄎㄚ'),
+                    ('ju', 'ㄐㄩ'),
+                    ('ji', 'ㄐㄧ'),
+                    ('hu', 'ㄏㄨ'),
+                    ('he', 'ㄏㄜ'),
+                    ('ha', 'ㄏㄚ'),
+                    ('gu', 'ㄍㄨ'),
+                    ('ge', 'ㄍㄜ'),
+                    ('ga', 'ㄍㄚ'),
+                    ('fu', 'ㄈㄨ'),
+                    ('fo', 'ㄈㄛ'),
+                    ('fa', 'ㄈㄚ'),
+                    ('er', 'ㄦ'),
+                    ('en', 'ㄣ'),
+                    ('ei', 'ㄟ'),
+                    ('du', 'ㄉㄨ'),
+                    ('di', 'ㄉㄧ'),
+                    ('de', 'ㄉㄜ'),
+                    ('da', 'ㄉㄚ'),
+                    ('cu', 'ㄘㄨ'),
+                    ('ci', 'ㄘ'),
+                    ('ce', 'ㄘㄜ'),
+                    ('ca', 'ㄘㄚ'),
+                    ('bu', 'ㄅㄨ'),
+                    ('bo', 'ㄅㄛ'),
+                    ('bi', 'ㄅㄧ'),
+                    ('ba', 'ㄅㄚ'),
+                    ('ao', 'ㄠ'),
+                    ('an', 'ㄢ'),
+                    ('ai', 'ㄞ'),
+                    ('o', 'ㄛ'),
+                    ('e', 'ㄜ'),
+                    ('a', 'ㄚ'),
+                    ('5', '˙'),
+                    ('4', 'ˋ'),
+                    ('3', 'ˇ'),
+                    ('2', 'ˊ'),
+                    ('1', '')]
+
+# Chinese characters, as ranges of code points (first, end excluded)
+HAN_RANGES = (
+    # Han # So [26] CJK RADICAL REPEAT, CJK RADICAL RAP
+    (0x2E80, 0x2E9A),
+    # Han # So [89] CJK RADICAL CHOKE, CJK RADICAL C-SIMPLIFIED TURTLE
+    (0x2E9B, 0x2EF4),
+    # Han # So [214] KANGXI RADICAL ONE, KANGXI RADICAL FLUTE
+    (0x2F00, 0x2FD6),
+    # Han # Lm IDEOGRAPHIC ITERATION MARK
+    (0x3005, 0x3006),
+    # Han # Nl IDEOGRAPHIC NUMBER ZERO
+    (0x3007, 0x3008),
+    # Han # Nl [9] HANGZHOU NUMERAL ONE, HANGZHOU NUMERAL NINE
+    (0x3021, 0x302A),
+    # Han # Nl [3] HANGZHOU NUMERAL TEN, HANGZHOU NUMERAL THIRTY
+    (0x3038, 0x303B),
+    # Han # Lm VERTICAL IDEOGRAPHIC ITERATION MARK
+    (0x303B, 0x303C),
+    # Han # Lo [6582] CJK UNIFIED IDEOGRAPH-3400, CJK UNIFIED IDEOGRAPH-4DB5
+    (0x3400, 0x4DB6),
+    # Han # Lo [20932] CJK UNIFIED IDEOGRAPH-4E00, CJK UNIFIED IDEOGRAPH-9FC3
+    (0x4E00, 0x9FC4),
+    # Han # Lo [302] CJK COMPATIBILITY IDEOGRAPH-F900, CJK COMPATIBILITY
+    # IDEOGRAPH-FA2D
+    (0xF900, 0xFA2E),
+    # Han # Lo [59] CJK COMPATIBILITY IDEOGRAPH-FA30, CJK COMPATIBILITY
+    # IDEOGRAPH-FA6A
+    (0xFA30, 0xFA6B),
+    # Han # Lo [106] CJK COMPATIBILITY IDEOGRAPH-FA70, CJK COMPATIBILITY
+    # IDEOGRAPH-FAD9
+    (0xFA70, 0xFADA),
+    # Han # Lo [42711] CJK UNIFIED IDEOGRAPH-20000, CJK UNIFIED
+    # IDEOGRAPH-2A6D6
+    (0x20000, 0x2A6D7),
+    # Han # Lo [542] CJK COMPATIBILITY IDEOGRAPH-2F800, CJK COMPATIBILITY
+    # IDEOGRAPH-2FA1D
+    (0x2F800, 0x2FA1E))
+# The same ranges, as a regular expression character class
+HAN_CLASS = "".join(chr(first) + "-" + chr(end - 1)
+                    for first, end in HAN_RANGES)
+HAN_PATTERN = re.compile("[" + HAN_CLASS + "]")
+# A run of Chinese characters (group 1), or of other characters
+HAN_RUN_PATTERN = re.compile("([" + HAN_CLASS + "]+)|[^" + HAN_CLASS + "]+")
+# A run of characters which are not Chinese (maybe empty)
+NOT_HAN_RUN_PATTERN = re.compile("[^" + HAN_CLASS + "]*")
+
+
+def is_han(char):
+    """ Returns True if char is a Chinese character (see HAN_RANGES). """
+    return HAN_PATTERN.match(char) is not None
+
+
+def han_runs(string):
+    """
+    Split string into runs of Chinese characters and runs of other
+    characters. Returns a list of (is_han, run), like:
+    "我是Zhudi!" -> [(True, "我是"), (False, "Zhudi!")]
+
+    """
+    return [(match.group(1) is not None, match.group())
+            for match in HAN_RUN_PATTERN.finditer(string)]
+
+
+def split_senses(line):
+    """
+    Returns the senses of a line of a translation column, as a tuple:
+    "Au revoir!/Adieu!" -> ("Au revoir!", "Adieu!")
+
+    """
+    return tuple(line.rstrip("\n").split("/"))
+
+
+# Attributes of Data holding the columns of the dictionary
+COLUMNS = ("simplified", "traditional", "translation", "pinyin", "zhuyin")
+# Versions of the columns of Data objects, unique across all of them
+VERSIONS = itertools.count()
+
+
+class PackedColumn(object):
+    """ A read-only, list-like column stored in one big string (or UTF-8
+    buffer, see pack_columns), with the positions of its lines in two
+    arrays, instead of one string object per line. The buffer can be shared
+    by several columns. Lines keep a trailing newline, just like the lists
+    returned by PreProcessing.read_files.
+    """
+
+    def __init__(self, buffer, starts, ends):
+        self.buffer = buffer
+        self.starts = starts
+        self.ends = ends
+        self.encoded = isinstance(buffer, bytes)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        line = self.buffer[self.starts[index]:self.ends[index]]
+        if self.encoded:
+            return line.decode("utf-8")
+        return line
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+def character_size(string):
+    """
+    Returns the number of bytes each character of string takes in memory:
+    1 if they all are Latin-1, 2 if they all are in the Basic Multilingual
+    Plane, 4 otherwise.
+
+    """
+    highest = max(string, default="\x00")
+    if highest < "\u0100":
+        return 1
+    if highest < "\U00010000":
+        return 2
+    return 4
+
+
+def pack_columns(columns):
+    """
+    Returns a PackedColumn for each of the given columns (lists of lines),
+    all stored in the same buffer. Identical lines are only stored once:
+    the simplified form of most entries is their traditional one.
+
+    The buffer is a string, unless encoding it in UTF-8 is smaller: a string
+    takes 1 byte per character if they all are Latin-1, but 2 or 4 bytes
+    as soon as one of them is not (see character_size).
+
+    """
+    numbers = {}
+    chunks = []
+    tables = []
+    for column in columns:
+        table = array("I")
+        for line in column:
+            line = line.rstrip("\n") + "\n"
+            number = numbers.get(line)
+            if number is None:
+                number = len(chunks)
+                numbers[line] = number
+                chunks.append(line)
+            table.append(number)
+        tables.append(table)
+    buffer = "".join(chunks)
+    if not buffer.isascii():
+        encoded = [chunk.encode("utf-8") for chunk in chunks]
+        if (sum(len(chunk) for chunk in encoded) <
+                len(buffer) * character_size(buffer)):
+            chunks = encoded
+            buffer = b"".join(encoded)
+    # Positions of the distinct lines in the buffer
+    bounds = array("I", [0])
+    for chunk in chunks:
+        bounds.append(bounds[-1] + len(chunk))
+    packed = []
+    for table in tables:
+        starts = array("I", [bounds[number] for number in table])
+        ends = array("I", [bounds[number + 1] for number in table])
+        packed.append(PackedColumn(buffer, starts, ends))
+    return packed
+
 
 class Data(object):
     """ Data contains all the data used by Zhudi.
@@ -27,7 +626,7 @@ class Data(object):
                  wubi86, wubi86_short,
                  array30, array30_short,
                  cangjie5, cangjie5_short,
-                 pinyin, zhuyin=None):
+                 pinyin, zhuyin=None, translations=None):
         """
         hanzi          : set of characters to use ("" by default)
         romanisation   : romanisation to use ("" by default)
@@ -42,15 +641,28 @@ class Data(object):
         cangjie5_short : a dictionary of short cangjie5 codes
         pinyin         : a list of pinyin
         zhuyin         : a list of zhuyin (default = [])
+        translations   : a dictionary of language -> list of translations,
+                         for the entries of the same columns in other
+                         languages (default = {})
+
+        The columns can also come from a database.Database, set as backend:
+        searches are then done by the database.
 
         """
 
+        self.index_lock = threading.RLock()
         self.hanzi = ""
         self.romanisation = ""
+        self.indexes = {}
+        self.backend = None
         self.set_of_chinese_chars = set()
         self.simplified = simp
         self.traditional = trad
         self.translation = trans
+        if translations is None:
+            self.translations = {}
+        else:
+            self.translations = translations
         self.pinyin = pinyin
         if zhuyin is None:
             self.zhuyin = []
@@ -62,472 +674,102 @@ class Data(object):
         self.array30_short = array30_short
         self.cangjie5 = cangjie5
         self.cangjie5_short = cangjie5_short
-        self.pinyin_to_zhuyin = [('zhuang', 'ㄓㄨㄤ'),
-                                 ('shuang', 'ㄕㄨㄤ'),
-                                 ('chuang', 'ㄔㄨㄤ'),
-                                 ('zhuan', 'ㄓㄨㄢ'),
-                                 ('zhuai', 'ㄓㄨㄞ'),
-                                 ('zhong', 'ㄓㄨㄥ'),
-                                 ('zheng', 'ㄓㄥ'),
-                                 ('zhang', 'ㄓㄤ'),
-                                 ('xiong', 'ㄒㄩㄥ'),
-                                 ('xiang', 'ㄒㄧㄤ'),
-                                 ('shuan', 'ㄕㄨㄢ'),
-                                 ('shuai', 'ㄕㄨㄞ'),
-                                 ('sheng', 'ㄕㄥ'),
-                                 ('shang', 'ㄕㄤ'),
-                                 ('qiong', 'ㄑㄩㄥ'),
-                                 ('qiang', 'ㄑㄧㄤ'),
-                                 ('niang', 'ㄋㄧㄤ'),
-                                 ('liang', 'ㄌㄧㄤ'),
-                                 ('kuang', 'ㄎㄨㄤ'),
-                                 ('jiong', 'ㄐㄩㄥ'),
-                                 ('jiang', 'ㄐㄧㄤ'),
-                                 ('huang', 'ㄏㄨㄤ'),
-                                 ('guang', 'ㄍㄨㄤ'),
-                                 ('chuan', 'ㄔㄨㄢ'),
-                                 ('chuai', 'ㄔㄨㄞ'),
-                                 ('chong', 'ㄔㄨㄥ'),
-                                 ('cheng', 'ㄔㄥ'),
-                                 ('chang', 'ㄔㄤ'),
-                                 ('zuan', 'ㄗㄨㄢ'),
-                                 ('zong', 'ㄗㄨㄥ'),
-                                 ('zhuo', 'ㄓㄨㄛ'),
-                                 ('zhun', 'ㄓㄨㄣ'),
-                                 ('zhui', 'ㄓㄨㄟ'),
-                                 ('zhua', 'ㄓㄨㄚ'),
-                                 ('zhou', 'ㄓㄡ'),
-                                 ('zhen', 'ㄓㄣ'),
-                                 ('zhei', 'ㄓㄟ'),
-                                 ('zhao', 'ㄓㄠ'),
-                                 ('zhan', 'ㄓㄢ'),
-                                 ('zhai', 'ㄓㄞ'),
-                                 ('zeng', 'ㄗㄥ'),
-                                 ('zang', 'ㄗㄤ'),
-                                 ('yuan', 'ㄩㄢ'),
-                                 ('yong', 'ㄩㄥ'),
-                                 ('ying', 'ㄧㄥ'),
-                                 ('yang', 'ㄧㄤ'),
-                                 ('xuan', 'ㄒㄩㄢ'),
-                                 ('xing', 'ㄒㄧㄥ'),
-                                 ('xien', 'ㄒㄧㄢ'),
-                                 ('xiao', 'ㄒㄧㄠ'),
-                                 ('xian', 'ㄒㄧㄢ'),
-                                 ('wong', 'ㄨㄥ'),
-                                 ('weng', 'ㄨㄥ'),
-                                 ('wang', 'ㄨㄤ'),
-                                 ('tuan', 'ㄊㄨㄢ'),
-                                 ('tong', 'ㄊㄨㄥ'),
-                                 ('ting', 'ㄊㄧㄥ'),
-                                 ('tien', 'ㄊㄧㄢ'),
-                                 ('tiao', 'ㄊㄧㄠ'),
-                                 ('tian', 'ㄊㄧㄢ'),
-                                 ('teng', 'ㄊㄥ'),
-                                 ('tang', 'ㄊㄤ'),
-                                 ('suan', 'ㄙㄨㄢ'),
-                                 ('song', 'ㄙㄨㄥ'),
-                                 ('shuo', 'ㄕㄨㄛ'),
-                                 ('shun', 'ㄕㄨㄣ'),
-                                 ('shui', 'ㄕㄨㄟ'),
-                                 ('shua', 'ㄕㄨㄚ'),
-                                 ('shou', 'ㄕㄡ'),
-                                 ('shen', 'ㄕㄣ'),
-                                 ('shei', 'ㄕㄟ'),
-                                 ('shao', 'ㄕㄠ'),
-                                 ('shan', 'ㄕㄢ'),
-                                 ('shai', 'ㄕㄞ'),
-                                 ('seng', 'ㄙㄥ'),
-                                 ('sang', 'ㄙㄤ'),
-                                 ('ruan', 'ㄖㄨㄢ'),
-                                 ('rong', 'ㄖㄨㄥ'),
-                                 ('reng', 'ㄖㄥ'),
-                                 ('rang', 'ㄖㄤ'),
-                                 ('quan', 'ㄑㄩㄢ'),
-                                 ('qing', 'ㄑㄧㄥ'),
-                                 ('qien', 'ㄑㄧㄢ'),
-                                 ('qiao', 'ㄑㄧㄠ'),
-                                 ('qian', 'ㄑㄧㄢ'),
-                                 ('ping', 'ㄆㄧㄥ'),
-                                 ('pien', 'ㄆㄧㄢ'),
-                                 ('piao', 'ㄆㄧㄠ'),
-                                 ('pian', 'ㄆㄧㄢ'),
-                                 ('peng', 'ㄆㄥ'),
-                                 ('pang', 'ㄆㄤ'),
-                                 ('nuan', 'ㄋㄨㄢ'),
-                                 ('nong', 'ㄋㄨㄥ'),
-                                 ('ning', 'ㄋㄧㄥ'),
-                                 ('nien', 'ㄋㄧㄢ'),
-                                 ('niao', 'ㄋㄧㄠ'),
-                                 ('nian', 'ㄋㄧㄢ'),
-                                 ('neng', 'ㄋㄥ'),
-                                 ('nang', 'ㄋㄤ'),
-                                 ('ming', 'ㄇㄧㄥ'),
-                                 ('mien', 'ㄇㄧㄢ'),
-                                 ('miao', 'ㄇㄧㄠ'),
-                                 ('mian', 'ㄇㄧㄢ'),
-                                 ('meng', 'ㄇㄥ'),
-                                 ('mang', 'ㄇㄤ'),
-                                 ('luen', 'ㄌㄩㄢ'),
-                                 ('luan', 'ㄌㄨㄢ'),
-                                 ('long', 'ㄌㄨㄥ'),
-                                 ('ling', 'ㄌㄧㄥ'),
-                                 ('lien', 'ㄌㄧㄢ'),
-                                 ('liao', 'ㄌㄧㄠ'),
-                                 ('lian', 'ㄌㄧㄢ'),
-                                 ('leng', 'ㄌㄥ'),
-                                 ('lang', 'ㄌㄤ'),
-                                 ('kuan', 'ㄎㄨㄢ'),
-                                 ('kuai', 'ㄎㄨㄞ'),
-                                 ('kong', 'ㄎㄨㄥ'),
-                                 ('keng', 'ㄎㄥ'),
-                                 ('kang', 'ㄎㄤ'),
-                                 ('juan', 'ㄐㄩㄢ'),
-                                 ('jing', 'ㄐㄧㄥ'),
-                                 ('jien', 'ㄐㄧㄢ'),
-                                 ('jiao', 'ㄐㄧㄠ'),
-                                 ('jian', 'ㄐㄧㄢ'),
-                                 ('huan', 'ㄏㄨㄢ'),
-                                 ('huai', 'ㄏㄨㄞ'),
-                                 ('hong', 'ㄏㄨㄥ'),
-                                 ('heng', 'ㄏㄥ'),
-                                 ('hang', 'ㄏㄤ'),
-                                 ('guan', 'ㄍㄨㄢ'),
-                                 ('guai', 'ㄍㄨㄞ'),
-                                 ('gong', 'ㄍㄨㄥ'),
-                                 ('geng', 'ㄍㄥ'),
-                                 ('gang', 'ㄍㄤ'),
-                                 ('fong', 'ㄈㄨㄥ'),
-                                 ('fiao', 'ㄈㄧㄠ'),
-                                 ('feng', 'ㄈㄥ'),
-                                 ('fang', 'ㄈㄤ'),
-                                 ('duan', 'ㄉㄨㄢ'),
-                                 ('dong', 'ㄉㄨㄥ'),
-                                 ('ding', 'ㄉㄧㄥ'),
-                                 ('dien', 'ㄉㄧㄢ'),
-                                 ('diao', 'ㄉㄧㄠ'),
-                                 ('dian', 'ㄉㄧㄢ'),
-                                 ('deng', 'ㄉㄥ'),
-                                 ('dang', 'ㄉㄤ'),
-                                 ('cuan', 'ㄘㄨㄢ'),
-                                 ('cong', 'ㄘㄨㄥ'),
-                                 ('chuo', 'ㄔㄨㄛ'),
-                                 ('chun', 'ㄔㄨㄣ'),
-                                 ('chui', 'ㄔㄨㄟ'),
-                                 ('chua', 'ㄔㄨㄚ'),
-                                 ('chou', 'ㄔㄡ'),
-                                 ('chen', 'ㄔㄣ'),
-                                 ('chao', 'ㄔㄠ'),
-                                 ('chan', 'ㄔㄢ'),
-                                 ('chai', 'ㄔㄞ'),
-                                 ('ceng', 'ㄘㄥ'),
-                                 ('cang', 'ㄘㄤ'),
-                                 ('bing', 'ㄅㄧㄥ'),
-                                 ('bien', 'ㄅㄧㄢ'),
-                                 ('biao', 'ㄅㄧㄠ'),
-                                 ('bian', 'ㄅㄧㄢ'),
-                                 ('beng', 'ㄅㄥ'),
-                                 ('bang', 'ㄅㄤ'),
-                                 ('zuo', 'ㄗㄨㄛ'),
-                                 ('zun', 'ㄗㄨㄣ'),
-                                 ('zui', 'ㄗㄨㄟ'),
-                                 ('zou', 'ㄗㄡ'),
-                                 ('zhu', 'ㄓㄨ'),
-                                 ('zhi', 'ㄓ'),
-                                 ('zhe', 'ㄓㄜ'),
-                                 ('zha', 'ㄓㄚ'),
-                                 ('zen', 'ㄗㄣ'),
-                                 ('zei', 'ㄗㄟ'),
-                                 ('zao', 'ㄗㄠ'),
-                                 ('zan', 'ㄗㄢ'),
-                                 ('zai', 'ㄗㄞ'),
-                                 ('yun', 'ㄩㄣ'),
-                                 ('yue', 'ㄩㄝ'),
-                                 ('you', 'ㄧㄡ'),
-                                 ('yin', 'ㄧㄣ'),
-                                 ('yao', 'ㄧㄠ'),
-                                 ('yan', 'ㄧㄢ'),
-                                 ('yai', 'ㄧㄞ'),
-                                 ('xun', 'ㄒㄩㄣ'),
-                                 ('xue', 'ㄒㄩㄝ'),
-                                 ('xiu', 'ㄒㄧㄡ'),
-                                 ('xin', 'ㄒㄧㄣ'),
-                                 ('xie', 'ㄒㄧㄝ'),
-                                 ('xia', 'ㄒㄧㄚ'),
-                                 ('wen', 'ㄨㄣ'),
-                                 ('wei', 'ㄨㄟ'),
-                                 ('wan', 'ㄨㄢ'),
-                                 ('wai', 'ㄨㄞ'),
-                                 ('tuo', 'ㄊㄨㄛ'),
-                                 ('tun', 'ㄊㄨㄣ'),
-                                 ('tui', 'ㄊㄨㄟ'),
-                                 ('tou', 'ㄊㄡ'),
-                                 ('tie', 'ㄊㄧㄝ'),
-                                 ('tao', 'ㄊㄠ'),
-                                 ('tan', 'ㄊㄢ'),
-                                 ('tai', 'ㄊㄞ'),
-                                 ('suo', 'ㄙㄨㄛ'),
-                                 ('sun', 'ㄙㄨㄣ'),
-                                 ('sui', 'ㄙㄨㄟ'),
-                                 ('sou', 'ㄙㄡ'),
-                                 ('shu', 'ㄕㄨ'),
-                                 ('shi', 'ㄕ'),
-                                 ('she', 'ㄕㄜ'),
-                                 ('sha', 'ㄕㄚ'),
-                                 ('sen', 'ㄙㄣ'),
-                                 ('sei', 'ㄙㄟ'),
-                                 ('sao', 'ㄙㄠ'),
-                                 ('san', 'ㄙㄢ'),
-                                 ('sai', 'ㄙㄞ'),
-                                 ('ruo', 'ㄖㄨㄛ'),
-                                 ('run', 'ㄖㄨㄣ'),
-                                 ('rui', 'ㄖㄨㄟ'),
-                                 ('rou', 'ㄖㄡ'),
-                                 ('ren', 'ㄖㄣ'),
-                                 ('rao', 'ㄖㄠ'),
-                                 ('ran', 'ㄖㄢ'),
-                                 ('qun', 'ㄑㄩㄣ'),
-                                 ('que', 'ㄑㄩㄝ'),
-                                 ('qiu', 'ㄑㄧㄡ'),
-                                 ('qin', 'ㄑㄧㄣ'),
-                                 ('qie', 'ㄑㄧㄝ'),
-                                 ('qia', 'ㄑㄧㄚ'),
-                                 ('pou', 'ㄆㄡ'),
-                                 ('pin', 'ㄆㄧㄣ'),
-                                 ('pie', 'ㄆㄧㄝ'),
-                                 ('pen', 'ㄆㄣ'),
-                                 ('pei', 'ㄆㄟ'),
-                                 ('pao', 'ㄆㄠ'),
-                                 ('pan', 'ㄆㄢ'),
-                                 ('pai', 'ㄆㄞ'),
-                                 ('nuo', 'ㄋㄨㄛ'),
-                                 ('nüe', 'ㄋㄩㄝ'),
-                                 ('nou', 'ㄋㄡ'),
-                                 ('niu', 'ㄋㄧㄡ'),
-                                 ('nin', 'ㄋㄧㄣ'),
-                                 ('nie', 'ㄋㄧㄝ'),
-                                 ('nen', 'ㄋㄣ'),
-                                 ('nei', 'ㄋㄟ'),
-                                 ('nao', 'ㄋㄠ'),
-                                 ('nan', 'ㄋㄢ'),
-                                 ('nai', 'ㄋㄞ'),
-                                 ('mou', 'ㄇㄡ'),
-                                 ('miu', 'ㄇㄧㄡ'),
-                                 ('min', 'ㄇㄧㄣ'),
-                                 ('mie', 'ㄇㄧㄝ'),
-                                 ('men', 'ㄇㄣ'),
-                                 ('mei', 'ㄇㄟ'),
-                                 ('mao', 'ㄇㄠ'),
-                                 ('man', 'ㄇㄢ'),
-                                 ('mai', 'ㄇㄞ'),
-                                 ('luo', 'ㄌㄨㄛ'),
-                                 ('lun', 'ㄌㄨㄣ'),
-                                 ('lüe', 'ㄌㄩㄝ'),
-                                 ('lou', 'ㄌㄡ'),
-                                 ('liu', 'ㄌㄧㄡ'),
-                                 ('lin', 'ㄌㄧㄣ'),
-                                 ('lie', 'ㄌㄧㄝ'),
-                                 ('lia', 'ㄌㄧㄚ'),
-                                 ('lei', 'ㄌㄟ'),
-                                 ('lao', 'ㄌㄠ'),
-                                 ('lan', 'ㄌㄢ'),
-                                 ('lai', 'ㄌㄞ'),
-                                 ('kuo', 'ㄎㄨㄛ'),
-                                 ('kun', 'ㄎㄨㄣ'),
-                                 ('kui', 'ㄎㄨㄟ'),
-                                 ('kua', 'ㄎㄨㄚ'),
-                                 ('kou', 'ㄎㄡ'),
-                                 ('ken', 'ㄎㄣ'),
-                                 ('kao', 'ㄎㄠ'),
-                                 ('kan', 'ㄎㄢ'),
-                                 ('kai', 'ㄎㄞ'),
-                                 ('jun', 'ㄐㄩㄣ'),
-                                 ('jue', 'ㄐㄩㄝ'),
-                                 ('jiu', 'ㄐㄧㄡ'),
-                                 ('jin', 'ㄐㄧㄣ'),
-                                 ('jie', 'ㄐㄧㄝ'),
-                                 ('jia', 'ㄐㄧㄚ'),
-                                 ('huo', 'ㄏㄨㄛ'),
-                                 ('hun', 'ㄏㄨㄣ'),
-                                 ('hui', 'ㄏㄨㄟ'),
-                                 ('hua', 'ㄏㄨㄚ'),
-                                 ('hou', 'ㄏㄡ'),
-                                 ('hen', 'ㄏㄣ'),
-                                 ('hei', 'ㄏㄟ'),
-                                 ('hao', 'ㄏㄠ'),
-                                 ('han', 'ㄏㄢ'),
-                                 ('hai', 'ㄏㄞ'),
-                                 ('guo', 'ㄍㄨㄛ'),
-                                 ('gun', 'ㄍㄨㄣ'),
-                                 ('gui', 'ㄍㄨㄟ'),
-                                 ('gua', 'ㄍㄨㄚ'),
-                                 ('gou', 'ㄍㄡ'),
-                                 ('gen', 'ㄍㄣ'),
-                                 ('gei', 'ㄍㄟ'),
-                                 ('gao', 'ㄍㄠ'),
-                                 ('gan', 'ㄍㄢ'),
-                                 ('gai', 'ㄍㄞ'),
-                                 ('fou', 'ㄈㄡ'),
-                                 ('fen', 'ㄈㄣ'),
-                                 ('fei', 'ㄈㄟ'),
-                                 ('fan', 'ㄈㄢ'),
-                                 ('eng', 'ㄥ'),
-                                 ('duo', 'ㄉㄨㄛ'),
-                                 ('dun', 'ㄉㄨㄣ'),
-                                 ('dui', 'ㄉㄨㄟ'),
-                                 ('dou', 'ㄉㄡ'),
-                                 ('diu', 'ㄉㄧㄡ'),
-                                 ('die', 'ㄉㄧㄝ'),
-                                 ('dei', 'ㄉㄟ'),
-                                 ('dao', 'ㄉㄠ'),
-                                 ('dan', 'ㄉㄢ'),
-                                 ('dai', 'ㄉㄞ'),
-                                 ('cuo', 'ㄘㄨㄛ'),
-                                 ('cun', 'ㄘㄨㄣ'),
-                                 ('cui', 'ㄘㄨㄟ'),
-                                 ('cou', 'ㄘㄡ'),
-                                 ('chu', 'ㄔㄨ'),
-                                 ('chi', 'ㄔ'),
-                                 ('che', 'ㄔㄜ'),
-                                 ('cha', 'ㄔㄚ'),
-                                 ('cen', 'ㄘㄣ'),
-                                 ('cao', 'ㄘㄠ'),
-                                 ('can', 'ㄘㄢ'),
-                                 ('cai', 'ㄘㄞ'),
-                                 ('bin', 'ㄅㄧㄣ'),
-                                 ('bie', 'ㄅㄧㄝ'),
-                                 ('ben', 'ㄅㄣ'),
-                                 ('bei', 'ㄅㄟ'),
-                                 ('bao', 'ㄅㄠ'),
-                                 ('ban', 'ㄅㄢ'),
-                                 ('bai', 'ㄅㄞ'),
-                                 ('ang', 'ㄤ'),
-                                 ('zu', 'ㄗㄨ'),
-                                 ('zi', 'ㄗ'),
-                                 ('ze', 'ㄗㄜ'),
-                                 ('za', 'ㄗㄚ'),
-                                 ('yu', 'ㄩ'),
-                                 ('yo', 'ㄧㄛ'),
-                                 ('yi', 'ㄧ'),
-                                 ('ye', 'ㄧㄝ'),
-                                 ('ya', 'ㄧㄚ'),
-                                 ('xu', 'ㄒㄩ'),
-                                 ('xi', 'ㄒㄧ'),
-                                 ('wu', 'ㄨ'),
-                                 ('wo', 'ㄨㄛ'),
-                                 ('wa', 'ㄨㄚ'),
-                                 ('tu', 'ㄊㄨ'),
-                                 ('ti', 'ㄊㄧ'),
-                                 ('te', 'ㄊㄜ'),
-                                 ('ta', 'ㄊㄚ'),
-                                 ('su', 'ㄙㄨ'),
-                                 ('si', 'ㄙ'),
-                                 ('se', 'ㄙㄜ'),
-                                 ('sa', 'ㄙㄚ'),
-                                 ('ru', 'ㄖㄨ'),
-                                 ('ri', 'ㄖ'),
-                                 ('re', 'ㄖㄜ'),
-                                 ('qu', 'ㄑㄩ'),
-                                 ('qi', 'ㄑㄧ'),
-                                 ('pu', 'ㄆㄨ'),
-                                 ('po', 'ㄆㄛ'),
-                                 ('pi', 'ㄆㄧ'),
-                                 ('pa', 'ㄆㄚ'),
-                                 ('ou', 'ㄡ'),
-                                 ('nü', 'ㄋㄩ'),
-                                 ('nu', 'ㄋㄨ'),
-                                 ('ni', 'ㄋㄧ'),
-                                 ('ne', 'ㄋㄜ'),
-                                 ('na', 'ㄋㄚ'),
-                                 ('mu', 'ㄇㄨ'),
-                                 ('mo', 'ㄇㄛ'),
-                                 ('mi', 'ㄇㄧ'),
-                                 ('me', 'ㄇㄜ'),
-                                 ('ma', 'ㄇㄚ'),
-                                 ('lü', 'ㄌㄩ'),
-                                 ('lu', 'ㄌㄨ'),
-                                 ('li', 'ㄌㄧ'),
-                                 ('le', 'ㄌㄜ'),
-                                 ('la', 'ㄌㄚ'),
-                                 ('ku', 'ㄎㄨ'),
-                                 ('ke', 'ㄎㄜ'),
-                                 ('ka', 'ㄎㄚ'),
-                                 ('ju', 'ㄐㄩ'),
-                                 ('ji', 'ㄐㄧ'),
-                                 ('hu', 'ㄏㄨ'),
-                                 ('he', 'ㄏㄜ'),
-                                 ('ha', 'ㄏㄚ'),
-                                 ('gu', 'ㄍㄨ'),
-                                 ('ge', 'ㄍㄜ'),
-                                 ('ga', 'ㄍㄚ'),
-                                 ('fu', 'ㄈㄨ'),
-                                 ('fo', 'ㄈㄛ'),
-                                 ('fa', 'ㄈㄚ'),
-                                 ('er', 'ㄦ'),
-                                 ('en', 'ㄣ'),
-                                 ('ei', 'ㄟ'),
-                                 ('du', 'ㄉㄨ'),
-                                 ('di', 'ㄉㄧ'),
-                                 ('de', 'ㄉㄜ'),
-                                 ('da', 'ㄉㄚ'),
-                                 ('cu', 'ㄘㄨ'),
-                                 ('ci', 'ㄘ'),
-                                 ('ce', 'ㄘㄜ'),
-                                 ('ca', 'ㄘㄚ'),
-                                 ('bu', 'ㄅㄨ'),
-                                 ('bo', 'ㄅㄛ'),
-                                 ('bi', 'ㄅㄧ'),
-                                 ('ba', 'ㄅㄚ'),
-                                 ('ao', 'ㄠ'),
-                                 ('an', 'ㄢ'),
-                                 ('ai', 'ㄞ'),
-                                 ('o', 'ㄛ'),
-                                 ('e', 'ㄜ'),
-                                 ('a', 'ㄚ'),
-                                 ('5', '˙'),
-                                 ('4', 'ˋ'),
-                                 ('3', 'ˇ'),
-                                 ('2', 'ˊ'),
-                                 ('1', '')]
+        self.pinyin_to_zhuyin = PINYIN_TO_ZHUYIN
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in COLUMNS or name == "translations":
+            self.changed()
+
+    def changed(self):
+        """
+        Forget the indexes built from the columns, and give them a new
+        version, so that the search results cached for the previous ones
+        (see processing.QueryCache) are not used anymore.
+
+        Called whenever a column, or the translations dictionary, is replaced.
+        Call it after modifying them in place.
+
+        """
+        with self.index_lock:
+            self.indexes = {}
+            self.version = next(VERSIONS)
+
+    def get_index(self, name, builder):
+        """
+        Returns the index called name, built by builder(self) the first time
+        it is asked for, and shared by everyone asking for it afterwards.
+        Indexes are built by one thread at a time, and never modified
+        afterwards, so they can be read by several threads.
+
+        """
+        index = self.indexes.get(name)
+        if index is None:
+            with self.index_lock:
+                index = self.indexes.get(name)
+                if index is None:
+                    index = builder(self)
+                    self.indexes[name] = index
+        return index
+
+    def pack(self):
+        """
+        Replace the columns, and the other translation columns, by
+        PackedColumn objects (see pack_columns), the traditional and
+        simplified ones sharing their buffer. They are read the same way,
+        a little more slowly, but take much less memory than lists of
+        strings: 15 MB instead of 54 MB for 120 000 entries.
+
+        """
+        self.traditional, self.simplified = pack_columns([self.traditional,
+                                                          self.simplified])
+        for name in ("translation", "pinyin", "zhuyin"):
+            setattr(self, name, pack_columns([getattr(self, name)])[0])
+        self.translations = dict((language, pack_columns([column])[0])
+                                 for language, column
+                                 in self.translations.items())
+
+    def languages(self):
+        """
+        Returns the sorted list of the languages of the other translation
+        columns.
+
+        """
+        return sorted(self.translations)
+
+    def translation_column(self, language=None):
+        """
+        Returns the translation column of the given language, or the main
+        one if language is None. The hanzi and pronunciation columns, and
+        their indexes, are shared by all of them.
+
+        """
+        if language is None:
+            return self.translation
+        try:
+            return self.translations[language]
+        except KeyError:
+            raise ValueError("Unknown language: " + str(language))
+
+    def senses(self, index, language=None):
+        """
+        Returns the senses of an entry, in the translation column of the
+        given language (see translation_column), as a tuple (see
+        split_senses).
+
+        """
+        return split_senses(self.translation_column(language)[index])
 
     def create_set_chinese_characters(self):
         """
-        Create the set of all Chinese characters, for later
+        Create the set of all Chinese characters, for later. The ranges of
+        HAN_RANGES are faster to use (see is_han and han_runs), and do not
+        need it.
 
         """
 
-        chinese_characters = []
-        # Han # So [26] CJK RADICAL REPEAT, CJK RADICAL RAP
-        chinese_characters += [x for x in range(0x2E80, 0x2E9A)]
-        # Han # So [89] CJK RADICAL CHOKE, CJK RADICAL C-SIMPLIFIED TURTLE
-        chinese_characters += [x for x in range(0x2E9B, 0x2EF4)]
-        # Han # So [214] KANGXI RADICAL ONE, KANGXI RADICAL FLUTE
-        chinese_characters += [x for x in range(0x2F00, 0x2FD6)]
-        # Han # Lm IDEOGRAPHIC ITERATION MARK
-        chinese_characters.append(0x3005)
-        # Han # Nl IDEOGRAPHIC NUMBER ZERO
-        chinese_characters.append(0x3007)
-        # Han # Nl [9] HANGZHOU NUMERAL ONE, HANGZHOU NUMERAL NINE
-        chinese_characters += [x for x in range(0x3021, 0x302A)]
-        # Han # Nl [3] HANGZHOU NUMERAL TEN, HANGZHOU NUMERAL THIRTY
-        chinese_characters += [x for x in range(0x3038, 0x303B)]
-        # Han # Lm VERTICAL IDEOGRAPHIC ITERATION MARK
-        chinese_characters.append(0x303B)
-        # Han # Lo [6582] CJK UNIFIED IDEOGRAPH-3400, CJK UNIFIED IDEOGRAPH-4DB5
-        chinese_characters += [x for x in range(0x3400, 0x4DB6)]
-        # Han # Lo [20932] CJK UNIFIED IDEOGRAPH-4E00, CJK UNIFIED IDEOGRAPH-9FC3
-        chinese_characters += [x for x in range(0x4E00, 0x9FC4)]
-        # Han # Lo [302] CJK COMPATIBILITY IDEOGRAPH-F900, CJK COMPATIBILITY IDEOGRAPH-FA2D
-        chinese_characters += [x for x in range(0xF900, 0xFA2E)]
-        # Han # Lo [59] CJK COMPATIBILITY IDEOGRAPH-FA30, CJK COMPATIBILITY IDEOGRAPH-FA6A
-        chinese_characters += [x for x in range(0xFA30, 0xFA6B)]
-        # Han # Lo [106] CJK COMPATIBILITY IDEOGRAPH-FA70, CJK COMPATIBILITY IDEOGRAPH-FAD9
-        chinese_characters += [x for x in range(0xFA70, 0xFADA)]
-        # Han # Lo [42711] CJK UNIFIED IDEOGRAPH-20000, CJK UNIFIED IDEOGRAPH-2A6D6
-        chinese_characters += [x for x in range(0x20000, 0x2A6D7)]
-        # Han # Lo [542] CJK COMPATIBILITY IDEOGRAPH-2F800, CJK COMPATIBILITY IDEOGRAPH-2FA1D
-        chinese_characters += [x for x in range(0x2F800, 0x2FA1E)]
-
-        self.set_of_chinese_chars = set(chinese_characters)
+        self.set_of_chinese_chars = set(
+            code for first, end in HAN_RANGES for code in range(first, end))
 
     def load_config(self):
         """ Reads the config file, if it exists, and set the right values for
@@ -0,0 +1,279 @@
+# coding: utf-8
+''' Zhudi provides a Chinese - language dictionnary based on the
+    C[E|F]DICT project Copyright - 2011 - Ma Jiehong
+
+    Zhudi is free software: you can redistribute it and/or modify it
+    under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Zhudi is distributed in the hope that it will be useful, but WITHOUT
+    ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+    or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+    License for more details.
+
+    You should have received a copy of the GNU General Public License
+    If not, see <http://www.gnu.org/licenses/>.
+
+'''
+
+import os
+import sqlite3
+import pathlib
+import threading
+
+from zhudi import indexes
+
+# Layout of a dictionary database:
+#
+#   entries         : one row per entry, its id being its index in the columns,
+#                     with the words of its translation (see indexes.tokenize)
+#                     and the toneless syllables of its pronunciation
+#   translation_fts : full text index of the words of the translations, which
+#                     are already normalized: they are only split on spaces
+#   hanzi_fts       : full text index of the hanzi (trigrams)
+#   syllable_fts    : full text index of the syllables
+#   sources         : the files the entries were read from, with the time
+#                     they were last modified
+VERSION = 2
+COLUMNS = ("pinyin", "zhuyin", "traditional", "simplified", "translation")
+SCHEMA = """
+CREATE TABLE entries (id INTEGER PRIMARY KEY, pinyin TEXT, zhuyin TEXT,
+                      traditional TEXT, simplified TEXT, translation TEXT,
+                      words TEXT, syllables TEXT);
+CREATE INDEX entries_traditional ON entries (traditional);
+CREATE INDEX entries_simplified ON entries (simplified);
+CREATE VIRTUAL TABLE translation_fts USING fts5(
+    words, content='entries', content_rowid='id',
+    tokenize="ascii tokenchars '_'", prefix='2 3');
+CREATE VIRTUAL TABLE hanzi_fts USING fts5(
+    traditional, simplified, content='entries', content_rowid='id',
+    tokenize='trigram');
+CREATE VIRTUAL TABLE syllable_fts USING fts5(
+    syllables, content='entries', content_rowid='id');
+CREATE TABLE sources (name TEXT, modified REAL);
+"""
+FTS_TABLES = ("translation_fts", "hanzi_fts", "syllable_fts")
+
+
+class DatabaseFormatError(Exception):
+    """
+    Raised when a file is not a dictionary database Zhudi can read.
+
+    """
+    pass
+
+
+def fts_phrase(text):
+    """ Returns text as an FTS5 phrase (between double quotes). """
+    return '"' + text.replace('"', '""') + '"'
+
+
+def like_pattern(text):
+    """ Returns a LIKE pattern (escaped with \\) matching lines containing
+    text.
+    """
+    text = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return "%" + text + "%"
+
+
+class SqliteColumn(object):
+    """ A read-only, list-like column of a dictionary database. Lines are
+    read when they are accessed, and keep a trailing newline, just like the
+    lists returned by PreProcessing.read_files.
+    """
+
+    def __init__(self, database, name, length):
+        self.database = database
+        self.name = name
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("column index out of range")
+        rows = self.database.execute("SELECT " + self.name + " FROM entries"
+                                     " WHERE id = ?", (index,))
+        return rows[0][0] + "\n"
+
+    def __iter__(self):
+        for row in self.database.execute("SELECT " + self.name + " FROM"
+                                         " entries ORDER BY id"):
+            yield row[0] + "\n"
+
+
+class Database(object):
+    """ A dictionary stored in an SQLite database, with FTS5 indexes over
+    its translations, hanzi and syllables. Its columns are SqliteColumn
+    objects, so entries are only loaded in memory when they are read.
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.connection = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def write(file_name, columns, syllables, sources=()):
+        """ Store the given columns into a new database file_name.
+
+        Arguments:
+        file_name: the output file (replaced if it exists)
+        columns: a dictionary of column name -> list of lines, with a list
+                 for each name of COLUMNS
+        syllables: the list of the toneless syllables of each entry, joined
+                   by spaces (see RomanisationIndex.normalize)
+        sources: the files the columns were read from, if any (see
+                 changed_sources)
+
+        """
+        entries = len(columns[COLUMNS[0]])
+        for name in COLUMNS:
+            if len(columns[name]) != entries:
+                raise DatabaseFormatError("Column " + name + " does not have "
+                                          "the same length as the others.")
+        connection = sqlite3.connect(file_name)
+        try:
+            for table in ("entries", "sources") + FTS_TABLES:
+                connection.execute("DROP TABLE IF EXISTS " + table)
+            connection.executescript(SCHEMA)
+            words = [" ".join(indexes.tokenize(line))
+                     for line in columns["translation"]]
+            rows = zip(range(entries),
+                       *[[line.rstrip("\n") for line in columns[name]]
+                         for name in COLUMNS] + [words, syllables])
+            connection.executemany("INSERT INTO entries VALUES"
+                                   " (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            for table in FTS_TABLES:
+                connection.execute("INSERT INTO " + table + "(" + table + ")"
+                                   " VALUES ('rebuild')")
+            connection.executemany("INSERT INTO sources VALUES (?, ?)",
+                                   [(os.path.abspath(name),
+                                     os.path.getmtime(name))
+                                    for name in sources])
+            connection.execute("PRAGMA user_version = " + str(VERSION))
+            connection.commit()
+        finally:
+            connection.close()
+
+    def load(self):
+        """ Open the database, and return its columns as a tuple:
+        (pinyin, zhuyin, traditional, simplified, translation)
+        """
+
+        try:
+            self.connection = sqlite3.connect(
+                pathlib.Path(self.file_name).absolute().as_uri() + "?mode=ro",
+                uri=True, check_same_thread=False)
+            version = self.execute("PRAGMA user_version")[0][0]
+            entries = self.execute("SELECT count(*) FROM entries")[0][0]
+        except sqlite3.Error as error:
+            self.close()
+            raise DatabaseFormatError(self.file_name + " is not a Zhudi"
+                                      " dictionary database (" + str(error) +
+                                      ").")
+        if version != VERSION:
+            self.close()
+            raise DatabaseFormatError(self.file_name + " has been built with"
+                                      " an unsupported format version (" +
+                                      str(version) + ").")
+        return tuple(SqliteColumn(self, name, entries) for name in COLUMNS)
+
+    def execute(self, query, parameters=()):
+        """ Run a query, and return the list of its rows. The connection is
+        shared by every thread, one query at a time.
+        """
+        with self.lock:
+            return self.connection.execute(query, parameters).fetchall()
+
+    def ids(self, query, parameters=()):
+        """ Run a query selecting ids, and return them as a list. """
+        return [row[0] for row in self.execute(query, parameters)]
+
+    def changed_sources(self):
+        """ Returns the files the database was built from which have been
+        modified since, and should be stored again.
+        """
+        try:
+            rows = self.execute("SELECT name, modified FROM sources")
+        except sqlite3.Error:
+            # Built before the sources were recorded
+            return []
+        return [name for name, modified in rows
+                if os.path.isfile(name) and os.path.getmtime(name) > modified]
+
+    def search_translation(self, text, prefix=False):
+        """ Returns the list of the (id, translation) of the entries whose
+        translation contains every word of text, sorted by id. If prefix is
+        True, the last word of text only has to be the beginning of a word of
+        the translation. Words are the ones of indexes.tokenize, just like in
+        the TranslationIndex.
+        """
+        words = [fts_phrase(word) for word in indexes.tokenize(text)]
+        if not words:
+            return []
+        if prefix:
+            words[-1] += "*"
+        return self.execute("SELECT id, translation FROM entries WHERE id IN"
+                            " (SELECT rowid FROM translation_fts WHERE"
+                            " translation_fts MATCH ?) ORDER BY id",
+                            (" AND ".join(words),))
+
+    def search_hanzi(self, column, text):
+        """ Returns the list of the (id, hanzi) of the entries whose column
+        (traditional or simplified) contains every word of text (case
+        insensitive), sorted by id.
+
+        Words of 3 characters or more are looked for in the trigram index.
+        The shorter ones are looked for with LIKE.
+        """
+        words = text.lower().split()
+        if not words:
+            return []
+        conditions = []
+        parameters = []
+        long_words = [word for word in words if len(word) >= 3]
+        if long_words:
+            conditions.append("id IN (SELECT rowid FROM hanzi_fts WHERE"
+                              " hanzi_fts MATCH ?)")
+            parameters.append(" AND ".join(column + " : " + fts_phrase(word)
+                                           for word in long_words))
+        for word in words:
+            if len(word) < 3:
+                conditions.append(column + " LIKE ? ESCAPE '\\'")
+                parameters.append(like_pattern(word))
+        return self.execute("SELECT id, " + column + " FROM entries WHERE " +
+                            " AND ".join(conditions) + " ORDER BY id",
+                            parameters)
+
+    def search_syllables(self, keys):
+        """ Returns the list of the (id, pinyin) of the entries whose
+        pronunciation may contain the given toneless syllables (see
+        RomanisationIndex), in this order, sorted by id. Tones still have to
+        be checked.
+        """
+        if not "".join(keys).strip():
+            return []
+        return self.execute("SELECT id, pinyin FROM entries WHERE id IN"
+                            " (SELECT rowid FROM syllable_fts WHERE"
+                            " syllable_fts MATCH ?) ORDER BY id",
+                            (fts_phrase(" ".join(keys)),))
+
+    def headword(self, column, word):
+        """ Returns the sorted ids of the entries whose column (traditional
+        or simplified) is word.
+        """
+        return self.ids("SELECT id FROM entries WHERE " + column + " = ?"
+                        " ORDER BY id", (word,))
+
+    def close(self):
+        """ Close the connection to the database. """
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -17,13 +17,236 @@
 
 '''
 
-from gi.repository import Gtk, Pango, Gdk
+import queue
+import threading
+
+from gi.repository import Gtk, Pango, Gdk, GLib, GObject
 import zhudi
 
 
 CANGJIE5_OBJ = zhudi.chinese_table.Cangjie5Table()
 ARRAY30_OBJ = zhudi.chinese_table.Array30Table()
 WUBI86_OBJ = zhudi.chinese_table.Wubi86Table()
+# Milliseconds without typing before a live search starts
+LIVE_SEARCH_DELAY = 150
+# Number of formatted entries kept by the EntryRenderer
+RENDER_CACHE_SIZE = 256
+# Number of characters of a result shown in the result list
+RESULT_WIDTH = 40
+
+
+class EntryRenderer(object):
+    """ Displays entries in a Gtk.TextBuffer, for both the dictionary and
+    the segmentation tabs.
+
+    The text of an entry and the position of its tags are computed once per
+    entry id, hanzi form and romanisation, and kept in a bounded cache. The
+    tags themselves are created once per buffer, and looked up by name.
+    """
+
+    TAGS = {"bold": {"weight": Pango.Weight.BOLD},
+            "big": {"size": 30 * Pango.SCALE},
+            "medium": {"size": 15 * Pango.SCALE},
+            "blue": {"foreground": "blue"}}
+
+    def __init__(self, data_object, cache_size=RENDER_CACHE_SIZE):
+        self.data_object = data_object
+        self.cache = zhudi.processing.QueryCache(cache_size)
+
+    @staticmethod
+    def input_codes(table, hanzi, column, displayed=True):
+        """ Returns the codes of every character of hanzi, each one between
+        [].
+        """
+        codes = ""
+        for character in hanzi:
+            key_code, displayed_code = table.proceed(character, column)
+            codes += "[" + (displayed_code if displayed else key_code) + "]"
+        return codes
+
+    def format(self, index):
+        """ Returns the formatted entry index, as a (text, tags) tuple, tags
+        being a list of (tag name, start offset, end offset).
+        """
+        data_object = self.data_object
+        key = (data_object.version, index, data_object.hanzi,
+               data_object.romanisation)
+        return self.cache.get(key, lambda: self.format_entry(index))
+
+    def format_entry(self, index):
+        """ Formats the entry index, without looking in the cache. """
+        data_object = self.data_object
+        if data_object.hanzi == "traditional":
+            hanzi = data_object.traditional[index].rstrip("\n")
+        else:
+            hanzi = data_object.simplified[index].rstrip("\n")
+        if data_object.romanisation == "zhuyin":
+            pronunciation = "".join("[" + syllable + "]" for syllable
+                                    in data_object.zhuyin[index].split())
+        else:
+            pronunciation = zhudi.processing.TONE_MARK_CONVERTER.convert(
+                data_object.pinyin[index]) + " "
+        # Numbered senses, and an empty line
+        senses = "".join(str(number) + ". " + sense + "\n" for number, sense
+                         in enumerate(data_object.senses(index), 1))
+
+        parts = [("Chinese", ("bold",)), ("\n", ()), (hanzi, ("big",)),
+                 ("\n\n\n", ()), ("Pronunciation", ("bold",)), ("\n", ()),
+                 (pronunciation, ("blue", "medium")),
+                 ("\n\n", ()), ("Meaning", ("bold",)),
+                 ("\n" + senses + "\n", ()),
+                 ("Input methods codes:", ("bold",)),
+                 ("\nArray30 (行列30): \n" +
+                  self.input_codes(ARRAY30_OBJ, hanzi, data_object.array30) +
+                  "\n\nCangjie5 (倉頡5): \n" +
+                  self.input_codes(CANGJIE5_OBJ, hanzi, data_object.cangjie5) +
+                  "\n\nWubi86 (五筆86): \n" +
+                  self.input_codes(WUBI86_OBJ, hanzi, data_object.wubi86,
+                                   False), ())]
+        text = ""
+        tags = []
+        for part, names in parts:
+            for name in names:
+                tags.append((name, len(text), len(text) + len(part)))
+            text += part
+        return text, tags
+
+    def buffer_tags(self, text_buffer):
+        """ Returns the tags of text_buffer by name, creating them the first
+        time.
+        """
+        table = text_buffer.get_tag_table()
+        tags = {}
+        for name, properties in self.TAGS.items():
+            tags[name] = table.lookup(name)
+            if tags[name] is None:
+                tags[name] = text_buffer.create_tag(name, **properties)
+        return tags
+
+    def render(self, text_buffer, index):
+        """ Display the entry index in text_buffer. """
+        text, tags = self.format(index)
+        text_buffer.set_text(text)
+        buffer_tags = self.buffer_tags(text_buffer)
+        for name, start, end in tags:
+            text_buffer.apply_tag(buffer_tags[name],
+                                  text_buffer.get_iter_at_offset(start),
+                                  text_buffer.get_iter_at_offset(end))
+
+
+class ResultsModel(GObject.Object, Gtk.TreeModel):
+    """ A list of search results, as a one column Gtk.TreeModel. Only the
+    ids of the entries are stored: a row is formatted when the view asks for
+    it, that is when it becomes visible, so that large results are shown at
+    once.
+
+    Iterators hold the number of their row, plus one (0 being None).
+    """
+
+    def __init__(self, data_object, ids=(), latin=False, empty_row=None):
+        """
+        Arguments:
+        data_object: the Data object the ids refer to
+        ids: the ids of the results, in order
+        latin: True to show the translations, False the hanzi
+        empty_row: if not None, the text of the only row shown when there
+                   is no result
+
+        """
+        GObject.Object.__init__(self)
+        self.data_object = data_object
+        self.ids = ids
+        self.latin = latin
+        self.empty_row = empty_row
+
+    def __len__(self):
+        if not self.ids and self.empty_row is not None:
+            return 1
+        return len(self.ids)
+
+    def row_text(self, row):
+        """ Returns the text of the given row: its number, and the beginning
+        of its entry.
+        """
+        if not self.ids:
+            return self.empty_row
+        index = self.ids[row]
+        if self.latin:
+            text = self.data_object.translation[index]
+        elif self.data_object.hanzi == "traditional":
+            text = self.data_object.traditional[index]
+        else:
+            text = self.data_object.simplified[index]
+        text = text.rstrip("\n")
+        if len(text) > RESULT_WIDTH:
+            text = text[:RESULT_WIDTH] + "…"
+        return str(row + 1) + ". " + text
+
+    def create_iter(self, row):
+        """ Returns a new iterator on row, or None if there is no such row.
+        """
+        if not 0 <= row < len(self):
+            return None
+        tree_iter = Gtk.TreeIter()
+        tree_iter.user_data = row + 1
+        return tree_iter
+
+    def do_get_flags(self):
+        return Gtk.TreeModelFlags.LIST_ONLY | Gtk.TreeModelFlags.ITERS_PERSIST
+
+    def do_get_n_columns(self):
+        return 1
+
+    def do_get_column_type(self, column):
+        return GObject.TYPE_STRING
+
+    def do_get_iter(self, path):
+        indices = path.get_indices()
+        tree_iter = None
+        if len(indices) == 1:
+            tree_iter = self.create_iter(indices[0])
+        return tree_iter is not None, tree_iter
+
+    def do_get_path(self, tree_iter):
+        return Gtk.TreePath.new_from_indices([tree_iter.user_data - 1])
+
+    def do_get_value(self, tree_iter, column):
+        return self.row_text(tree_iter.user_data - 1)
+
+    def do_iter_next(self, tree_iter):
+        if tree_iter.user_data >= len(self):
+            return False
+        tree_iter.user_data += 1
+        return True
+
+    def do_iter_previous(self, tree_iter):
+        if tree_iter.user_data <= 1:
+            return False
+        tree_iter.user_data -= 1
+        return True
+
+    def do_iter_children(self, parent):
+        tree_iter = None
+        if parent is None:
+            tree_iter = self.create_iter(0)
+        return tree_iter is not None, tree_iter
+
+    def do_iter_has_child(self, tree_iter):
+        return False
+
+    def do_iter_n_children(self, tree_iter):
+        if tree_iter is None:
+            return len(self)
+        return 0
+
+    def do_iter_nth_child(self, parent, row):
+        tree_iter = None
+        if parent is None:
+            tree_iter = self.create_iter(row)
+        return tree_iter is not None, tree_iter
+
+    def do_iter_parent(self, child):
+        return False, None
 
 
 class DictionaryWidgetMain(object):
@@ -31,10 +254,17 @@ class DictionaryWidgetMain(object):
     def __init__(self, data_object):
         self.data_object = data_object
         self.language = ""
-        self.results_list = []
+        self.results_list = None
+        self.results_tree = None
+        self.results = zhudi.processing.NO_RESULT
         self.lock = False
         self.search_field = None
         self.translation_box = None
+        self.live_tools = None
+        self.live_queries = queue.Queue()
+        self.live_worker = None
+        self.live_timeout = None
+        self.generation = 0
 
     def build(self):
         """ Mandatory build() function. """
@@ -46,6 +276,7 @@ class DictionaryWidgetMain(object):
         search_field.set_visible(True)
         search_field.connect("activate",
                              lambda x: self.search_asked(search_field))
+        search_field.connect("changed", self.search_typed)
         search_field.set_placeholder_text("Looking for something?")
         self.search_field = search_field
 
@@ -67,24 +298,27 @@ class DictionaryWidgetMain(object):
         frame_search.set_label_widget(search_label)
         frame_search.add(sb_box)
 
-        # Results part in a list
-        self.results_list = Gtk.ListStore(str)
+        # Results part in a list, whose rows all have the same height, so
+        # that only the visible ones are formatted
+        self.results_list = ResultsModel(self.data_object)
         results_tree = Gtk.TreeView(self.results_list)
         renderer = Gtk.CellRendererText()
         results_tree.tvcolumn = Gtk.TreeViewColumn("Results", renderer, text=0)
+        results_tree.tvcolumn.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
+        results_tree.tvcolumn.set_expand(True)
         results_tree.append_column(results_tree.tvcolumn)
-        self.results_list.cell = Gtk.CellRendererText()
-        results_tree.tvcolumn.pack_start(self.results_list.cell, True)
+        results_tree.set_fixed_height_mode(True)
         results_tree.set_enable_search(False)
         results_tree.tvcolumn.set_sort_column_id(-1)
         results_tree.set_reorderable(False)
         select = results_tree.get_selection()
         select.connect("changed", self.display_another_result)
+        self.results_tree = results_tree
 
         results_scroll = Gtk.ScrolledWindow()
         # No horizontal bar, automatic vertical bar
         results_scroll.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
-        results_scroll.add_with_viewport(results_tree)
+        results_scroll.add(results_tree)
 
         frame_results = Gtk.Frame()
         frame_results.add(results_scroll)
@@ -133,26 +367,146 @@ class DictionaryWidgetMain(object):
         return horizontal_box
 
     def search_asked(self, searchfield):
-        """ Start search when users hit ENTER or the search button. """
+        """ Start search when users hit ENTER or the search button. The
+        search itself runs in the search worker, like live searches.
+        """
+        self.cancel_live_search()
         text = searchfield.get_text()
         if text == "":
             self.lock = True
-            DICTIONARY_TOOLS_OBJECT.index = []
-            self.results_list.clear()
+            self.results = zhudi.processing.NO_RESULT
+            self.update_results()
             self.display_translation(0)
         else:
-            self.lock = False
-            self.language = self.determine_language(text)
-            if self.language == "Latin":
-                given_list = self.data_object.translation
-            elif self.data_object.hanzi == "Traditional":
-                given_list = self.data_object.traditional
+            self.send_search(text, self.generation, True)
+    # end of search_asked
+
+    def search_typed(self, searchfield):
+        """ Start a live search once users stop typing for LIVE_SEARCH_DELAY
+        milliseconds.
+        """
+        self.cancel_live_search()
+        self.live_timeout = GLib.timeout_add(LIVE_SEARCH_DELAY,
+                                             self.start_live_search,
+                                             searchfield.get_text(),
+                                             self.generation)
+
+    def cancel_live_search(self):
+        """ Forget the pending live search, and the results of the running
+        search, if any. The running search stops at its next stage.
+        """
+        self.generation += 1
+        if self.live_timeout is not None:
+            GLib.source_remove(self.live_timeout)
+            self.live_timeout = None
+
+    def start_live_search(self, text, generation):
+        """ Send the live search request to the search worker. """
+        self.live_timeout = None
+        if generation != self.generation:
+            return False
+        if text.strip() == "":
+            self.search_asked(self.search_field)
+            return False
+        self.send_search(text, generation, False)
+        return False
+
+    def send_search(self, text, generation, full):
+        """ Send a request to the search worker, started the first time.
+        full is True for a search asked for with ENTER, False for a live
+        search.
+        """
+        self.language = self.determine_language(text)
+        if self.language == "Latin":
+            given_list = self.data_object.translation
+        elif self.data_object.hanzi == "Traditional":
+            given_list = self.data_object.traditional
+        else:
+            given_list = self.data_object.simplified
+        if self.live_tools is None:
+            self.live_tools = zhudi.processing.DictionaryTools()
+            self.live_tools.load(self.data_object)
+        if self.live_worker is None:
+            self.live_worker = threading.Thread(target=self.live_search_loop)
+            self.live_worker.daemon = True
+            self.live_worker.start()
+        self.live_queries.put((generation, given_list, text, full))
+
+    def live_search_loop(self):
+        """ Run the searches, off the GTK main loop, so that indexes are only
+        built here. Requests superseded while waiting are skipped, running
+        ones stop between their stages, and the results are given back to
+        the main loop with GLib.idle_add.
+        """
+        while True:
+            request = self.live_queries.get()
+            try:
+                while True:
+                    request = self.live_queries.get_nowait()
+            except queue.Empty:
+                pass
+            generation, given_list, text, full = request
+            if full:
+                results = self.full_search(generation, given_list, text)
             else:
-                given_list = self.data_object.simplified
-            DICTIONARY_TOOLS_OBJECT.search(given_list, text)
+                results = self.live_search(generation, given_list, text)
+            if results is not None:
+                GLib.idle_add(self.show_live_results, generation, results)
+            if (given_list is self.data_object.translation and
+                    self.live_queries.empty()):
+                # Build the index of misspelled words while nothing else
+                # has to be searched
+                zhudi.indexes.fuzzy_index(self.data_object)
+
+    def live_search(self, generation, given_list, text):
+        """ Returns the results of a live search of text, or None if it was
+        superseded.
+        """
+        tools = self.live_tools
+        if generation != self.generation:
+            return None
+        if zhudi.indexes.WILDCARD_PATTERN.search(text):
+            results = tools.query(given_list, text, mode="wildcard")
+        else:
+            results = tools.live_search(given_list, text)
+        if given_list is self.data_object.translation and not results.ids:
+            # Maybe some pinyin or zhuyin
+            if generation != self.generation:
+                return None
+            results = tools.live_search(self.data_object.pinyin, text)
+        return results
+
+    def full_search(self, generation, given_list, text):
+        """ Returns the results of a search of whole words of text, or None
+        if it was superseded.
+        """
+        tools = self.live_tools
+        if generation != self.generation:
+            return None
+        if zhudi.indexes.WILDCARD_PATTERN.search(text):
+            results = tools.query(given_list, text, mode="wildcard")
+        else:
+            results = tools.query(given_list, text, fuzzy=False)
+        if given_list is self.data_object.translation and not results.ids:
+            # Maybe some pinyin or zhuyin
+            if generation != self.generation:
+                return None
+            results = tools.query(self.data_object.pinyin, text)
+        if given_list is self.data_object.translation and not results.ids:
+            # Maybe some misspelled words
+            if generation != self.generation:
+                return None
+            results = tools.query(given_list, text)
+        return results
+
+    def show_live_results(self, generation, results):
+        """ Display the results of a search, unless it was superseded. """
+        if generation == self.generation:
+            self.lock = False
+            self.results = results
             self.update_results()
             self.display_translation(0)
-    # end of search_asked
+        return False
 
     @staticmethod
     def determine_language(input_text):
@@ -170,159 +524,25 @@ class DictionaryWidgetMain(object):
         """ Handles the display of the translation for the selected element. """
 
         translation_buffer = self.translation_box.get_buffer()
-        if len(DICTIONARY_TOOLS_OBJECT.index) == 0:
+        if len(self.results.ids) == 0:
             translation_buffer.set_text("Nothing found.")
-            if len(self.results_list) == 0:
-                self.results_list.append(["Nothing found."])
             return
-        else:
-            index = DICTIONARY_TOOLS_OBJECT.index[which]
-
-        if self.data_object.hanzi == "traditional":
-            hanzi_dic = self.data_object.traditional
-        else:
-            hanzi_dic = self.data_object.simplified
-        if self.data_object.romanisation == "zhuyin":
-            romanisation_dic = self.data_object.zhuyin
-        else:
-            romanisation_dic = self.data_object.pinyin
-
-        slash_list = []
-        trans_index = self.data_object.translation[index]
-        for l in range(len(trans_index)):
-            if trans_index[l] == "/":
-                slash_list.append(l)
-        temp = 0
-        trans = []
-        for local_index in range(len(slash_list)):
-            trans.append(str(local_index + 1) + ". " + trans_index[temp:slash_list[local_index]])
-            temp = slash_list[local_index] + 1
-        trans.append(str(len(slash_list) + 1) + ". " + trans_index[temp:len(trans_index)])
-        string = ""
-        for i in range(len(slash_list) + 1):
-            string = string + trans[i] + "\n"
-
-        # Add [] arround the pronounciation parts
-        p_string = romanisation_dic[index].split()
-        pronounciation_string = []
-        for point in range(len(p_string)):
-            if self.data_object.romanisation == "pinyin":
-                pronounciation_string.append(DICTIONARY_TOOLS_OBJECT.unicode_pinyin(p_string[point]))
-                pronounciation_string.append(" ")
-            else:
-                pronounciation_string.append("[")
-                pronounciation_string.append(p_string[point])
-                pronounciation_string.append("]")
-        # Display the cangjie of the entry
-        cangjie5_displayed = ""
-        for hanzi in hanzi_dic[index]:
-            if hanzi != "\n":
-                key_code, displayed_code = CANGJIE5_OBJ.proceed(hanzi, self.data_object.cangjie5)
-                cangjie5_displayed += "["
-                cangjie5_displayed += displayed_code
-                cangjie5_displayed += "]"
-        # Display the array30 of the entry
-        array30_displayed = ""
-        for hanzi in hanzi_dic[index]:
-            if hanzi != "\n":
-                key_code, displayed_code = ARRAY30_OBJ.proceed(hanzi, self.data_object.array30)
-                array30_displayed += "["
-                array30_displayed += displayed_code
-                array30_displayed += "]"
-        # Display the array30 of the entry (here code = displayed)
-        wubi86_code = ""
-        for hanzi in hanzi_dic[index]:
-            if hanzi != "\n":
-                key_code, displayed_code = WUBI86_OBJ.proceed(hanzi, self.data_object.wubi86)
-                wubi86_code += "["
-                wubi86_code += key_code
-                wubi86_code += "]"
-        # Display in the Translation box
-        translation_buffer.set_text("Chinese\n" + hanzi_dic[index] + "\n\n" +
-                                    "Pronunciation\n" + ''.join(pronounciation_string) + "\n\n" +
-                                    "Meaning\n" + string +
-                                    "Input methods codes:\n" +
-                                    "Array30 (行列30): \n" + array30_displayed + "\n\n" +
-                                    "Cangjie5 (倉頡5): \n" + cangjie5_displayed + "\n\n" +
-                                    "Wubi86 (五筆86): \n" + wubi86_code)
-        bold = translation_buffer.create_tag(weight=Pango.Weight.BOLD)
-        big = translation_buffer.create_tag(size=30 * Pango.SCALE)
-        medium = translation_buffer.create_tag(size=15 * Pango.SCALE)
-        blue = translation_buffer.create_tag(foreground="blue")
-
-        # "Chinese" in bold
-        start_1 = translation_buffer.get_iter_at_line(0)
-        end_1 = translation_buffer.get_iter_at_line(0)
-        end_1.forward_to_line_end()
-        translation_buffer.apply_tag(bold, start_1, end_1)
-
-        # Bigger Chinese
-        start_c = translation_buffer.get_iter_at_line(1)
-        end_c = translation_buffer.get_iter_at_line(1)
-        end_c.forward_to_line_end()
-        translation_buffer.apply_tag(big, start_c, end_c)
-
-        # "Pronunciation" in bold
-        start_2 = translation_buffer.get_iter_at_line(4)
-        end_2 = translation_buffer.get_iter_at_line(4)
-        end_2.forward_to_line_end()
-        translation_buffer.apply_tag(bold, start_2, end_2)
-
-        # "Pronunciation" in blue
-        start_3 = translation_buffer.get_iter_at_line(5)
-        end_3 = translation_buffer.get_iter_at_line(5)
-        end_3.forward_to_line_end()
-        translation_buffer.apply_tag(blue, start_3, end_3)
-        translation_buffer.apply_tag(medium, start_3, end_3)
-
-        # "Meaning" in bold
-        start_3 = translation_buffer.get_iter_at_line(7)
-        end_3 = translation_buffer.get_iter_at_line(7)
-        end_3.forward_to_line_end()
-        translation_buffer.apply_tag(bold, start_3, end_3)
-        guess = string.count("\n")
-
-        # "Input methods codes" in bold
-        start_4 = translation_buffer.get_iter_at_line(guess+7)
-        end_4 = translation_buffer.get_iter_at_line(guess+7)
-        end_4.forward_to_line_end()
-        translation_buffer.apply_tag(bold, start_4, end_4)
+        ENTRY_RENDERER.render(translation_buffer, self.results.ids[which])
 
     def update_results(self):
-        """ Clear, and refill the result list. """
-        self.results_list.clear()
-        displayed_index = 1
-        threashold = 40  # threshold for line wrap
-        for k in DICTIONARY_TOOLS_OBJECT.index:
-            if self.language == "latin":
-                string = self.data_object.translation[k]
-            elif self.data_object.hanzi == "traditional":
-                string = self.data_object.traditional[k]
-            else:
-                string = self.data_object.simplified[k]
-            if len(string) > threashold:
-                string = str(displayed_index) + ". " + string[0:threashold] + "…"
-            else:
-                string = str(displayed_index) + ". " + string
-            string = string[:-1]  # no \n
-            self.results_list.append([string])
-            displayed_index += 1
+        """ Replace the result list by the current results. """
+        self.results_list = ResultsModel(self.data_object, self.results.ids,
+                                         self.language == "Latin",
+                                         "Nothing found.")
+        self.results_tree.set_model(self.results_list)
 
     def display_another_result(self, selection):
         """ Display the newly selected result. """
         if not self.lock:
             model, treeiter = selection.get_selected()
-            if treeiter is not None:
-                row = model[treeiter][0]
-                counter = 0
-                if row is not None:
-                    while row[counter] != ".":
-                        counter += 1
-                    figure = int(row[0:counter])
-                    if figure > len(DICTIONARY_TOOLS_OBJECT.index):
-                        self.display_translation(0)
-                    else:
-                        self.display_translation(figure-1)
+            if treeiter is not None and self.results.ids:
+                self.display_translation(
+                    model.get_path(treeiter).get_indices()[0])
 
 
 class SegmentationWidget(object):
@@ -477,118 +697,8 @@ class SegmentationWidget(object):
 
         if bypass:
             translation_buffer.set_text(index)
-            return
-
-        if self.data_object.hanzi == "traditional":
-            hanzi_dic = self.data_object.traditional
         else:
-            hanzi_dic = self.data_object.simplified
-
-        if self.data_object.romanisation == "zhuyin":
-            romanisation_dic = self.data_object.zhuyin
-        else:
-            romanisation_dic = self.data_object.pinyin
-
-        slash_list = []
-        trans_index = self.data_object.translation[index]
-        for line in range(len(trans_index)):
-            if trans_index[line] == "/":
-                slash_list.append(line)
-        temp = 0
-        trans = []
-        for key in range(len(slash_list)):
-            trans.append(str(key+1) + ". " + trans_index[temp:slash_list[key]])
-            temp = slash_list[key]+1
-        trans.append(str(len(slash_list) + 1) + ". " + trans_index[temp:len(trans_index)])
-        string = ""
-        for local_index in range(len(slash_list) + 1):
-            string = string + trans[local_index] + "\n"
-
-        # Add [] arround the pronounciation parts
-        p_string = romanisation_dic[index].split()
-        pronounciation_string = []
-        for point in range(len(p_string)):
-            if self.data_object.romanisation == "pinyin":
-                pronounciation_string.append(DICTIONARY_TOOLS_OBJECT.unicode_pinyin(p_string[point]))
-                pronounciation_string.append(" ")
-            else:
-                pronounciation_string.append("[")
-                pronounciation_string.append(p_string[point])
-                pronounciation_string.append("]")
-        # Display the cangjie of the entry
-        cangjie5_displayed = ""
-        for hanzi in hanzi_dic[index]:
-            if hanzi != "\n":
-                key_code, displayed_code = CANGJIE5_OBJ.proceed(hanzi, self.data_object.cangjie5)
-                cangjie5_displayed += "["
-                cangjie5_displayed += displayed_code
-                cangjie5_displayed += "]"
-        # Display the array30 of the entry
-        array30_displayed = ""
-        for hanzi in hanzi_dic[index]:
-            if hanzi != "\n":
-                key_code, displayed_code = ARRAY30_OBJ.proceed(hanzi, self.data_object.array30)
-                array30_displayed += "["
-                array30_displayed += displayed_code
-                array30_displayed += "]"
-        # Display the array30 of the entry (here code = displayed)
-        wubi86_code = ""
-        for hanzi in hanzi_dic[index]:
-            if hanzi != "\n":
-                key_code, displayed_code = WUBI86_OBJ.proceed(hanzi, self.data_object.wubi86)
-                wubi86_code += "["
-                wubi86_code += key_code
-                wubi86_code += "]"
-        # Display in the Translation box
-        translation_buffer.set_text("Chinese\n" + hanzi_dic[index] + "\n\n" +
-                                    "Pronunciation\n" + ''.join(pronounciation_string) + "\n\n"
-                                    "Meaning\n" + string +
-                                    "Input methods codes:\n" +
-                                    "Array30 (行列30): \n" + array30_displayed + "\n\n" +
-                                    "Cangjie5 (倉頡5): \n" + cangjie5_displayed + "\n\n" +
-                                    "Wubi86 (五筆86): \n" + wubi86_code)
-        bold = translation_buffer.create_tag(weight=Pango.Weight.BOLD)
-        big = translation_buffer.create_tag(size=30*Pango.SCALE)
-        medium = translation_buffer.create_tag(size=15*Pango.SCALE)
-        blue = translation_buffer.create_tag(foreground="blue")
-
-        # "Chinese" in bold
-        start_1 = translation_buffer.get_iter_at_line(0)
-        end_1 = translation_buffer.get_iter_at_line(0)
-        end_1.forward_to_line_end()
-        translation_buffer.apply_tag(bold, start_1, end_1)
-
-        # Bigger Chinese
-        start_c = translation_buffer.get_iter_at_line(1)
-        end_c = translation_buffer.get_iter_at_line(1)
-        end_c.forward_to_line_end()
-        translation_buffer.apply_tag(big, start_c, end_c)
-
-        # "Pronunciation" in bold
-        start_2 = translation_buffer.get_iter_at_line(4)
-        end_2 = translation_buffer.get_iter_at_line(4)
-        end_2.forward_to_line_end()
-        translation_buffer.apply_tag(bold, start_2, end_2)
-
-        # "Pronunciation" in blue
-        start_3 = translation_buffer.get_iter_at_line(5)
-        end_3 = translation_buffer.get_iter_at_line(5)
-        end_3.forward_to_line_end()
-        translation_buffer.apply_tag(blue, start_3, end_3)
-        translation_buffer.apply_tag(medium, start_3, end_3)
-
-        # "Meaning" in bold
-        start_3 = translation_buffer.get_iter_at_line(7)
-        end_3 = translation_buffer.get_iter_at_line(7)
-        end_3.forward_to_line_end()
-        translation_buffer.apply_tag(bold, start_3, end_3)
-        guess = string.count("\n")
-
-        # "Input methods codes" in bold
-        start_4 = translation_buffer.get_iter_at_line(guess+7)
-        end_4 = translation_buffer.get_iter_at_line(guess+7)
-        end_4.forward_to_line_end()
-        translation_buffer.apply_tag(bold, start_4, end_4)
+            ENTRY_RENDERER.render(translation_buffer, index)
 
     def word_selected(self, selection):
         """ Display the selected word in the translation area.
@@ -718,12 +828,11 @@ class MainWindow(object):
 
     def build(self):
         """ Mandatory build function. """
-        self.data_object.create_set_chinese_characters()
-        global DICTIONARY_TOOLS_OBJECT
-        DICTIONARY_TOOLS_OBJECT = zhudi.processing.DictionaryTools()
         global SEGMENTATION_TOOLS_OBJECT
         SEGMENTATION_TOOLS_OBJECT = zhudi.processing.SegmentationTools()
         SEGMENTATION_TOOLS_OBJECT.load(self.data_object)
+        global ENTRY_RENDERER
+        ENTRY_RENDERER = EntryRenderer(self.data_object)
         # Welcome tab
         self.vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=2)
 
@@ -0,0 +1,643 @@
+# coding: utf-8
+''' Zhudi provides a Chinese - language dictionnary based on the
+    C[E|F]DICT project Copyright - 2011 - Ma Jiehong
+
+    Zhudi is free software: you can redistribute it and/or modify it
+    under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Zhudi is distributed in the hope that it will be useful, but WITHOUT
+    ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+    or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+    License for more details.
+
+    You should have received a copy of the GNU General Public License
+    If not, see <http://www.gnu.org/licenses/>.
+
+'''
+
+import re
+import bisect
+import functools
+import unicodedata
+from array import array
+
+# Words of a translation, in any language
+TOKEN_PATTERN = re.compile(r"\w+")
+# Syllables of pinyin or zhuyin, with their tone number or mark, if any
+SYLLABLE_PATTERN = re.compile(r"˙?[^\s\dˊˇˋ˙]+[\dˊˇˋ˙]?")
+# Tones of pinyin diacritics (once decomposed), and of zhuyin marks
+PINYIN_TONE_MARKS = {"\u0304": 1, "\u0301": 2, "\u030c": 3, "\u0300": 4}
+ZHUYIN_TONE_MARKS = {"ˊ": 2, "ˇ": 3, "ˋ": 4, "˙": 5}
+# Wildcards: any character, and any characters (ASCII and full width)
+WILDCARD_PATTERN = re.compile(r"[?*？＊]")
+# An escape of a regular expression standing for something else than the
+# character following the backslash: \u, \U and \x codes, named characters,
+# octal codes, group references, classes (\d, \w…) and assertions (\b, \A…)
+REGEX_ESCAPE_PATTERN = re.compile(r"\\(?:u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|"
+                                  r"x[0-9a-fA-F]{2}|N\{[^}]*\}|0[0-7]{0,2}|"
+                                  r"[0-7]{3}|[1-9][0-9]?|[a-zA-Z])")
+# Keys of FuzzyIndex (63 bits): the hash of a variant, then a word id of at
+# least WORD_ID_BITS bits (more for larger vocabularies)
+KEY_BITS = 63
+WORD_ID_BITS = 20
+# Number of syllables whose normalization (or conversion) is remembered: all
+# the ones of a dictionary, but not everything typed in a long session
+SYLLABLE_CACHE_SIZE = 8192
+
+
+def tokenize(text):
+    """ Returns the list of the normalized (case folded) words of text. """
+    return TOKEN_PATTERN.findall(text.casefold())
+
+
+def wildcard_pattern(text):
+    """ Returns a tuple (regular expression, fragments) for a wildcard
+    request: the compiled expression matching the entries (or one of their
+    senses) written like text, where ? stands for any character and * for
+    any characters, and the list of the literal fragments of text.
+
+    Example: "一*不*" matches "一動不動", fragments are ["一", "不"].
+    """
+    text = text.strip()
+    parts = WILDCARD_PATTERN.split(text)
+    body = re.escape(parts[0])
+    for wildcard, part in zip(WILDCARD_PATTERN.findall(text), parts[1:]):
+        if wildcard in "?？":
+            body += "[^/\n]"
+        else:
+            body += "[^/\n]*"
+        body += re.escape(part)
+    return (re.compile("(?:^|/)" + body + "(?:/|$)", re.IGNORECASE),
+            [part for part in parts if part])
+
+
+def literal_fragments(regex):
+    """ Returns strings found in every line matched by the compiled regex.
+
+    The extraction is conservative: characters made optional by a
+    quantifier, groups, character classes and escapes other than an escaped
+    punctuation mark (\\u518d, \\x41, \\d…) are left out, and end the
+    fragment they are in. Nothing is returned when the expression has an
+    alternative (|) outside of any group, or is verbose.
+    """
+    if regex.flags & re.VERBOSE:
+        return []
+    pattern = regex.pattern
+    fragments = []
+    current = []
+    depth = 0
+    position = 0
+    while position < len(pattern):
+        char = pattern[position]
+        literal = None
+        if char == "\\":
+            escape = REGEX_ESCAPE_PATTERN.match(pattern, position)
+            if escape is not None:
+                position = escape.end() - 1
+            else:
+                position += 1
+                literal = pattern[position:position + 1] or None
+        elif char == "[":
+            position += 1
+            if pattern[position:position + 1] == "^":
+                position += 1
+            if pattern[position:position + 1] == "]":
+                position += 1
+            while position < len(pattern) and pattern[position] != "]":
+                if pattern[position] == "\\":
+                    position += 1
+                position += 1
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|":
+            if depth == 0:
+                return []
+        elif char in "?*{":
+            if current:
+                current.pop()
+            if char == "{":
+                while position < len(pattern) and pattern[position] != "}":
+                    position += 1
+        elif char not in "+.^$":
+            # + keeps the character before it, but ends the fragment
+            literal = char
+        if literal is not None and depth == 0:
+            current.append(literal)
+        elif current:
+            fragments.append("".join(current))
+            current = []
+        position += 1
+    if current:
+        fragments.append("".join(current))
+    return fragments
+
+
+def deletes(word, distance):
+    """ Returns the set of the strings obtained by deleting at most distance
+    characters of word (word included).
+    """
+    found = {word}
+    variants = {word}
+    for _ in range(distance):
+        variants = {variant[:position] + variant[position + 1:]
+                    for variant in variants for position in range(len(variant))}
+        found.update(variants)
+    return found
+
+
+def osa_distance(first, second):
+    """ Returns the optimal string alignment distance between two strings:
+    the number of insertions, deletions, substitutions and transpositions of
+    two adjacent characters needed to go from one to the other.
+    """
+    previous = None
+    current = list(range(len(second) + 1))
+    for i in range(1, len(first) + 1):
+        before, previous = previous, current
+        current = [i] + [0] * len(second)
+        for j in range(1, len(second) + 1):
+            cost = 0 if first[i - 1] == second[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1,
+                             previous[j - 1] + cost)
+            if (i > 1 and j > 1 and first[i - 1] == second[j - 2] and
+                    first[i - 2] == second[j - 1]):
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[-1]
+
+
+def intersect(postings):
+    """ Returns the sorted list of the indices found in every one of the given
+    sorted posting lists. The smallest list is walked, and each of its indices
+    is looked for in the other lists by bisection.
+    """
+    postings = sorted(postings, key=len)
+    candidates = list(postings[0])
+    for posting in postings[1:]:
+        size = len(posting)
+        kept = []
+        for candidate in candidates:
+            position = bisect.bisect_left(posting, candidate)
+            if position < size and posting[position] == candidate:
+                kept.append(candidate)
+        candidates = kept
+        if not candidates:
+            break
+    return candidates
+
+
+def get_index(data_obj, name, builder):
+    """ Returns the index called name of data_obj, built by builder(data_obj).
+
+    Data objects build each index once and share it (see Data.get_index).
+    Other objects with the same columns get a new index each time.
+    """
+    if hasattr(data_obj, "get_index"):
+        return data_obj.get_index(name, builder)
+    return builder(data_obj)
+
+
+def translation_index(data_obj, language=None):
+    """ Returns the TranslationIndex of the translation column of data_obj in
+    language (see Data.translation_column), or of its main one if language is
+    None.
+    """
+    if language is None:
+        return get_index(data_obj, "translation", TranslationIndex.build)
+    return get_index(data_obj, "translation." + language,
+                     lambda data_obj: TranslationIndex(
+                         data_obj.translation_column(language)))
+
+
+def fuzzy_index(data_obj, language=None):
+    """ Returns the FuzzyIndex of the translation column of data_obj in
+    language, like translation_index.
+    """
+    if language is None:
+        return get_index(data_obj, "fuzzy", FuzzyIndex.build)
+    return get_index(data_obj, "fuzzy." + language,
+                     lambda data_obj: FuzzyIndex(
+                         translation_index(data_obj, language)))
+
+
+class HeadwordIndex(object):
+    """ Maps each headword, traditional or simplified, to the indices of all
+    the entries it is the headword of (homographs included).
+    """
+
+    def __init__(self, traditional, simplified):
+        self.traditional = self.map_words(traditional)
+        self.simplified = self.map_words(simplified)
+
+    @staticmethod
+    def build(data_obj):
+        """ Build the index of the headwords of data_obj. """
+        return HeadwordIndex(data_obj.traditional, data_obj.simplified)
+
+    @staticmethod
+    def map_words(column):
+        """ Returns a dictionary of word -> list of indices in column. """
+        words = {}
+        for index, word in enumerate(column):
+            word = word.rstrip("\n")
+            if word in words:
+                words[word].append(index)
+            else:
+                words[word] = [index]
+        return words
+
+    def lookup(self, word):
+        """ Returns the sorted list of the indices of the entries whose
+        traditional or simplified form is word.
+        """
+        traditional = self.traditional.get(word, [])
+        simplified = self.simplified.get(word, [])
+        if not simplified:
+            return list(traditional)
+        if not traditional:
+            return list(simplified)
+        return sorted(set(traditional).union(simplified))
+
+
+class TranslationIndex(object):
+    """ Inverted index of a translation column: maps each normalized word
+    (see tokenize) to the sorted array of the indices of the entries whose
+    translation contains it.
+    """
+
+    def __init__(self, column):
+        postings = {}
+        for index, line in enumerate(column):
+            for token in set(tokenize(line)):
+                if token in postings:
+                    postings[token].append(index)
+                else:
+                    postings[token] = [index]
+        self.postings = {}
+        for token, posting in postings.items():
+            self.postings[token] = array("I", posting)
+        self.vocabulary = sorted(self.postings)
+
+    @staticmethod
+    def build(data_obj):
+        """ Build the index of the translation column of data_obj. """
+        return TranslationIndex(data_obj.translation)
+
+    def search(self, text, prefix=False):
+        """ Returns the sorted indices of the entries whose translation
+        contains every word of text. If prefix is True, the last word of text
+        only has to be the beginning of a word of the translation.
+        """
+        tokens = tokenize(text)
+        postings = []
+        if prefix and tokens:
+            posting = self.prefixed(tokens.pop())
+            if not posting:
+                return []
+            postings.append(posting)
+        for token in set(tokens):
+            posting = self.postings.get(token)
+            if posting is None:
+                return []
+            postings.append(posting)
+        if not postings:
+            return []
+        return intersect(postings)
+
+    def prefilter(self, fragments):
+        """ Returns the sorted indices of the entries whose translation may
+        contain every fragment (see literal_fragments), or None if the
+        fragments have no whole word to look for.
+
+        The first word of a fragment may be the end of a longer word, and is
+        not used. Its last word may be the beginning of a longer one.
+        """
+        postings = []
+        for fragment in fragments:
+            fragment = fragment.casefold()
+            for match in TOKEN_PATTERN.finditer(fragment):
+                if match.start() == 0:
+                    continue
+                if match.end() < len(fragment):
+                    postings.append(self.postings.get(match.group(), ()))
+                else:
+                    postings.append(self.prefixed(match.group()))
+        if not postings:
+            return None
+        return intersect(postings)
+
+    def prefixed(self, prefix):
+        """ Returns the sorted indices of the entries whose translation
+        contains a word starting with prefix. The words are found by
+        bisection in the sorted vocabulary.
+        """
+        vocabulary = self.vocabulary
+        position = bisect.bisect_left(vocabulary, prefix)
+        if (position < len(vocabulary) and vocabulary[position] == prefix and
+                (position + 1 == len(vocabulary) or
+                 not vocabulary[position + 1].startswith(prefix))):
+            return self.postings[prefix]
+        found = set()
+        while (position < len(vocabulary) and
+               vocabulary[position].startswith(prefix)):
+            found.update(self.postings[vocabulary[position]])
+            position += 1
+        return sorted(found)
+
+
+class FuzzyIndex(object):
+    """ Symmetric-delete index of the words of a TranslationIndex, to find
+    the words close to a misspelled one.
+
+    Each word is stored under every string obtained by deleting at most
+    MAX_DISTANCE of its characters. Two words at distance d or less share at
+    least one of these strings, so looking up the deletes of the request
+    finds all of them, and only them once the distance is checked. To stay
+    compact, the index is a sorted array of 64 bits keys made of the hash of
+    a string and the id of the word (its position in the vocabulary). Word
+    ids take as many bits as the vocabulary needs, the hash the others.
+    """
+
+    MAX_DISTANCE = 2
+
+    def __init__(self, translations):
+        self.translations = translations
+        self.vocabulary = translations.vocabulary
+        self.word_id_bits = max(WORD_ID_BITS,
+                                len(self.vocabulary).bit_length())
+        self.hash_mask = (1 << (KEY_BITS - self.word_id_bits)) - 1
+        keys = []
+        for word_id, word in enumerate(self.vocabulary):
+            for variant in deletes(word, self.MAX_DISTANCE):
+                keys.append((hash(variant) & self.hash_mask) <<
+                            self.word_id_bits | word_id)
+        keys.sort()
+        self.keys = array("q", keys)
+
+    @staticmethod
+    def build(data_obj):
+        """ Build the fuzzy index of the translation index of data_obj. """
+        return FuzzyIndex(translation_index(data_obj))
+
+    @staticmethod
+    def max_distance(word):
+        """ Returns the largest distance allowed for a word: short words have
+        too many neighbours.
+        """
+        if len(word) <= 2:
+            return 0
+        if len(word) <= 4:
+            return 1
+        return FuzzyIndex.MAX_DISTANCE
+
+    def lookup(self, word):
+        """ Returns a dictionary of the words of the vocabulary close enough
+        to word (see max_distance) -> their distance to word.
+        """
+        distance = self.max_distance(word)
+        keys = self.keys
+        bits = self.word_id_bits
+        word_ids = set()
+        for variant in deletes(word, distance):
+            key = hash(variant) & self.hash_mask
+            position = bisect.bisect_left(keys, key << bits)
+            while position < len(keys) and keys[position] >> bits == key:
+                word_ids.add(keys[position] & ((1 << bits) - 1))
+                position += 1
+        found = {}
+        for word_id in word_ids:
+            candidate = self.vocabulary[word_id]
+            if abs(len(candidate) - len(word)) <= distance:
+                candidate_distance = osa_distance(word, candidate)
+                if candidate_distance <= distance:
+                    found[candidate] = candidate_distance
+        return found
+
+    def search(self, text):
+        """ Returns a dictionary of the indices of the entries whose
+        translation contains every word of text, or a word close to it ->
+        the sum of the distances of these words.
+        """
+        postings = self.translations.postings
+        distances = None
+        for token in set(tokenize(text)):
+            if token in postings:
+                words = {token: 0}
+            else:
+                words = self.lookup(token)
+            found = {}
+            for word, distance in words.items():
+                for index in postings[word]:
+                    if found.get(index, distance + 1) > distance:
+                        found[index] = distance
+            if distances is not None:
+                found = dict((index, distance + distances[index])
+                             for index, distance in found.items()
+                             if index in distances)
+            distances = found
+            if not distances:
+                return {}
+        return distances or {}
+
+
+class HanziIndex(object):
+    """ Character n-gram index of a hanzi column: maps each character, and
+    each pair of consecutive characters, to the sorted array of the indices
+    of the entries containing it.
+
+    Searching for a longer string intersects the arrays of its pairs of
+    characters, and only checks the few entries left.
+    """
+
+    def __init__(self, column):
+        self.column = column
+        postings = {}
+        for index, line in enumerate(column):
+            line = line.rstrip("\n").lower()
+            grams = set(line)
+            grams.update(line[position:position + 2]
+                         for position in range(len(line) - 1))
+            for gram in grams:
+                if gram in postings:
+                    postings[gram].append(index)
+                else:
+                    postings[gram] = [index]
+        self.postings = {}
+        for gram, posting in postings.items():
+            self.postings[gram] = array("I", posting)
+
+    @staticmethod
+    def build_traditional(data_obj):
+        """ Build the index of the traditional column of data_obj. """
+        return HanziIndex(data_obj.traditional)
+
+    @staticmethod
+    def build_simplified(data_obj):
+        """ Build the index of the simplified column of data_obj. """
+        return HanziIndex(data_obj.simplified)
+
+    def candidates(self, word):
+        """ Returns the sorted indices of the entries which may contain word:
+        the ones containing each of its characters, or pairs of characters.
+        """
+        if len(word) == 1:
+            return list(self.postings.get(word, ()))
+        postings = []
+        for position in range(len(word) - 1):
+            posting = self.postings.get(word[position:position + 2])
+            if posting is None:
+                return []
+            postings.append(posting)
+        return intersect(postings)
+
+    def prefilter(self, fragments):
+        """ Returns the sorted indices of the entries which may contain every
+        fragment (see literal_fragments), or None if there is no fragment.
+        """
+        if not fragments:
+            return None
+        return intersect([self.candidates(fragment.lower())
+                          for fragment in fragments])
+
+    def search(self, text):
+        """ Returns the sorted indices of the entries containing every word
+        of text (case insensitive).
+        """
+        words = text.lower().split()
+        if not words:
+            return []
+        found = intersect([self.candidates(word) for word in words])
+        long_words = [word for word in words if len(word) > 2]
+        if long_words:
+            column = self.column
+            found = [index for index in found
+                     if all(word in column[index].lower()
+                            for word in long_words)]
+        return found
+
+
+class RomanisationIndex(object):
+    """ Syllable index of the pronunciation of the entries.
+
+    Each syllable is reduced to a key, its zhuyin without tone, and a tone
+    (see normalize). Pinyin with tone numbers, pinyin with diacritics and
+    zhuyin therefore all give the same keys. The index maps each key to the
+    sorted array of the indices of the entries containing it (unless
+    indexed is False: only the parsing methods can then be used).
+    """
+
+    def __init__(self, pinyin_column, converter, indexed=True):
+        self.column = pinyin_column
+        self.converter = converter
+        self.normalize = functools.lru_cache(
+            maxsize=SYLLABLE_CACHE_SIZE)(self.normalize)
+        postings = {}
+        for index, line in enumerate(pinyin_column if indexed else ()):
+            for key in set(key for key, tone in self.entry_syllables(index)):
+                if key in postings:
+                    postings[key].append(index)
+                else:
+                    postings[key] = [index]
+        self.postings = {}
+        for key, posting in postings.items():
+            self.postings[key] = array("I", posting)
+
+    def normalize(self, syllable):
+        """ Returns the (key, tone) of a syllable, like "ni3", "nǐ", "ㄋㄧˇ"
+        (all giving ("ㄋㄧ", 3)) or "ni" (giving ("ㄋㄧ", None)).
+
+        A tone of None matches any tone. As the first tone has no mark in
+        zhuyin, zhuyin syllables without mark match any tone too. The last
+        SYLLABLE_CACHE_SIZE syllables normalized are remembered.
+        """
+        tone = None
+        text = syllable
+        if text[-1] in ZHUYIN_TONE_MARKS:
+            tone = ZHUYIN_TONE_MARKS[text[-1]]
+            text = text[:-1]
+        elif text[0] == "˙":
+            tone = 5
+            text = text[1:]
+        elif text[-1].isdigit():
+            tone = int(text[-1])
+            text = text[:-1]
+        text = text.lower().replace("u:", "ü")
+        letters = []
+        for char in unicodedata.normalize("NFD", text):
+            if char in PINYIN_TONE_MARKS:
+                tone = PINYIN_TONE_MARKS[char]
+            else:
+                letters.append(char)
+        text = unicodedata.normalize("NFC", "".join(letters))
+        if text and not "\u3100" <= text[0] <= "\u31bf":
+            text = self.converter.convert_syllable(text)
+        return text, tone
+
+    def parse(self, text):
+        """ Returns the list of the (key, tone) of the syllables of text. """
+        return [self.normalize(syllable) for syllable
+                in SYLLABLE_PATTERN.findall(unicodedata.normalize("NFC", text))]
+
+    def entry_syllables(self, index):
+        """ Returns the list of the (key, tone) of the syllables of an entry.
+        """
+        return self.line_syllables(self.column[index])
+
+    def line_syllables(self, line):
+        """ Returns the list of the (key, tone) of the syllables of a line of
+        the pinyin column.
+        """
+        return [self.normalize(syllable) for syllable in line.split()]
+
+    def search(self, text):
+        """ Returns the sorted indices of the entries whose pronunciation
+        contains the syllables of text, in this order. Tones are only checked
+        when they are given.
+        """
+        wanted = self.parse(text)
+        if not wanted:
+            return []
+        postings = []
+        for key in set(key for key, tone in wanted):
+            posting = self.postings.get(key)
+            if posting is None:
+                return []
+            postings.append(posting)
+        return [index for index in intersect(postings)
+                if self.contains(self.entry_syllables(index), wanted)]
+
+    def match_level(self, index, wanted):
+        """ Returns 0 if the pronunciation of the entry is the wanted (key,
+        tone) list (see parse), 1 if it starts with them, 2 otherwise.
+        """
+        return self.syllables_level(self.entry_syllables(index), wanted)
+
+    @classmethod
+    def syllables_level(cls, syllables, wanted):
+        """ Returns the match level of the wanted (key, tone) list in
+        syllables (see match_level).
+        """
+        if not cls.contains(syllables[:len(wanted)], wanted):
+            return 2
+        if len(syllables) == len(wanted):
+            return 0
+        return 1
+
+    @staticmethod
+    def contains(syllables, wanted):
+        """ Returns True if the wanted (key, tone) follow each other somewhere
+        in syllables.
+        """
+        size = len(wanted)
+        for start in range(len(syllables) - size + 1):
+            for (key, tone), (wanted_key, wanted_tone) in zip(
+                    syllables[start:start + size], wanted):
+                if key != wanted_key or (wanted_tone is not None and
+                                         tone != wanted_tone):
+                    break
+            else:
+                return True
+        return False
@@ -17,8 +17,100 @@
 
 '''
 
+import os
 import re
+import heapq
 import shutil
+import time
+import itertools
+import functools
+import threading
+import collections
+import multiprocessing
+
+from zhudi import compiled, data, database, indexes
+
+# One entry of a *.u8 dictionary: "TRAD SIMP [PIN1 YIN1] /sense 1/sense 2/"
+ENTRY_PATTERN = re.compile(r"^(\S+) (\S+) [^\[]*\[([^\]]*)\][^/]*/(.*)/")
+# A tone number directly followed by the next syllable (like "di4shang4")
+STICKING_TONE_PATTERN = re.compile(r"(\d)(?=[^ ])")
+# A pinyin syllable with its tone number, like "ni3"
+PINYIN_SYLLABLE_PATTERN = re.compile(r"^[a-züÜ]+[0-5]", re.IGNORECASE)
+# Entries added, changed and removed by PreProcessing.incremental_split.
+# added and changed are indices in the new columns, removed in the old ones.
+SplitDiff = collections.namedtuple("SplitDiff", ["added", "changed", "removed"])
+# A page of the results of DictionaryTools.query: the indices of its entries,
+# their scores (level, length, index), the number of entries found, and the
+# number of the page
+SearchResult = collections.namedtuple("SearchResult",
+                                      ["ids", "scores", "total", "page"])
+NO_RESULT = SearchResult((), (), 0, 0)
+# Results of a batch of requests: the result of each request, in the order
+# they were given, the number of requests and of distinct ones, the time
+# taken (in seconds) and the number of requests resolved per second
+BatchResult = collections.namedtuple("BatchResult",
+                                     ["results", "count", "unique", "elapsed",
+                                      "per_second"])
+# Number of results in a page of DictionaryTools.search
+PAGE_SIZE = 500
+# Number of requests whose results are kept by QUERY_CACHE
+CACHE_SIZE = 128
+# Most candidates of the previous request checked again by a live search
+NARROW_LIMIT = 256
+# Number of lines given at once to a process of the pool by parallel_split
+CHUNK_LINES = 20000
+# Names of the languages of merge_split, and of its list of languages
+LANGUAGE_PATTERN = re.compile(r"[A-Za-z0-9-]+\Z")
+LANGUAGES_FILE_NAME = "languages"
+
+
+def split_chunk(lines):
+    """ Parse a chunk of lines of a *.u8 dictionary, and convert their pinyin.
+    Returns a tuple of 5 lists:
+    (simplified, traditional, translation, pinyin, zhuyin)
+
+    This is the job run by each process of PreProcessing.parallel_split.
+    """
+
+    simplified_list = []
+    traditional_list = []
+    translation_list = []
+    pinyin_list = []
+    for line in lines:
+        entry = PreProcessing.parse_line(line)
+        if entry is not None:
+            traditional_list.append(entry[0])
+            simplified_list.append(entry[1])
+            pinyin_list.append(entry[2])
+            translation_list.append(entry[3])
+    if pinyin_list:
+        zhuyin_list = DictionaryTools.pinyin_to_zhuyin(pinyin_list)
+    else:
+        zhuyin_list = []
+    return (simplified_list, traditional_list, translation_list,
+            pinyin_list, zhuyin_list)
+
+
+def run_batch(requests, resolve):
+    """ Resolve each distinct request once with resolve(request).
+    Returns a BatchResult, its results being aligned with requests.
+    """
+
+    start = time.time()
+    requests = list(requests)
+    resolved = {}
+    for request in requests:
+        if request not in resolved:
+            resolved[request] = resolve(request)
+    results = [resolved[request] for request in requests]
+    elapsed = time.time() - start
+    if elapsed > 0:
+        per_second = len(requests) / elapsed
+    else:
+        per_second = float(len(requests))
+    return BatchResult(results, len(requests), len(resolved), elapsed,
+                       per_second)
+
 
 class PreProcessing(object):
     """ This class is in charge of the pre-processing needed to lauch Zhudi.
@@ -28,6 +120,38 @@ class PreProcessing(object):
     def __init__(self):
         pass
 
+    @staticmethod
+    def parse_line(line):
+        """ Parse one line of a *.u8 dictionary.
+        Returns a tuple (traditional, simplified, pinyin, translation), or None
+        if the line is a comment or is not a dictionary entry.
+
+        Example:
+        "再見 再见 [zai4jian4] /Au revoir!/Adieu!/"
+        -> ("再見", "再见", "zai4 jian4", "Au revoir!/Adieu!")
+        """
+
+        if line.startswith("#"):
+            return None
+        match = ENTRY_PATTERN.match(line)
+        if match is None:
+            return None
+        traditional, simplified, pinyin, translation = match.groups()
+        # Get rid of sticking pinyin like di4shang4 instead of di4 shang4
+        pinyin = STICKING_TONE_PATTERN.sub(r"\1 ", pinyin)
+        return traditional, simplified, pinyin, translation
+
+    @staticmethod
+    def split_report(lines_count, elapsed):
+        """ Returns a human readable summary of a split run. """
+
+        if elapsed > 0:
+            speed = int(lines_count / elapsed)
+        else:
+            speed = lines_count
+        return ("{} lines processed in {:.2f} s ({} lines/s)."
+                .format(lines_count, elapsed, speed))
+
     @staticmethod
     def split(dictname):
         """ Loads the *.u8 file and split it. Return a tuple of 4 lists:
@@ -35,94 +159,295 @@ class PreProcessing(object):
         traditional_list,
         translation_list,
         pinyin_list)
+
+        The input is read lazily, line by line, and the 4 output files are
+        kept open (and buffered) for the whole run.
         """
 
-        def unstick(pinyin):
-            """ Get rid of sticking pinyin like di4shang4 instead of di4 shang4
-            Input: astring containing a pinyin like "di4shang4"
-            Output: a string containing a pinyin like "di4 shang4"
-            """
-
-            clean_pinyin = ""
-            for index in range(len(pinyin)):
-                clean_pinyin += pinyin[index]
-                if pinyin[index].isdigit() and (index < len(pinyin)-1):
-                    if pinyin[index + 1] != " ":
-                        clean_pinyin += " "
-            return clean_pinyin
-        # end of unstick
-
-        dictionary = dictname
-        # Open the dictionary in text mode, read only
-        with open(dictionary, mode="r") as dic:
-            liste = dic.readlines()  # Use the text file as lines
-        space_ind = []
-        pinyin_delimiters = []
-        translation_delimiters = []
+        PreProcessing.save_previous_files(["simplified", "traditional",
+                                           "translation", "pinyin"])
+
         simplified_list = []
         traditional_list = []
         pinyin_list = []
         translation_list = []
 
-        # Check if producted files already exist
-        # Delete them if needed
-        for filename in ["simplified", "traditional", "translation", "pinyin"]:
-            try:
-                open(filename, "r")
-            except:
-                pass
-            else:
-                shutil.move(filename, filename + "_saved")
-                print("Warning: " + filename + " has been moved to "
-                      + filename + "_saved.\n"
-                      + "Indeed, this file will be created by Zhudi.")
+        start = time.time()
+        lines_count = 0
+        with open(dictname, mode="r") as dic, \
+             open("simplified", mode="w") as simplified_file, \
+             open("traditional", mode="w") as traditional_file, \
+             open("translation", mode="w") as translation_file, \
+             open("pinyin", mode="w") as pinyin_file:
+            for line in dic:
+                lines_count += 1
+                entry = PreProcessing.parse_line(line)
+                if entry is None:
+                    continue
+                traditional, simplified, pinyin, translation = entry
 
-        for i in liste:  # for each line
-            space_ind = []
-            pinyin_delimiters = []
-            translation_delimiters = []
-            translation = []
-
-            if i[0] != "#":
-                for k in range(len(i)):
-                    if i[k] == " ":  # look for spaces
-                        space_ind.append(k)
-                    if i[k] == "[":  # look for pinyin delimiters
-                        pinyin_delimiters.append(k)
-                    if i[k] == "]":
-                        pinyin_delimiters.append(k)
-                    if i[k] == "/":  # look for translation delimiters
-                        translation_delimiters.append(k)
-                traditional = i[0:space_ind[0]]
-                simplified = i[space_ind[0]+1:space_ind[1]]
-                pinyin = i[pinyin_delimiters[0]+1:pinyin_delimiters[1]]
-                for index in range(len(translation_delimiters) - 1):
-                    translation.append(i[translation_delimiters[index] + 1:translation_delimiters[index + 1]])
-
-                clean_pinyin = unstick(pinyin)
-                translation_clean = ""
-                for i in range(len(translation)):
-                    if i != 0:
-                        translation_clean += "/"
-                    translation_clean += translation[i]
-
-                pinyin_list.append(clean_pinyin)
+                pinyin_list.append(pinyin)
                 traditional_list.append(traditional)
                 simplified_list.append(simplified)
-                translation_list.append(translation_clean)
+                translation_list.append(translation)
 
-                with open("simplified", mode="a") as simplified_file:
-                    simplified_file.write(simplified+"\n")
-                with open("traditional", mode="a") as traditional_file:
-                    traditional_file.write(traditional+"\n")
-                with open("translation", mode="a") as translation_file:
-                    translation_file.write(translation_clean+"\n")
-                with open("pinyin", mode="a") as pinyin_file:
-                    pinyin_file.write(clean_pinyin+"\n")
+                simplified_file.write(simplified + "\n")
+                traditional_file.write(traditional + "\n")
+                translation_file.write(translation + "\n")
+                pinyin_file.write(pinyin + "\n")
+        elapsed = time.time() - start
+        print(PreProcessing.split_report(lines_count, elapsed))
 
         return (simplified_list, traditional_list, translation_list, pinyin_list)
     # End of split()
 
+    @staticmethod
+    def parallel_split(dictname, jobs):
+        """ Loads the *.u8 file and split it, using a pool of jobs processes.
+        The input is cut in chunks of CHUNK_LINES lines, each chunk is parsed
+        and converted to zhuyin by split_chunk, and the chunks are written
+        back in their original order. The 5 files produced are the same as
+        the ones of split() followed by the zhuyin conversion.
+
+        Return a tuple of 5 lists:
+        (simplified_list,
+        traditional_list,
+        translation_list,
+        pinyin_list,
+        zhuyin_list)
+        """
+
+        file_names = ["simplified", "traditional", "translation",
+                      "pinyin", "zhuyin"]
+        PreProcessing.save_previous_files(file_names)
+        columns = ([], [], [], [], [])
+
+        start = time.time()
+        lines_count = 0
+
+        def read_chunks(dic):
+            """ Yields the lines of dic, CHUNK_LINES at a time. """
+            nonlocal lines_count
+            while True:
+                chunk = list(itertools.islice(dic, CHUNK_LINES))
+                if not chunk:
+                    return
+                lines_count += len(chunk)
+                yield chunk
+
+        with open(dictname, mode="r") as dic:
+            output_files = [open(name, mode="w") for name in file_names]
+            try:
+                with multiprocessing.Pool(jobs) as pool:
+                    for chunk in pool.imap(split_chunk, read_chunks(dic)):
+                        for column, output, lines in zip(columns,
+                                                         output_files, chunk):
+                            column.extend(lines)
+                            for line in lines:
+                                output.write(line + "\n")
+            finally:
+                for output in output_files:
+                    output.close()
+        elapsed = time.time() - start
+        print(PreProcessing.split_report(lines_count, elapsed))
+
+        return columns
+    # End of parallel_split()
+
+    @staticmethod
+    def incremental_split(dictname):
+        """ Update the split files of the current directory with a new release
+        of the *.u8 dictionary.
+
+        Entries are matched with the previous ones by (traditional,
+        simplified, pinyin). Lines identical to a previous entry are not even
+        parsed, and only new pinyin are converted to zhuyin. The 5 files are
+        only rewritten if something changed.
+
+        Return a tuple (columns, diff), where columns is a tuple of 5 lists
+        (simplified, traditional, translation, pinyin, zhuyin) and diff is a
+        SplitDiff.
+        """
+
+        file_names = ["simplified", "traditional", "translation",
+                      "pinyin", "zhuyin"]
+        try:
+            old_columns = []
+            for name in file_names:
+                with open(name, mode="r") as a_file:
+                    old_columns.append([line.rstrip("\n") for line in a_file])
+        except IOError:
+            print("### The previously split files couldn't be read. Split the"
+                  " dictionary file first. ###")
+            quit()
+        (old_simplified, old_traditional, old_translation,
+         old_pinyin, old_zhuyin) = old_columns
+
+        # Previous entries, by their line in a *.u8 file, and by their key
+        by_line = collections.defaultdict(collections.deque)
+        by_key = collections.defaultdict(collections.deque)
+        for index in range(len(old_simplified)):
+            key = (old_traditional[index], old_simplified[index],
+                   old_pinyin[index])
+            by_line["{} {} [{}] /{}/".format(key[0], key[1], key[2],
+                                             old_translation[index])].append(index)
+            by_key[key].append(index)
+        used = [False] * len(old_simplified)
+
+        def take(indices):
+            """ Returns the first previous entry not used yet, or None. """
+            while indices:
+                index = indices.popleft()
+                if not used[index]:
+                    used[index] = True
+                    return index
+            return None
+
+        start = time.time()
+        lines_count = 0
+        columns = ([], [], [], [], [])
+        added = []
+        changed = []
+        with open(dictname, mode="r") as dic:
+            for line in dic:
+                lines_count += 1
+                index = take(by_line.get(line.rstrip("\r\n"), ()))
+                if index is not None:
+                    for column, old_column in zip(columns, old_columns):
+                        column.append(old_column[index])
+                    continue
+                entry = PreProcessing.parse_line(line)
+                if entry is None:
+                    continue
+                traditional, simplified, pinyin, translation = entry
+                index = take(by_key.get((traditional, simplified, pinyin), ()))
+                if index is None:
+                    added.append(len(columns[0]))
+                    zhuyin = None
+                else:
+                    if translation != old_translation[index]:
+                        changed.append(len(columns[0]))
+                    zhuyin = old_zhuyin[index]
+                for column, value in zip(columns, (simplified, traditional,
+                                                   translation, pinyin, zhuyin)):
+                    column.append(value)
+
+        if added:
+            zhuyin = DictionaryTools.pinyin_to_zhuyin(
+                [columns[3][index] for index in added])
+            for index, value in zip(added, zhuyin):
+                columns[4][index] = value
+        removed = [index for index in range(len(used)) if not used[index]]
+
+        if tuple(old_columns) != columns:
+            for name, column in zip(file_names, columns):
+                with open(name + ".tmp", mode="w") as a_file:
+                    for line in column:
+                        a_file.write(line + "\n")
+                os.replace(name + ".tmp", name)
+        elapsed = time.time() - start
+        print(PreProcessing.split_report(lines_count, elapsed))
+        print("{} added, {} changed, {} removed entries."
+              .format(len(added), len(changed), len(removed)))
+
+        return columns, SplitDiff(added, changed, removed)
+    # End of incremental_split()
+
+    @staticmethod
+    def merge_split(dictionaries):
+        """ Loads several *.u8 files, in different languages, and split them
+        into shared columns: the hanzi, pinyin and zhuyin of their entries
+        are only stored once.
+
+        dictionaries is a list of (language, dictname). Entries are matched
+        by (traditional, simplified, pinyin), the entries of the first
+        dictionary coming first. An entry missing from a dictionary has an
+        empty translation in its language. The translations of the first
+        dictionary are written to the "translation" file, and the ones of the
+        others to "translation.<language>" files, listed in the "languages"
+        file (see read_translations). Languages are made of letters, digits
+        and "-" (see LANGUAGE_PATTERN), and a ValueError is raised otherwise.
+
+        Return a tuple (columns, translations), where columns is a tuple of
+        5 lists (simplified, traditional, translation, pinyin, zhuyin) and
+        translations is a dictionary of language -> list of translations, for
+        the other languages.
+        """
+
+        languages = [language for language, dictname in dictionaries[1:]]
+        for language in languages:
+            if not LANGUAGE_PATTERN.match(language):
+                raise ValueError("Invalid language name: " + language)
+        file_names = ["simplified", "traditional", "translation",
+                      "pinyin", "zhuyin"]
+        PreProcessing.save_previous_files(
+            file_names + [LANGUAGES_FILE_NAME] +
+            ["translation." + language for language in languages])
+
+        start = time.time()
+        lines_count = 0
+        # Index of each entry, by its key and its rank among homonyms
+        entries = {}
+        keys = []
+        translations = []
+        for number, (language, dictname) in enumerate(dictionaries):
+            column = [""] * len(keys)
+            translations.append(column)
+            seen = collections.Counter()
+            with open(dictname, mode="r") as dic:
+                for line in dic:
+                    lines_count += 1
+                    entry = PreProcessing.parse_line(line)
+                    if entry is None:
+                        continue
+                    traditional, simplified, pinyin, translation = entry
+                    key = (traditional, simplified, pinyin)
+                    seen[key] += 1
+                    index = entries.get((key, seen[key]))
+                    if index is None:
+                        index = len(keys)
+                        entries[(key, seen[key])] = index
+                        keys.append(key)
+                        for previous in translations:
+                            previous.append("")
+                    column[index] = translation
+
+        traditional_list = [key[0] for key in keys]
+        simplified_list = [key[1] for key in keys]
+        pinyin_list = [key[2] for key in keys]
+        zhuyin_list = DictionaryTools.pinyin_to_zhuyin(pinyin_list)
+        columns = (simplified_list, traditional_list, translations[0],
+                   pinyin_list, zhuyin_list)
+        others = dict(zip(languages, translations[1:]))
+        outputs = list(zip(file_names, columns))
+        outputs += [("translation." + language, others[language])
+                    for language in languages]
+        outputs.append((LANGUAGES_FILE_NAME, languages))
+        for name, column in outputs:
+            with open(name, mode="w") as a_file:
+                for line in column:
+                    a_file.write(line + "\n")
+        elapsed = time.time() - start
+        print(PreProcessing.split_report(lines_count, elapsed))
+        print("{} entries in {} languages.".format(len(keys),
+                                                   len(dictionaries)))
+
+        return columns, others
+    # End of merge_split()
+
+    @staticmethod
+    def save_previous_files(file_names):
+        """ Check if producted files already exist, and move them away
+        (as file_saved) if needed.
+        """
+
+        for filename in file_names:
+            if os.path.isfile(filename):
+                shutil.move(filename, filename + "_saved")
+                print("Warning: " + filename + " has been moved to "
+                      + filename + "_saved.\n"
+                      + "Indeed, this file will be created by Zhudi.")
+
     @staticmethod
     def read_files(pinyin_file_name,
                    zhuyin_file_name,
@@ -157,157 +482,520 @@ class PreProcessing(object):
             quit()
         # End of read_files()
 
+    @staticmethod
+    def read_translations(translation_file_name, entries):
+        """ Reads the translations in other languages written next to a
+        translation file by merge_split ("translation.<language>" files, for
+        the languages listed in the "languages" file).
+        Returns a dictionary of language -> list of translations. Files which
+        do not have the given number of entries are not for the same columns,
+        and are left out.
+
+        Without a "languages" file, every "translation.<language>" file is
+        read, language matching LANGUAGE_PATTERN (so that backups, such as
+        translation.fr_saved, are not).
+        """
+
+        translations = {}
+        directory, name = os.path.split(translation_file_name)
+        try:
+            with open(os.path.join(directory, LANGUAGES_FILE_NAME),
+                      "r") as a_file:
+                languages = a_file.read().split()
+        except IOError:
+            languages = [file_name[len(name) + 1:] for file_name
+                         in sorted(os.listdir(directory or "."))
+                         if file_name.startswith(name + ".")]
+        for language in languages:
+            if not LANGUAGE_PATTERN.match(language):
+                continue
+            file_name = name + "." + language
+            try:
+                a_file = open(os.path.join(directory, file_name), "r")
+            except IOError:
+                print("Warning: " + file_name + " couldn't be read, and has"
+                      " been ignored.")
+                continue
+            with a_file:
+                column = a_file.readlines()
+            if len(column) == entries:
+                translations[language] = column
+            else:
+                print("Warning: " + file_name + " does not have the same"
+                      " entries as " + name + ", and has been ignored.")
+        return translations
+
+    @staticmethod
+    def read_compiled(compiled_file_name):
+        """ Memory-maps a file made by CompiledDictionary.write.
+        Returns 5 list-like columns, read lazily:
+        (pinyin, zhuyin, traditional, simplified, translation)
+        """
+
+        return compiled.CompiledDictionary(compiled_file_name).load()
+
+    @staticmethod
+    def outdated(file_name, source_file_names):
+        """ Returns True if every source file exists, and one of them has
+        been modified after file_name, which was made from them.
+        """
+
+        if not all(os.path.isfile(name) for name in source_file_names):
+            return False
+        modified = os.path.getmtime(file_name)
+        return any(os.path.getmtime(name) > modified
+                   for name in source_file_names)
+
+    @staticmethod
+    def compile_files(compiled_file_name, file_names):
+        """ Compile the 5 given files (pinyin, zhuyin, traditional,
+        simplified, translation) into compiled_file_name.
+        """
+
+        columns = PreProcessing.read_files(*file_names)
+        compiled.CompiledDictionary.write(compiled_file_name,
+                                          dict(zip(compiled.COLUMNS, columns)))
+
+    @staticmethod
+    def write_database(database_file_name, columns, sources=()):
+        """ Store the given columns (a dictionary of column name -> list of
+        lines) into an SQLite database, with its full text indexes. sources
+        are the files the columns were read from.
+        """
+
+        parser = indexes.RomanisationIndex((), ZHUYIN_CONVERTER)
+        syllables = [" ".join(parser.normalize(syllable)[0]
+                              for syllable in line.split())
+                     for line in columns["pinyin"]]
+        database.Database.write(database_file_name, columns, syllables,
+                                sources)
+
+    @staticmethod
+    def read_database(database_file_name):
+        """ Opens a database made by write_database.
+        Returns a tuple (columns, database): the 5 list-like columns, read
+        lazily, (pinyin, zhuyin, traditional, simplified, translation), and
+        the database.Database object, to search them.
+        """
+
+        backend = database.Database(database_file_name)
+        return backend.load(), backend
+
+
+class QueryCache(object):
+    """ Bounded cache of search results, the least recently used ones being
+    dropped first. QUERY_CACHE is shared by every DictionaryTools and
+    SegmentationTools, so that the CLI, the GUI and other callers all benefit
+    from it.
+
+    Keys include the version of the data searched (see Data.changed): the
+    results of replaced columns are never given back, and just age out.
+    """
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, compute):
+        """ Returns the value cached for key, or the one given by compute(),
+        which is cached.
+        """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+        value = compute()
+        with self.lock:
+            self.entries[key] = value
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        """ Drop every cached result. Counters are kept. """
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """ Returns a dictionary of the counters of the cache, and of its
+        number of entries.
+        """
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "entries": len(self.entries)}
+
+
+QUERY_CACHE = QueryCache()
+
+# Node of SegmentationTools.trie ending a word, without any longer word
+WORD_END_NODE = {"": True}
+
+
 class SegmentationTools(object):
     """ This class is intended to contains any functions dealing with Chinese.
     In other words, any functions treating a sentence, a word, etc.
     """
 
     def __init__(self):
-        """ Sets are aimed at speed performance.
+        """ The trie is aimed at speed performance.
         """
 
-        self.trad_set = []
-        self.simp_set = []
-        self.set_of_chinese_chars = []
+        self.trie = {}
 
     def load(self, data_obj):
         """ Load and prepare needed data.
         """
 
+        self.trie = {}
         for style in [data_obj.traditional, data_obj.simplified]:
-            temp = [[], [], [], [], [], [], [], [], [], [],
-                    [], [], [], [], [], [], [], [], [], []]  # 20
-            out = []
             for item in style:
                 # get rid of the \n
-                item = item[:-1]
-                if len(item) <= 20:
-                    temp[len(item)-1].append(item)
-            for nested_list in temp:
-                # transform in set for performance issue
-                out.append(set(nested_list))
-                if style == data_obj.traditional:
-                    self.trad_set = out
-                else:
-                    self.simp_set = out
-        data_obj.create_set_chinese_characters()
-        self.set_of_chinese_chars = data_obj.set_of_chinese_chars
+                item = item.rstrip("\n")
+                if item:
+                    self.add_word(item)
     # end of load()
 
+    def add_word(self, word):
+        """ Add a word to the trie of known words.
+
+        The trie is made of nested dictionaries, one level per character.
+        The "" key marks the end of a word; nodes that only end a word all
+        share WORD_END_NODE, which must never be modified.
+        """
+        node = self.trie
+        last = len(word) - 1
+        for position, char in enumerate(word):
+            child = node.get(char)
+            if position == last:
+                if child is None:
+                    node[char] = WORD_END_NODE
+                elif child is not WORD_END_NODE:
+                    child[""] = True
+            else:
+                if child is None:
+                    child = node[char] = {}
+                elif child is WORD_END_NODE:
+                    child = node[char] = {"": True}
+                node = child
+
+    def longest_match(self, string, start=0):
+        """ Returns the length of the longest known word found at the start
+        position of string, or 0 if there is none. This is one walk down the
+        trie, whatever the length of the words.
+        """
+        node = self.trie
+        longest = 0
+        position = start
+        length = len(string)
+        while position < length:
+            node = node.get(string[position])
+            if node is None:
+                break
+            position += 1
+            if "" in node:
+                longest = position - start
+        return longest
+
     def is_not_chinese(self, string):
         """
         Returns True is the given string does not contain any Chinese Character
 
         """
-        for car in string:
-            if ord(car) in self.set_of_chinese_chars:
-                return False
-        return True
+        return data.HAN_PATTERN.search(string) is None
 
     def search_unique(self, word, data_obj):
         """ Search for a word in the dictionary.
         Returns only 1 result (the index) or None if nothing found.
+        Simplified forms are preferred to traditional ones.
 
         """
-        def find_it(word, given_list):
-            """ Returns the index of the found word.
-            """
-
-            cnt = 0
-            for case in given_list:
-                if case[-1] == "\n":
-                    case = case[:-1]
-                if word == case:
-                    return cnt
-                cnt += 1
+        if self.is_not_chinese(word):
             return None
+        if not hasattr(data_obj, "version"):
+            return self.find_unique(word, data_obj)
+        key = ("unique", data_obj.version, "headwords", word,
+               data_obj.hanzi, data_obj.romanisation)
+        return QUERY_CACHE.get(key, lambda: self.find_unique(word, data_obj))
 
-        if self.is_not_chinese(word):
+    def search_unique_batch(self, words, data_obj):
+        """ Search for many words in the dictionary, like search_unique.
+        Returns a BatchResult, whose results are the index found for each
+        word (or None), in the same order.
+
+        Each distinct word is only looked up once (see find_unique), and the
+        cache is left alone.
+
+        """
+
+        def resolve(word):
+            """ Index of the entry of word, or None. """
+            if self.is_not_chinese(word):
+                return None
+            return self.find_unique(word, data_obj)
+        return run_batch(words, resolve)
+
+    @staticmethod
+    def find_unique(word, data_obj):
+        """ Returns the index of the entry word is the headword of, or None.
+        """
+        backend = getattr(data_obj, "backend", None)
+        if backend is not None:
+            found = (backend.headword("simplified", word) or
+                     backend.headword("traditional", word))
+            if found:
+                return found[0]
             return None
-        else:
-            r1 = find_it(word, data_obj.traditional)
-            r2 = find_it(word, data_obj.simplified)
-            if r2 is None:
-                if r1 is None:
-                    return None
-                return r1
-            return r2
+        headwords = indexes.get_index(data_obj, "headwords",
+                                      indexes.HeadwordIndex.build)
+        found = headwords.simplified.get(word) or headwords.traditional.get(word)
+        if found:
+            return found[0]
+        return None
+
+    @staticmethod
+    def search_all(word, data_obj):
+        """ Search for a word in the dictionary.
+        Returns the sorted list of the indices of all the entries written
+        word (in traditional or simplified form), or an empty list.
+
+        """
+        backend = getattr(data_obj, "backend", None)
+        if backend is not None:
+            return sorted(set(backend.headword("traditional", word)).union(
+                backend.headword("simplified", word)))
+        headwords = indexes.get_index(data_obj, "headwords",
+                                      indexes.HeadwordIndex.build)
+        return headwords.lookup(word)
 
     def sentence_segmentation(self, string):
         """ Parse the string input for Chinese words based on words in our
         dictionary. Retuns a list of words.
-        """
 
-        def longest_word(string):
-            """
-            Returns the longest word from a given string.
-
-            """
-            traditional = self.trad_set
-            simplified = self.simp_set
-            maxi = 20
-            if len(string) < maxi:
-                upper = len(string)
-            else:
-                upper = maxi
-            for i in range(upper, 1, -1):  # from max-1 to 1
-                current_string = string[0:i]
-                if self.is_not_chinese(current_string):
-                    return current_string
-                if current_string in traditional[i-1]:
-                    return current_string
-                elif current_string in simplified[i-1]:
-                    return current_string
-        # end of longest_word
+        At each position, the longest known word is found with one walk down
+        the trie, so words of any length are found.
+        """
 
         output = []
-        while len(string) >= 1:
-            long_word = longest_word(string)
-            if long_word is None:
-                long_word = string[0]
-                string = string[1:]  # the character is alone
+        position = 0
+        length = len(string)
+        not_han_run = data.NOT_HAN_RUN_PATTERN.match
+        while position < length:
+            # Length of the run of non-Chinese characters starting here
+            run = not_han_run(string, position).end() - position
+            match = self.longest_match(string, position)
+            if match > run and match > 1:
+                word_length = match
+            elif run > 1:
+                word_length = run
             else:
-                string = string[len(long_word):]
-            if long_word != " ":
-                output.append(long_word)
+                word_length = 1  # the character is alone
+            word = string[position:position + word_length]
+            position += word_length
+            if word != " ":
+                output.append(word)
         return output
 # end of ChineseProcessing
 
 
+def tone_marks(pin1yin1):
+    """ Convert a string representing a pinyin syllable with tone, like
+    "ni3", into pinyin with tone marks, like "nǐ". Returns a string.
+
+    This is the slow way, used to fill ToneMarkConverter tables.
+    """
+
+    pin1yin1 = re.sub("u:", "ü", pin1yin1)
+    pin1yin1 = re.sub("U:", "Ü", pin1yin1)
+    if not PINYIN_SYLLABLE_PATTERN.match(pin1yin1):
+        return pin1yin1
+
+    syl = pin1yin1[:-1]
+    tone = int(pin1yin1[-1])
+    first_tone =  "āēīōūǖĀĒĪŌŪǕ"
+    second_tone = "áéíóúǘÁÉÍÓÚǗ"
+    third_tone =  "ǎěǐǒǔǚǍĚǏǑǓǙ"
+    fourth_tone = "àèìòùǜÀÈÌÒÙǛ"
+    fifth_tone =  "aeiouüAEIOUÜ"
+    tones = [first_tone, second_tone, third_tone, fourth_tone, fifth_tone]
+
+    def find_vowels(string):
+        """Returns a list of the vowels found, in order, as a list."""
+        vowels_list = "aeiouüAEIOUÜ"
+        vowels_places = [string.find(x) for x in vowels_list]
+        output = ["", "", "", "", ""]
+        for i in range(len(vowels_places)):
+            if vowels_places[i] != -1:
+                output[vowels_places[i]] = vowels_list[i]
+        return output
+
+    def is_there_iu(vowels_list):
+        """Check if "iu" is in the pinyin string. Returns a boolean."""
+        for i in range(len(vowels_list)):
+            if vowels_list[i] != vowels_list[-1]:
+                if vowels_list[i] == "i" and vowels_list[i + 1] == "u":
+                    return True
+                return False
+
+    vowels = find_vowels(syl)
+    if is_there_iu(vowels):
+        syl = syl.replace("u", tones[tone - 1][4])
+        return syl
+    # To check, in order: 'a','o','e','i','u','ü' (cf. Wikipedia)
+    to_test = "aoeiuüAOEIUÜ"
+    for case in to_test:
+        if case in vowels:
+            syl = syl.replace(case, tones[tone - 1][fifth_tone.find(case)])
+            return syl
+    else:
+        return pin1yin1
+
+
+class ZhuyinConverter(object):
+    """ Converts pinyin into zhuyin syllable by syllable, in one pass.
+
+    The converter is built once from a table like data.PINYIN_TO_ZHUYIN:
+    each syllable is replaced by the zhuyin of its longest known beginning
+    (in the order of the table), and its tone number by the tone mark.
+    The last indexes.SYLLABLE_CACHE_SIZE syllables converted are remembered,
+    so the ones of a dictionary are only converted once.
+    """
+
+    def __init__(self, table):
+        self.syllables = {}
+        self.tones = {}
+        for rank, (pinyin, zhuyin) in enumerate(table):
+            if pinyin.isdigit():
+                self.tones[pinyin] = zhuyin
+            elif pinyin not in self.syllables:
+                self.syllables[pinyin] = (rank, zhuyin)
+        self.longest = max(len(pinyin) for pinyin in self.syllables)
+        self.convert_syllable = functools.lru_cache(
+            maxsize=indexes.SYLLABLE_CACHE_SIZE)(self.convert_syllable)
+
+    def convert_syllable(self, syllable):
+        """ Converts one lower case syllable, like "zhong1".
+        Returns a string, like "ㄓㄨㄥ".
+        """
+        zhuyin = syllable
+        if zhuyin == "r":
+            zhuyin = "er"
+        best = None
+        for length in range(min(self.longest, len(zhuyin)), 0, -1):
+            found = self.syllables.get(zhuyin[:length])
+            if found is not None and (best is None or found[0] < best[0]):
+                best = (found[0], found[1], length)
+        if best is not None:
+            zhuyin = best[1] + zhuyin[best[2]:]
+        if zhuyin[-1:] in self.tones:
+            zhuyin = zhuyin[:-1] + self.tones[zhuyin[-1]]
+        return zhuyin
+
+    def convert(self, pinyin):
+        """ Converts a pinyin string, like "Zhong1 guo2" or "lu:4".
+        Returns a string, like "ㄓㄨㄥ ㄍㄨㄛˊ".
+        """
+        syllables = pinyin.lower().replace("u:", "ü").split(" ")
+        return " ".join([self.convert_syllable(syllable)
+                         for syllable in syllables])
+
+    def convert_all(self, pinyin_list):
+        """ Converts a list of pinyin strings. Returns a list. """
+        convert = self.convert
+        return [convert(pinyin) for pinyin in pinyin_list]
+
+
+ZHUYIN_CONVERTER = ZhuyinConverter(data.PINYIN_TO_ZHUYIN)
+
+
+class ToneMarkConverter(object):
+    """ Converts pinyin with tone numbers into pinyin with tone marks.
+
+    Every syllable of a table like data.PINYIN_TO_ZHUYIN is converted once,
+    in its 5 tones, lower case and capitalized, and with "u:" for "ü": a few
+    thousand syllables, after which converting one is a dictionary lookup.
+    Other syllables (like "r5" or "xx") are converted by tone_marks.
+    """
+
+    def __init__(self, table):
+        self.syllables = {}
+        for pinyin, zhuyin in table:
+            if pinyin.isdigit():
+                continue
+            for variant in set([pinyin, pinyin.capitalize(),
+                                pinyin.replace("ü", "u:"),
+                                pinyin.capitalize().replace("ü", "u:")]):
+                for tone in "12345":
+                    self.syllables[variant + tone] = tone_marks(variant + tone)
+
+    def convert_syllable(self, syllable):
+        """ Converts one syllable, like "Zhong1" or "lu:4".
+        Returns a string, like "Zhōng" or "lǜ".
+        """
+        converted = self.syllables.get(syllable)
+        if converted is None:
+            return tone_marks(syllable)
+        return converted
+
+    def convert(self, pinyin):
+        """ Converts a pinyin string, like "ni3 hao3", or a line of the
+        pinyin column. Returns a string, like "nǐ hǎo".
+        """
+        convert_syllable = self.convert_syllable
+        return " ".join([convert_syllable(syllable)
+                         for syllable in pinyin.split()])
+
+    def convert_all(self, pinyin_list):
+        """ Converts a list of pinyin strings. Returns a list. """
+        convert = self.convert
+        return [convert(pinyin) for pinyin in pinyin_list]
+
+
+TONE_MARK_CONVERTER = ToneMarkConverter(data.PINYIN_TO_ZHUYIN)
+
+
+def build_romanisation_index(data_obj):
+    """ Build the syllable index of the pinyin column of data_obj. When its
+    entries are in a database, only the parsing part of the index is needed.
+    """
+    return indexes.RomanisationIndex(
+        data_obj.pinyin, ZHUYIN_CONVERTER,
+        indexed=getattr(data_obj, "backend", None) is None)
+
+
 class DictionaryTools(object):
     """ Contains all functions needed for the dictionary part.
     """
 
-    def __init__(self):
+    def __init__(self, page_size=PAGE_SIZE, cache=QUERY_CACHE):
         self.index = []
         self.set_of_chinese_chars = []
+        self.data_obj = None
+        self.page_size = page_size
+        self.ranked = []
+        self.page = 0
+        self.live = None
+        self.cache = cache
+
+    def load(self, data_obj):
+        """ Use the indexes of data_obj when searching its columns. """
+        self.data_obj = data_obj
 
     @staticmethod
-    def pinyin_to_zhuyin(pinyin, data_obj):
-        """Converts the given pinyin list into zhuyin. Returns a list."""
-        pinyin_zhuyin_dict = data_obj.pinyin_to_zhuyin
-
-        # for speed issue, transforme the list of pinyin in one long string
-        to_convert = " " + " # ".join(pinyin)
-        to_convert += " "  # This space is useful for the regexp matching
-        to_convert = to_convert.lower()
-        zhuyin = re.sub("u:", "ü", to_convert)  # change u: into ü
-        zhuyin = re.sub(" r ", " er ", zhuyin)  # change r into er
-        for i in range(len(pinyin_zhuyin_dict)):
-            if i < len(pinyin_zhuyin_dict) - 5:
-                zhuyin = re.sub(" " + pinyin_zhuyin_dict[i][0],
-                                " " + pinyin_zhuyin_dict[i][1],
-                                zhuyin)  # do not change the tones
-            elif i >= len(pinyin_zhuyin_dict) - 5:
-                zhuyin = re.sub(pinyin_zhuyin_dict[i][0] + " ",
-                                pinyin_zhuyin_dict[i][1] + " ",
-                                zhuyin)  # tones
-        # delete the last space used for matching convenience
-        zhuyin = zhuyin[:-1]
-        # Break the long string as a list
-        zhuyin = zhuyin.split(" # ")
-        zhuyin[0] = zhuyin[0][1:]  # get rid of the first space
-        return zhuyin
+    def pinyin_to_zhuyin(pinyin, data_obj=None):
+        """Converts the given pinyin list into zhuyin. Returns a list.
+        The conversion table of data_obj is used if one is given."""
+        if data_obj is None or data_obj.pinyin_to_zhuyin is data.PINYIN_TO_ZHUYIN:
+            converter = ZHUYIN_CONVERTER
+        else:
+            converter = ZhuyinConverter(data_obj.pinyin_to_zhuyin)
+        return converter.convert_all(pinyin)
 
     @staticmethod
     def is_pinyin(pin1yin1):
@@ -315,7 +1003,7 @@ class DictionaryTools(object):
         Returns True if the input looks like a pinyin string. False otherwise.
 
         """
-        return re.match(r'^(?i)[a-züÜ]+[0-5]', pin1yin1)
+        return PINYIN_SYLLABLE_PATTERN.match(pin1yin1)
 
     def unicode_pinyin(self, pin1yin1):
         """ Convert a string representing a pinyin syllable with tone.
@@ -325,78 +1013,459 @@ class DictionaryTools(object):
         A string like "ni3".
         """
 
-        pin1yin1 = re.sub("u:", "ü", pin1yin1)
-        pin1yin1 = re.sub("U:", "Ü", pin1yin1)
-        if not self.is_pinyin(pin1yin1):
-            return pin1yin1
-
-        syl = pin1yin1[:-1]
-        tone = int(pin1yin1[-1])
-        first_tone =  "āēīōūǖĀĒĪŌŪǕ"
-        second_tone = "áéíóúǘÁÉÍÓÚǗ"
-        third_tone =  "ǎěǐǒǔǚǍĚǏǑǓǙ"
-        fourth_tone = "àèìòùǜÀÈÌÒÙǛ"
-        fifth_tone =  "aeiouüAEIOUÜ"
-        tones = [first_tone, second_tone, third_tone, fourth_tone, fifth_tone]
-
-        def find_vowels(string):
-            """Returns a list of the vowels found, in order, as a list."""
-            vowels_list = "aeiouüAEIOUÜ"
-            vowels_places = [string.find(x) for x in vowels_list]
-            output = ["", "", "", "", ""]
-            for i in range(len(vowels_places)):
-                if vowels_places[i] != -1:
-                    output[vowels_places[i]] = vowels_list[i]
-            return output
-
-        def is_there_iu(vowels_list):
-            """Check if "iu" is in the pinyin string. Returns a boolean."""
-            for i in range(len(vowels_list)):
-                if vowels_list[i] != vowels_list[-1]:
-                    if vowels_list[i] == "i" and vowels_list[i + 1] == "u":
-                        return True
-                    return False
-
-        vowels = find_vowels(syl)
-        if is_there_iu(vowels):
-            syl = syl.replace("u", tones[tone - 1][4])
-            return syl
-        # To check, in order: 'a','o','e','i','u','ü' (cf. Wikipedia)
-        to_test = "aoeiuüAOEIUÜ"
-        for case in to_test:
-            if case in vowels:
-                syl = syl.replace(case, tones[tone - 1][fifth_tone.find(case)])
-                return syl
-        else:
-            return pin1yin1
+        return TONE_MARK_CONVERTER.convert_syllable(pin1yin1)
+
+    @staticmethod
+    def unicode_pinyin_all(pinyin_list):
+        """ Converts a list of pinyin strings, like "ni3 hao3", into pinyin
+        with tone marks. Returns a list of strings, like "nǐ hǎo".
+        """
+        return TONE_MARK_CONVERTER.convert_all(pinyin_list)
 
-    def search(self, given_list, text):
+    def search(self, given_list, text, fuzzy=True, mode="plain"):
         """ Search for a string in a list.
 
         Arguments:
         given_list: a list of words
         text: a string
+        fuzzy: when searching translations, look for misspelled words if
+               nothing is found (True by default)
+        mode: "plain" (by default), "wildcard" (text is a pattern like "?學"
+              or "一*不*", matching a whole word or sense) or "regex" (text
+              is a regular expression, searched case insensitively)
 
         Searchs for "string" in "given_list". Returns a list of indices in the
         index attribute of the DictionaryTools class.
 
+        Every entry found is ranked: exact matches (of the whole line, or of
+        one of its senses) first, then matches at word boundaries (or at the
+        beginning, for Chinese), then the others, each group shortest first.
+        Only the best page_size entries are kept in index; next_page gives
+        the following ones without searching again.
+
+        As the results are kept in the object, two searches can not run at
+        the same time on one DictionaryTools: see query.
+
+        """
+        self.set_ranked(self.ranking(given_list, text, fuzzy, mode))
+
+    def query(self, given_list, text, fuzzy=True, mode="plain", page=0):
+        """ Search for a string in a list, like search, and return the given
+        page (starting at 0) of the results as a SearchResult.
+
+        Nothing is stored in the DictionaryTools object, and the indexes of
+        the loaded data are only read, so queries can run in several threads
+        at the same time.
+
+        """
+        return self.page_of(self.ranking(given_list, text, fuzzy, mode), page)
+
+    def query_batch(self, given_list, texts, fuzzy=True, mode="plain",
+                    page=0):
+        """ Search for many strings in a list, like query.
+        Returns a BatchResult, whose results are the SearchResult of each
+        string, in the same order.
+
+        Each distinct string is only searched for once, and the cache is
+        left alone, so that a big batch does not evict the results of
+        interactive requests.
+
+        """
+        return run_batch(texts, lambda text: self.page_of(
+            self.ranking(given_list, text, fuzzy, mode, cached=False), page))
+
+    def query_languages(self, text, languages=None, fuzzy=True,
+                        mode="plain", page=0):
+        """ Search for a string in several translation columns of the loaded
+        data object at once. Returns the given page of results as a
+        SearchResult, like query.
+
+        languages is a list of languages (see Data.translation_column, None
+        standing for the main translation column). By default, every
+        translation column is searched. An entry found in several of them
+        keeps its best score.
+
+        """
+        data_obj = self.data_obj
+        if languages is None:
+            languages = [None] + data_obj.languages()
+        best = {}
+        for language in languages:
+            for entry in self.ranking(data_obj.translation_column(language),
+                                      text, fuzzy, mode):
+                previous = best.get(entry[2])
+                if previous is None or entry < previous:
+                    best[entry[2]] = entry
+        return self.page_of(list(best.values()), page)
+
+    def ranking(self, given_list, text, fuzzy, mode, cached=True):
+        """ Returns the list of the (level, length, index) of the entries
+        found by a request (see search), from the cache if possible (and
+        cached is True).
+        """
+        if mode == "plain":
+            key = self.cache_key("search" if fuzzy else "exact",
+                                 given_list, text)
+
+            def find():
+                """ Candidates of a plain request. """
+                return self.find(given_list, text, fuzzy=fuzzy)
+        elif mode in ("wildcard", "regex"):
+            key = self.cache_key(mode, given_list, text)
+
+            def find():
+                """ Candidates of a pattern request. """
+                return self.find_pattern(given_list, text, mode)
+        else:
+            raise ValueError("Unknown search mode: " + str(mode))
+        if key is None or not cached:
+            ranked = self.score(*find())
+        else:
+            ranked = self.cache.get(key, lambda: self.score(*find()))
+        return ranked
+
+    def live_search(self, given_list, text):
+        """ Search for a string in a list, while it is being typed.
+        Returns the first page of results as a SearchResult, and keeps them in
+        index too.
+
+        Like search, but the last word of a request on the translation
+        column can be the beginning of a word ("pen" finds "penser"). When
+        text extends the text of the previous live search on the same list,
+        only the entries found by that search are checked again: they are
+        the only ones which can still match. With an index, this is only
+        faster than searching again if they are few (NARROW_LIMIT).
+
+        """
+        kind = self.query_kind(given_list, text)
+        previous = self.live
+        if (previous is not None and previous[0] is given_list and
+                previous[1] == kind and kind != "romanisation" and
+                text.startswith(previous[2]) and
+                (kind == "scan" or len(previous[3]) <= NARROW_LIMIT)):
+            matches = self.matcher(kind, given_list, text)
+            ranked = self.score(given_list,
+                                [line for line in previous[3] if matches(line)],
+                                self.level_function(kind, given_list, text))
+        else:
+            key = self.cache_key("live", given_list, text)
+            if key is None:
+                ranked = self.score(*self.find(given_list, text, prefix=True))
+            else:
+                ranked = self.cache.get(key, lambda: self.score(
+                    *self.find(given_list, text, prefix=True)))
+        self.live = (given_list, kind, text, [entry[2] for entry in ranked])
+        self.set_ranked(ranked)
+        return self.page_of(ranked, 0)
+
+    def cache_key(self, mode, given_list, text):
+        """ Returns the key of a request in the cache, or None if its results
+        can not be cached (given_list is not a column of the loaded data).
+        """
+        data_obj = self.data_obj
+        if self.cache is None or not hasattr(data_obj, "version"):
+            return None
+        if mode not in ("wildcard", "regex"):
+            text = " ".join(text.lower().split())
+        names = [(name, getattr(data_obj, name)) for name in data.COLUMNS]
+        names += [("translation." + language, column) for language, column
+                  in getattr(data_obj, "translations", {}).items()]
+        for name, column in names:
+            if given_list is column:
+                return (mode, data_obj.version, name, text,
+                        data_obj.hanzi, data_obj.romanisation)
+        return None
+
+    @staticmethod
+    def score(values, candidates, level):
+        """ Returns the list of the (level, length, index) of the candidates
+        found in values (see find). It is never modified afterwards, and can
+        be cached.
+        """
+        return [(level(line), len(values[line]), line)
+                for line in candidates]
+
+    def set_ranked(self, ranked):
+        """ Keep the scores of the last search, and put the first page of
+        the best entries in index.
+        """
+        self.ranked = ranked
+        self.page = 0
+        self.index = self.get_page(0)
+
+    def query_kind(self, given_list, text):
+        """ Returns how text is looked for in given_list: "translation",
+        "traditional", "simplified" or "romanisation" when given_list is the
+        corresponding column of the loaded data object (any of its
+        translation columns for "translation"), "scan" otherwise.
+        """
+        data_obj = self.data_obj
+        if data_obj is not None:
+            if ((given_list is data_obj.translation or
+                 self.language_of(given_list) is not None) and
+                    indexes.tokenize(text)):
+                return "translation"
+            if given_list is data_obj.traditional:
+                return "traditional"
+            if given_list is data_obj.simplified:
+                return "simplified"
+            if given_list is data_obj.pinyin or given_list is data_obj.zhuyin:
+                return "romanisation"
+        return "scan"
+
+    def language_of(self, given_list):
+        """ Returns the language of given_list if it is one of the other
+        translation columns of the loaded data object (see
+        Data.translations), None otherwise.
+        """
+        for language, column in getattr(self.data_obj, "translations",
+                                        {}).items():
+            if given_list is column:
+                return language
+        return None
+
+    def backend_of(self, given_list):
+        """ Returns the database searched instead of given_list (see
+        find_in_backend), or None. It only holds the main translation
+        column.
+        """
+        if self.language_of(given_list) is not None:
+            return None
+        return getattr(self.data_obj, "backend", None)
+
+    def find(self, given_list, text, prefix=False, fuzzy=False):
+        """ Find the entries of given_list matching text.
+        Returns a tuple (values, candidates, level): the lines the entries
+        found can be read from (given_list itself, or a dictionary of index ->
+        line when they come from a database), the list of their indices, and
+        a function giving the match level of one of them (see search).
+
+        When given_list is a translation column of the loaded data object,
+        its inverted index is used: every entry containing all the words of
+        text is found (the last one can be the beginning of a word if prefix
+        is True). If there is none and fuzzy is True, the entries containing
+        words close to them (see FuzzyIndex) are found, their level being the
+        number of typos. For its traditional and simplified columns, a character
+        n-gram index gives the same results as the scan would. For its pinyin
+        and zhuyin columns, text can be pinyin (with tone numbers, diacritics
+        or no tones) or zhuyin, and is looked for in the syllable index.
+        Otherwise, given_list is scanned for the words of text as
+        sub-strings.
+
+        """
+        kind = self.query_kind(given_list, text)
+        backend = self.backend_of(given_list)
+        if backend is not None and kind != "scan":
+            return self.find_in_backend(backend, kind, text, prefix)
+        level = self.level_function(kind, given_list, text)
+        if kind == "translation":
+            language = self.language_of(given_list)
+            translations = indexes.translation_index(self.data_obj, language)
+            found = translations.search(text, prefix)
+            if found or prefix or not fuzzy:
+                return given_list, found, level
+            # Maybe some misspelled words
+            fuzzy = indexes.fuzzy_index(self.data_obj, language)
+            distances = fuzzy.search(text)
+            return given_list, sorted(distances), distances.__getitem__
+        if kind == "traditional":
+            hanzi = indexes.get_index(self.data_obj, "traditional",
+                                      indexes.HanziIndex.build_traditional)
+            return given_list, hanzi.search(text), level
+        if kind == "simplified":
+            hanzi = indexes.get_index(self.data_obj, "simplified",
+                                      indexes.HanziIndex.build_simplified)
+            return given_list, hanzi.search(text), level
+        if kind == "romanisation":
+            romanisation = indexes.get_index(self.data_obj, "romanisation",
+                                             build_romanisation_index)
+            return given_list, romanisation.search(text), level
+
+        matches = self.matcher(kind, given_list, text)
+        found = []
+        if text.split():
+            # try in each line of the dic
+            for line in range(len(given_list)):
+                if matches(line):
+                    found.append(line)
+        return given_list, found, level
+
+    def find_pattern(self, given_list, text, mode):
+        """ Find the entries of given_list matching a wildcard or regex
+        request (see search). Returns a tuple (values, candidates, level), like
+        find.
+
+        The literal fragments of the pattern are looked for in the index of
+        the column first, when there is one (in a database, only hanzi
+        fragments are), and the pattern is only tried on the entries
+        containing them. An invalid regular expression finds
+        nothing.
+        """
+        try:
+            if mode == "wildcard":
+                regex, fragments = indexes.wildcard_pattern(text)
+            else:
+                regex = re.compile(text, re.IGNORECASE)
+                fragments = indexes.literal_fragments(regex)
+        except re.error:
+            return given_list, [], None
+        kind = self.query_kind(given_list, text)
+        values = given_list
+        candidates = None
+        backend = self.backend_of(given_list)
+        if backend is not None:
+            if (kind in ("traditional", "simplified") and fragments and
+                    all(len(fragment.split()) == 1 for fragment in fragments)):
+                values = dict((line, value + "\n") for line, value
+                              in backend.search_hanzi(kind, " ".join(fragments)))
+                candidates = sorted(values)
+        elif kind == "translation":
+            translations = indexes.translation_index(
+                self.data_obj, self.language_of(given_list))
+            candidates = translations.prefilter(fragments)
+        elif kind == "traditional":
+            hanzi = indexes.get_index(self.data_obj, "traditional",
+                                      indexes.HanziIndex.build_traditional)
+            candidates = hanzi.prefilter(fragments)
+        elif kind == "simplified":
+            hanzi = indexes.get_index(self.data_obj, "simplified",
+                                      indexes.HanziIndex.build_simplified)
+            candidates = hanzi.prefilter(fragments)
+        if candidates is None:
+            found = [line for line, value in enumerate(given_list)
+                     if regex.search(value)]
+        else:
+            found = [line for line in candidates
+                     if regex.search(values[line])]
+        # Shortest first
+        return values, found, lambda line: 0
+
+    def find_in_backend(self, backend, kind, text, prefix):
+        """ Find the entries matching text in the database of the loaded
+        data object (see database.Database), with the same results as the
+        in-memory indexes. Returns a tuple (values, candidates, level), like
+        find: the lines found are read along with their indices, and scored
+        without querying the database again.
         """
+        if kind != "romanisation":
+            if kind == "translation":
+                rows = backend.search_translation(text, prefix)
+            else:
+                rows = backend.search_hanzi(kind, text)
+            values = dict((line, value + "\n") for line, value in rows)
+            return (values, [line for line, value in rows],
+                    self.level_function(kind, values, text))
+        romanisation = indexes.get_index(self.data_obj, "romanisation",
+                                         build_romanisation_index)
+        wanted = romanisation.parse(text)
+        values = {}
+        levels = {}
+        if wanted:
+            for line, value in backend.search_syllables(
+                    [key for key, tone in wanted]):
+                syllables = romanisation.line_syllables(value)
+                if romanisation.contains(syllables, wanted):
+                    values[line] = value + "\n"
+                    levels[line] = romanisation.syllables_level(syllables,
+                                                                wanted)
+        return values, sorted(values), levels.__getitem__
+
+    @staticmethod
+    def matcher(kind, given_list, text):
+        """ Returns a function telling if given_list[line] matches text, the
+        last word of text being a prefix for the translation column.
+        Romanisation requests can not be checked this way.
+        """
+        if kind == "translation":
+            words = indexes.tokenize(text)
+            last = words.pop()
+
+            def matches(line):
+                """ Every word of text, the last one as a prefix. """
+                tokens = set(indexes.tokenize(given_list[line]))
+                return (all(word in tokens for word in words) and
+                        any(token.startswith(last) for token in tokens))
+            return matches
+
         words = (text.lower()).split()
-        index = []
-        total = []
-        # try in each line of the dic
-        for line in range(len(given_list)):
-            counter = 0
-            for word_token in range(len(words)):
-                # for each word of the request (case insensitive)
-                if (given_list[line].lower()).count(words[word_token]) != 0:
-                    counter += 1
-                if counter == len(words):
-                    # only accepts lines containing every words
-                    index.append(line)
-                    total.append(len(given_list[line]))
-            if len(total) >= 500:
-                break
-        dico = dict(zip(index, total))
-        dico_sorted = sorted(dico.items(), key=lambda x: x[1])
-        self.index = [value[0] for value in dico_sorted[:]]
+
+        def matches(line):
+            """ Only accepts lines containing every words. """
+            lower_line = given_list[line].lower()
+            return all(word in lower_line for word in words)
+        return matches
+
+    def level_function(self, kind, given_list, text):
+        """ Returns the match level function of the given kind of request
+        (see search and query_kind).
+        """
+        if kind in ("traditional", "simplified"):
+            return self.hanzi_level(given_list, text)
+        if kind == "romanisation":
+            romanisation = indexes.get_index(self.data_obj, "romanisation",
+                                             build_romanisation_index)
+            wanted = romanisation.parse(text)
+            return lambda line: romanisation.match_level(line, wanted)
+        return self.text_level(given_list, text)
+
+    @staticmethod
+    def text_level(given_list, text):
+        """ Returns the match level function of text in a list of sentences:
+        0 if a line, or one of its senses, is text (case insensitive), 1 if
+        text is found at word boundaries in the line, 2 otherwise.
+        """
+        query = " ".join(text.casefold().split())
+        boundary = re.compile(r"(?<!\w)" + re.escape(query) + r"(?!\w)")
+
+        def level(line):
+            """ Match level of text in given_list[line]. """
+            field = given_list[line].rstrip("\n").casefold()
+            if field == query or query in [sense.strip() for sense
+                                           in data.split_senses(field)]:
+                return 0
+            if boundary.search(field):
+                return 1
+            return 2
+        return level
+
+    @staticmethod
+    def hanzi_level(given_list, text):
+        """ Returns the match level function of text in a list of Chinese
+        words: 0 if a word is text, 1 if it starts with text, 2 otherwise.
+        """
+        query = "".join(text.casefold().split())
+
+        def level(line):
+            """ Match level of text in given_list[line]. """
+            field = given_list[line].rstrip("\n").casefold()
+            if field == query:
+                return 0
+            if field.startswith(query):
+                return 1
+            return 2
+        return level
+
+    def get_page(self, number):
+        """ Returns the indices of the given page (starting at 0) of the
+        results of the last search.
+        """
+        return list(self.page_of(self.ranked, number).ids)
+
+    def page_of(self, ranked, number):
+        """ Returns the given page (starting at 0) of ranked results as a
+        SearchResult. Only the best entries are sorted: the cost is
+        O(n log k), with k the number of entries up to this page.
+        """
+        end = (number + 1) * self.page_size
+        best = tuple(heapq.nsmallest(end, ranked)[number * self.page_size:])
+        return SearchResult(tuple(entry[2] for entry in best), best,
+                            len(ranked), number)
+
+    def next_page(self):
+        """ Returns the indices of the next page of results of the last
+        search, and adds them to the index attribute.
+        """
+        self.page += 1
+        page = self.get_page(self.page)
+        self.index = self.index + page
+        return page